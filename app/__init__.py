@@ -12,36 +12,41 @@ import os
 import logging
 from logging.handlers import RotatingFileHandler
 
+from config.logging_queue import install_access_log, install_queue_logging
+from config.registry import get_registry
+
+from .server_session import init_sessions
+
 def create_app(config_name=None):
     """Application factory pattern"""
     app = Flask(__name__)
     
-    # Load configuration
-    config_name = config_name or os.getenv('FLASK_ENV', 'production')
+    # Load configuration; unknown names fall back to production
+    get_registry(config_name).init_app(app)
     
-    if config_name == 'development':
-        app.config.from_object('config.development.DevelopmentConfig')
-    elif config_name == 'staging':
-        app.config.from_object('config.staging.StagingConfig')
-    else:
-        app.config.from_object('config.production.ProductionConfig')
+    # Server-side sessions when SESSION_TYPE is redis, else Flask's cookie sessions
+    init_sessions(app)
     
     # Setup logging
     if not app.debug and not app.testing:
         if not os.path.exists('logs'):
             os.mkdir('logs')
         
-        file_handler = RotatingFileHandler(
-            'logs/flask_app.log',
-            maxBytes=10240000,
-            backupCount=10
-        )
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
+        # The config class may already have installed its own pipeline
+        if 'log_queue' not in app.extensions:
+            file_handler = RotatingFileHandler(
+                'logs/flask_app.log',
+                maxBytes=10240000,
+                backupCount=10
+            )
+            file_handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+            ))
+            file_handler.setLevel(logging.INFO)
+            app.extensions['log_queue'] = install_queue_logging(app.logger, [file_handler], app.config)
+            app.logger.setLevel(logging.INFO)
+        
+        install_access_log(app)
         app.logger.info('Flask application startup')
     
     # Register blueprints (if using blueprints)
@@ -1,24 +1,86 @@
-from flask import Flask, jsonify, request
 import os
+import sys
+
+# Installed before the imports below so --profile-startup can time them
+try:
+    from config.startup_profiler import StartupProfiler
+    startup_profiler = StartupProfiler.start_if_requested()
+except ImportError:
+    startup_profiler = None
+
+from flask import Flask, Response, jsonify, request
 import logging
 from datetime import datetime
 
+from health import HealthChecks
+from json_provider import init_json
+from pagination import InvalidCursor, ListDataSource, paginate, stream_json_array, stream_ndjson
+from prometheus_metrics import PrometheusMetrics
+from rate_limit import RateLimiter
+from request_metrics import RequestMetrics
+from response_cache import ResponseCache
+from server_session import init_sessions
+
+if startup_profiler:
+    startup_profiler.mark('imports')
+
 app = Flask(__name__)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load environment-specific configuration when the config package is importable
+try:
+    from config.registry import get_registry
+    get_registry().init_app(app)
+    if not app.debug and not app.testing:
+        # request_metrics logs sampled access lines to app.logger's 'access' child
+        from config.logging_queue import install_access_log
+        install_access_log(app)
+except ImportError:
+    # An environment was asked for; serving it with built-in defaults would hide that
+    if os.getenv('FLASK_ENV'):
+        raise
+    logger.warning('Config package not importable, using built-in defaults')
+if startup_profiler:
+    startup_profiler.mark('config')
+
+init_json(app)
+request_metrics = RequestMetrics(app)
+cache = ResponseCache(app)
+limiter = RateLimiter(app)
+sessions = init_sessions(app)
+# Batched DeploymentLog and last_login writes, flushed by a background thread
+write_behind = None
+if app.config.get('WRITE_BEHIND_ENABLED'):
+    from models import db
+    from write_behind import WriteBehindQueue
+    db.init_app(app)
+    write_behind = WriteBehindQueue(app)
+if app.config.get('PROMETHEUS_METRICS'):
+    PrometheusMetrics(app)
+HealthChecks(app)
+if startup_profiler:
+    startup_profiler.mark('extensions')
+
+# Rows served by /api/data, ordered by key for cursor pagination
+data_source = ListDataSource([1, 2, 3, 4, 5])
+
 # Health check endpoint
 @app.route('/health')
 def health_check():
-    return jsonify({
+    response = jsonify({
         'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat(),
+        'timestamp': datetime.utcnow(),
         'version': os.getenv('APP_VERSION', '1.0.0')
     })
+    # Not behind ResponseCache: a public response would be micro-cached by nginx
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/')
+@cache.cached()
 def home():
     return jsonify({
         'message': 'Flask Deployment Pipeline Demo',
@@ -27,12 +89,54 @@ def home():
     })
 
 @app.route('/api/data')
+@cache.cached()
 def get_data():
+    limit = min(request.args.get('limit', app.config.get('API_PAGE_SIZE', 100), type=int),
+                app.config.get('API_MAX_PAGE_SIZE', 1000))
+    cursor = request.args.get('cursor')
+    stream = request.args.get('stream')
+    
+    try:
+        if stream == 'ndjson':
+            return Response(stream_ndjson(data_source, app.json.dumps_bytes, cursor),
+                            mimetype='application/x-ndjson')
+        if stream == 'json':
+            body = stream_json_array(data_source, app.json.dumps_bytes, cursor,
+                                     extra={'timestamp': datetime.utcnow()})
+            return Response(body, mimetype='application/json')
+        
+        rows, next_cursor = paginate(data_source, cursor, max(limit, 1))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
     return jsonify({
-        'data': [1, 2, 3, 4, 5],
-        'timestamp': datetime.utcnow().isoformat()
+        'data': rows,
+        'next_cursor': next_cursor,
+        'timestamp': datetime.utcnow()
     })
 
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats())
+
+@app.route('/latency/stats')
+def latency_stats():
+    return jsonify(request_metrics.snapshot())
+
+@app.route('/ratelimit/stats')
+def rate_limit_stats():
+    return jsonify(limiter.stats())
+
+@app.route('/session/stats')
+def session_stats():
+    return jsonify(sessions.stats() if sessions else {})
+
+if startup_profiler:
+    startup_profiler.mark('routes')
+    startup_profiler.report()
+
 if __name__ == '__main__':
+    if startup_profiler:
+        sys.exit(0)
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,137 @@
+"""
+Gunicorn settings and server hooks, sized from the active config class.
+
+Gunicorn loads this file automatically from its working directory, so the
+Dockerfile command picks it up unchanged. Command-line flags and
+GUNICORN_CMD_ARGS still override anything set here; WEB_CONCURRENCY
+overrides the worker count.
+"""
+
+import gc
+import os
+import sys
+import math
+import logging
+import importlib.util
+
+# In a checkout the config package sits next to app/. Appended, not
+# prepended: the project root also holds the app package, which must not
+# shadow app/app.py.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_logger = logging.getLogger('gunicorn.error')
+
+
+def _load_registry():
+    try:
+        from config.registry import get_registry
+        return get_registry()
+    except ImportError:
+        # An environment was asked for, so defaults would silently mis-size the server
+        if os.getenv('FLASK_ENV'):
+            raise
+        _logger.warning('Config package not importable, using built-in gunicorn defaults')
+        return None
+
+
+def _setting(name, default):
+    return _registry.get(name, default) if _registry is not None else default
+
+
+def available_cpus():
+    """CPUs this container may use: affinity mask capped by the cgroup CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+def default_workers(worker_class, cpus):
+    # Sync workers block on I/O, so oversubscribe; threaded and async workers
+    # get their concurrency elsewhere and only need one process per core
+    if worker_class == 'sync':
+        return 2 * cpus + 1
+    if worker_class == 'gthread':
+        return cpus + 1
+    return cpus
+
+
+def _worker_class():
+    name = _setting('GUNICORN_WORKER_CLASS', 'gthread')
+    if name == 'gevent' and importlib.util.find_spec('gevent') is None:
+        _logger.warning('gevent is not installed, falling back to gthread workers')
+        return 'gthread'
+    return name
+
+
+_registry = _load_registry()
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+worker_class = _worker_class()
+workers = int(os.getenv('WEB_CONCURRENCY') or _setting('GUNICORN_WORKERS', None) or min(
+    default_workers(worker_class, available_cpus()), _setting('GUNICORN_MAX_WORKERS', 16)
+))
+threads = _setting('GUNICORN_THREADS', 4) if worker_class == 'gthread' else 1
+worker_connections = _setting('GUNICORN_WORKER_CONNECTIONS', 1000)
+# The gevent worker monkey-patches when it starts, after the fork. An app
+# preloaded in the master would keep the unpatched threads, sockets and Redis
+# clients it created at import, so gevent workers load the app themselves.
+preload_app = _setting('GUNICORN_PRELOAD_APP', True) and worker_class != 'gevent'
+max_requests = _setting('GUNICORN_MAX_REQUESTS', 5000)
+max_requests_jitter = _setting('GUNICORN_MAX_REQUESTS_JITTER', 500)
+keepalive = _setting('GUNICORN_KEEPALIVE', 5)
+timeout = _setting('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _setting('GUNICORN_GRACEFUL_TIMEOUT', 25)
+reload = _setting('GUNICORN_RELOAD', False)
+
+
+def on_starting(server):
+    # Counters from a previous run must not leak into this one
+    from prometheus_metrics import clear_directory
+    clear_directory()
+    cfg = server.cfg
+    server.log.info(f'{cfg.worker_class_str} workers: {cfg.workers} x {cfg.threads} threads, '
+                    f'preload={cfg.preload_app}, '
+                    f'max_requests={cfg.max_requests}+/-{cfg.max_requests_jitter}')
+
+
+def when_ready(server):
+    # Runs after the app is preloaded and before the first fork. Moving
+    # everything allocated so far out of the collector's reach stops gc passes
+    # in workers from touching, and so copying, the shared pages.
+    if server.cfg.preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Pooled connections opened in the master must not be shared with workers
+    app = getattr(server.app, 'callable', None)
+    ext = getattr(app, 'extensions', {}).get('sqlalchemy')
+    if ext is not None:
+        with app.app_context():
+            getattr(ext, 'db', ext).engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from prometheus_metrics import mark_process_dead
+    mark_process_dead(worker.pid)
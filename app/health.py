@@ -0,0 +1,185 @@
+"""
+Liveness and readiness endpoints.
+
+/health/live answers whether the process can serve requests at all. It does
+no I/O and returns bytes built once at startup. /health/ready checks the
+database pool, Redis and free disk space in parallel, each bounded by
+HEALTH_CHECK_TIMEOUT. The result is cached for HEALTH_READY_TTL seconds, and
+only one request at a time refreshes it, so a burst of probes costs at most
+one round of dependency checks per TTL.
+"""
+
+import os
+import json
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import monotonic, perf_counter
+
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+# Probes must see this replica's state now, never a copy from nginx's micro-cache
+NO_STORE = {'Cache-Control': 'no-store'}
+
+
+class CheckResult:
+    """Outcome of one dependency check"""
+
+    __slots__ = ('name', 'ok', 'latency_ms', 'detail')
+
+    def __init__(self, name, ok, latency_ms, detail=None):
+        self.name = name
+        self.ok = ok
+        self.latency_ms = latency_ms
+        self.detail = detail
+
+    def to_dict(self):
+        result = {'status': 'ok' if self.ok else 'failing', 'latency_ms': self.latency_ms}
+        if self.detail:
+            result['detail'] = self.detail
+        return result
+
+
+class HealthChecks:
+    """Flask extension registering /health/live and /health/ready"""
+
+    def __init__(self, app=None):
+        self.checks = {}
+        self.timeout = 5.0
+        self.ttl = 2.0
+        self.min_free_bytes = 100 * 1024 * 1024
+        self._live_body = b''
+        self._executor = None
+        self._refresh_lock = threading.Lock()
+        self._cached = None
+        self._cached_at = 0.0
+        self.refreshes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = float(app.config.get('HEALTH_CHECK_TIMEOUT', self.timeout))
+        self.ttl = float(app.config.get('HEALTH_READY_TTL', self.ttl))
+        self.min_free_bytes = app.config.get('HEALTH_DISK_MIN_FREE_MB', 100) * 1024 * 1024
+        self._live_body = json.dumps({
+            'status': 'alive',
+            'version': os.getenv('APP_VERSION', '1.0.0'),
+        }).encode()
+
+        if 'sqlalchemy' in app.extensions:
+            self.add_check('database', lambda: self._check_database(app))
+        if app.config.get('CACHE_TYPE') == 'redis':
+            self.add_check('redis', self._redis_check(app))
+        self.add_check('disk', lambda: self._check_disk(self._disk_paths(app)))
+
+        app.add_url_rule('/health/live', 'health_live', self.live)
+        app.add_url_rule('/health/ready', 'health_ready', self.ready)
+        app.extensions['health_checks'] = self
+
+    def add_check(self, name, func):
+        """Register a callable that raises or returns False when the dependency is unusable"""
+        self.checks[name] = func
+        self._executor = None
+
+    # Checks
+
+    def _check_database(self, app):
+        from sqlalchemy import text
+
+        ext = app.extensions['sqlalchemy']
+        # Flask-SQLAlchemy 2.x stores a state object, 3.x the extension itself
+        engine = getattr(ext, 'db', ext).engine
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+
+    def _redis_check(self, app):
+        client = None
+
+        def check():
+            nonlocal client
+            if client is None:
+                import redis
+                url = app.config.get('CACHE_REDIS_URL') or app.config.get('REDIS_URL')
+                client = redis.Redis.from_url(url, socket_timeout=self.timeout,
+                                              socket_connect_timeout=self.timeout)
+            return client.ping()
+
+        return check
+
+    def _disk_paths(self, app):
+        paths = app.config.get('HEALTH_DISK_PATHS')
+        if paths is None:
+            log_file = app.config.get('LOG_FILE')
+            paths = [os.path.dirname(log_file) if log_file else os.getcwd()]
+        return [path for path in paths if os.path.isdir(path)] or [os.getcwd()]
+
+    def _check_disk(self, paths):
+        for path in paths:
+            free = shutil.disk_usage(path).free
+            if free < self.min_free_bytes:
+                raise RuntimeError(f'{path}: {free // (1024 * 1024)} MB free')
+
+    # Running checks
+
+    def _run_check(self, name, func):
+        started = perf_counter()
+        try:
+            ok = func() is not False
+            detail = None
+        except Exception as e:
+            ok, detail = False, f'{type(e).__name__}: {e}'
+        return CheckResult(name, ok, round((perf_counter() - started) * 1000, 2), detail)
+
+    def run_checks(self):
+        """Run every check in parallel; checks still running at the deadline count as failing"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(len(self.checks), 1),
+                                                thread_name_prefix='health-check')
+        futures = {self._executor.submit(self._run_check, name, func): name
+                   for name, func in self.checks.items()}
+        done, _ = wait(futures, timeout=self.timeout)
+        results = {}
+        for future, name in futures.items():
+            if future in done:
+                results[name] = future.result()
+            else:
+                future.cancel()
+                results[name] = CheckResult(name, False, self.timeout * 1000,
+                                            f'timed out after {self.timeout:g}s')
+        self.refreshes += 1
+        return results
+
+    def readiness(self):
+        """Cached check results, refreshed by at most one caller at a time"""
+        if self._cached is not None and monotonic() - self._cached_at < self.ttl:
+            return self._cached
+        # Only one caller refreshes; the others serve the previous result if
+        # there is one, or wait for the refresh on the very first probe
+        if not self._refresh_lock.acquire(blocking=self._cached is None):
+            return self._cached
+        try:
+            if self._cached is None or monotonic() - self._cached_at >= self.ttl:
+                self._cached = self.run_checks()
+                self._cached_at = monotonic()
+            return self._cached
+        finally:
+            self._refresh_lock.release()
+
+    # Views
+
+    def live(self):
+        return Response(self._live_body, mimetype='application/json', headers=NO_STORE)
+
+    def ready(self):
+        results = self.readiness()
+        ready = all(result.ok for result in results.values())
+        body = {
+            'status': 'ready' if ready else 'not_ready',
+            'checked_seconds_ago': round(monotonic() - self._cached_at, 3),
+            'checks': {name: result.to_dict() for name, result in results.items()},
+        }
+        return Response(json.dumps(body), status=200 if ready else 503,
+                        mimetype='application/json', headers=NO_STORE)
@@ -0,0 +1,94 @@
+"""
+JSON provider that uses orjson when it is installed.
+
+Falls back to the standard library encoder otherwise. Both paths encode
+datetime, date and UUID values the same way (ISO 8601 / canonical string),
+so views can return them directly instead of calling isoformat().
+"""
+
+import json
+import uuid
+import decimal
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _default(obj):
+    """Encode what the encoder cannot: dates and UUIDs on the stdlib path,
+    Decimal and markup-safe strings on both"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider serializing straight to bytes where possible"""
+
+    sort_keys = False
+    indent = None
+
+    def __init__(self, app, use_orjson=True):
+        super().__init__(app)
+        self.use_orjson = use_orjson and orjson is not None
+        self._orjson_options = 0
+
+    def configure(self, indent=None, sort_keys=False):
+        self.indent = indent
+        self.sort_keys = sort_keys
+        if orjson is not None:
+            options = orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                options |= orjson.OPT_SORT_KEYS
+            if indent:
+                options |= orjson.OPT_INDENT_2
+            self._orjson_options = options
+
+    def dumps_bytes(self, obj):
+        """Serialize to UTF-8 bytes without building an intermediate str"""
+        if self.use_orjson:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options)
+        return json.dumps(
+            obj, default=_default, ensure_ascii=False, sort_keys=self.sort_keys,
+            indent=self.indent, separators=None if self.indent else (',', ':')
+        ).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', False)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self.dumps_bytes(obj) + (b'\n' if self.indent else b'')
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Install FastJSONProvider on an app, honouring JSON_USE_ORJSON and pretty-printing config"""
+    provider = FastJSONProvider(app, use_orjson=app.config.get('JSON_USE_ORJSON', True))
+    provider.configure(
+        indent=2 if app.config.get('JSONIFY_PRETTYPRINT_REGULAR') else None,
+        sort_keys=app.config.get('JSON_SORT_KEYS', False)
+    )
+    app.json = provider
+    return provider
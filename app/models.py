@@ -1,15 +1,62 @@
-"""
 # Database models for Flask application
 # This is an example implementation using SQLAlchemy
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
+from operator import attrgetter
 import uuid
 
 db = SQLAlchemy()
 
+
+class ColumnSerializer:
+    """Serializer for one model, built once from its table's columns.
+
+    Attribute access goes through a single ``operator.attrgetter`` instead of
+    a per-row walk over ``__table__.columns``. Projections are compiled on
+    first use and cached.
+    """
+    
+    def __init__(self, model):
+        self.model = model
+        self.fields = tuple(column.name for column in model.__table__.columns)
+        self._getters = {}
+    
+    def _getter(self, fields):
+        getter = self._getters.get(fields)
+        if getter is None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise ValueError(f"Unknown fields for {self.model.__name__}: {sorted(unknown)}")
+            getter = attrgetter(*fields)
+            if len(fields) == 1:
+                single = getter
+                getter = lambda obj: (single(obj),)
+            self._getters[fields] = getter
+        return getter
+    
+    def one(self, obj, fields=None):
+        fields = tuple(fields) if fields else self.fields
+        return dict(zip(fields, self._getter(fields)(obj)))
+    
+    def many(self, objs, fields=None):
+        fields = tuple(fields) if fields else self.fields
+        getter = self._getter(fields)
+        return [dict(zip(fields, getter(obj))) for obj in objs]
+    
+    def columns(self, fields=None):
+        """Column objects for a projection, for use in select()"""
+        table = self.model.__table__
+        return [table.columns[name] for name in (fields or self.fields)]
+    
+    def rows(self, rows, fields=None):
+        """Serialize plain result tuples from select(*columns(fields))"""
+        fields = tuple(fields) if fields else self.fields
+        return [dict(zip(fields, row)) for row in rows]
+
 class BaseModel(db.Model):
-    \"\"\"Base model with common fields.\"\"\"
+    """Base model with common fields."""
     
     __abstract__ = True
     
@@ -17,15 +64,33 @@ class BaseModel(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    def to_dict(self):
-        \"\"\"Convert model to dictionary.\"\"\"
-        return {
-            column.name: getattr(self, column.name)
-            for column in self.__table__.columns
-        }
+    def to_dict(self, fields=None):
+        """Convert model to dictionary."""
+        return self.__serializer__.one(self, fields)
+    
+    @classmethod
+    def serialize_many(cls, objs, fields=None):
+        """Serialize a list of instances in one pass."""
+        return cls.__serializer__.many(objs, fields)
+    
+    @classmethod
+    def select_dicts(cls, *criteria, fields=None, session=None):
+        """Query only the requested columns and serialize rows without hydrating instances."""
+        serializer = cls.__serializer__
+        stmt = db.select(*serializer.columns(fields))
+        if criteria:
+            stmt = stmt.where(*criteria)
+        result = (session or db.session).execute(stmt)
+        return serializer.rows(result, fields)
+
+
+@event.listens_for(BaseModel, 'instrument_class', propagate=True)
+def _build_serializer(mapper, cls):
+    """Compile each model's serializer when the class is defined"""
+    cls.__serializer__ = ColumnSerializer(cls)
 
 class User(BaseModel):
-    \"\"\"User model.\"\"\"
+    """User model."""
     
     __tablename__ = 'users'
     
@@ -39,7 +104,7 @@ class User(BaseModel):
         return f'<User {self.username}>'
 
 class DeploymentLog(BaseModel):
-    \"\"\"Deployment log model.\"\"\"
+    """Deployment log model."""
     
     __tablename__ = 'deployment_logs'
     
@@ -53,4 +118,3 @@ class DeploymentLog(BaseModel):
     
     def __repr__(self):
         return f'<DeploymentLog {self.version} - {self.status}>'
-"""
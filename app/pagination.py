@@ -0,0 +1,114 @@
+"""
+Keyset pagination and streaming helpers for list endpoints.
+
+Pages are addressed by an opaque cursor holding the key of the last row
+returned, so fetching page N costs the same as fetching page 1. Streaming
+responses pull rows from the source in fixed-size batches, which keeps
+memory per request bounded no matter how many rows there are.
+"""
+
+import json
+import base64
+import binascii
+from bisect import bisect_right
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+
+def encode_cursor(key):
+    raw = json.dumps({'after': key}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor, key_type=None):
+    """Key inside a cursor; ``key_type`` is the type of the source's keys, if known"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded))['after']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}')
+    # A key of another type would fail the comparison in page(); bool is an int subclass
+    if isinstance(after, bool) or not isinstance(after, key_type or (int, float, str)):
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}')
+    return after
+
+
+class ListDataSource:
+    """Rows ordered by a unique key, queried the way a keyset index would be.
+
+    Stands in for a table scan of the form
+    ``WHERE key > :after ORDER BY key LIMIT :limit``.
+    """
+
+    def __init__(self, rows, key=lambda row: row):
+        self.key = key
+        self.rows = sorted(rows, key=key)
+        self._keys = [key(row) for row in self.rows]
+        self.key_type = type(self._keys[0]) if self._keys else None
+
+    def page(self, after=None, limit=100):
+        start = 0 if after is None else bisect_right(self._keys, after)
+        return self.rows[start:start + limit]
+
+    def iter_rows(self, after=None, batch_size=1000):
+        """Yield every row after ``after``, fetching one batch at a time"""
+        while True:
+            batch = self.page(after, batch_size)
+            if not batch:
+                return
+            yield from batch
+            after = self.key(batch[-1])
+
+
+def paginate(source, cursor=None, limit=100):
+    """Return (rows, next_cursor) for one page"""
+    rows = source.page(decode_cursor(cursor, getattr(source, 'key_type', None)), limit + 1)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(source.key(rows[-1]))
+    return rows, None
+
+
+def stream_json_array(source, dumps, cursor=None, batch_size=1000, extra=None):
+    """Generate a JSON object ``{"data": [...], **extra}`` chunk by chunk"""
+    after = decode_cursor(cursor, getattr(source, 'key_type', None))
+
+    def generate():
+        yield b'{"data":['
+        first = True
+        batch = []
+        for row in source.iter_rows(after, batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                chunk = dumps(batch)[1:-1]
+                yield chunk if first else b',' + chunk
+                first = False
+                batch = []
+        if batch:
+            chunk = dumps(batch)[1:-1]
+            yield chunk if first else b',' + chunk
+        tail = dumps(extra or {})[1:-1]
+        yield b']' + (b',' + tail if tail else b'') + b'}'
+
+    return generate()
+
+
+def stream_ndjson(source, dumps, cursor=None, batch_size=1000):
+    """Generate newline-delimited JSON, one row per line"""
+    after = decode_cursor(cursor, getattr(source, 'key_type', None))
+
+    def generate():
+        batch = []
+        for row in source.iter_rows(after, batch_size):
+            batch.append(dumps(row))
+            if len(batch) >= batch_size:
+                yield b'\n'.join(batch) + b'\n'
+                batch = []
+        if batch:
+            yield b'\n'.join(batch) + b'\n'
+
+    return generate()
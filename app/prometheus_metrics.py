@@ -0,0 +1,394 @@
+"""
+Prometheus /metrics endpoint aggregated across gunicorn workers.
+
+Each worker process writes its samples into its own memory-mapped file under
+PROMETHEUS_MULTIPROC_DIR. A scrape, whichever worker serves it, reads every
+file and sums the samples, so the numbers never depend on which worker
+answered. When a worker exits, the gunicorn master folds its counters into a
+single archive file and deletes the worker file (see gunicorn.conf.py). A
+scrape therefore reads one file per live worker plus one, no matter how often
+workers are recycled.
+"""
+
+import os
+import json
+import mmap
+import struct
+import logging
+import tempfile
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from time import monotonic
+
+from flask import Response
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('<I4x')  # bytes in use, including the header
+KEY_LEN = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+ARCHIVE_FILE = 'archive.db'
+
+# Counters outlive their worker; gauges describe a live process and die with it
+MODE_SUM = 'sum'
+MODE_LIVE = 'live'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+FAMILIES = {
+    'flask_http_requests_total': ('counter', 'HTTP requests by route, method and status'),
+    'flask_http_request_duration_seconds': ('histogram', 'HTTP request latency by route and method'),
+    'flask_http_requests_in_flight': ('gauge', 'Requests currently being served'),
+    'flask_response_cache_events_total': ('counter', 'Response cache events by type'),
+    'flask_response_cache_entries': ('gauge', 'Entries in the in-process response caches'),
+    'flask_rate_limit_events_total': ('counter', 'Rate limiter decisions and store syncs by type'),
+    'flask_session_events_total': ('counter', 'Server-side session requests, store round trips and writes'),
+    'flask_db_pool_size': ('gauge', 'Configured database pool size'),
+    'flask_db_pool_checked_out': ('gauge', 'Database connections currently checked out'),
+    'flask_db_pool_overflow': ('gauge', 'Database connections opened beyond the pool size'),
+    'flask_log_queue_depth': ('gauge', 'Log records waiting for the listener thread, by queue'),
+    'flask_log_records_dropped_total': ('counter', 'Log records dropped because the queue was full, by queue'),
+}
+
+CACHE_EVENTS = ('hits', 'misses', 'evictions', 'expirations', 'remote_hits',
+                'remote_errors', 'decode_errors', 'not_modified')
+RATE_LIMIT_EVENTS = ('allowed', 'limited', 'syncs', 'forced_syncs', 'remote_errors')
+SESSION_EVENTS = ('requests', 'round_trips', 'loads', 'local_hits', 'writes', 'deletes',
+                  'conflicts', 'refreshed')
+# app.extensions keys of the queued logging pipelines, and their queue label
+LOG_QUEUES = (('log_queue', 'app'), ('access_log_queue', 'access'))
+
+
+def default_directory():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR',
+                          os.path.join(tempfile.gettempdir(), 'flask_app_metrics'))
+
+
+def _entries(buf, used):
+    """Yield (key, value, value_offset) for every entry in a store buffer"""
+    pos = HEADER.size
+    while pos < used:
+        length = KEY_LEN.unpack_from(buf, pos)[0]
+        start = pos + KEY_LEN.size
+        key = bytes(buf[start:start + length]).decode()
+        offset = start + length + (-(KEY_LEN.size + length) % 8)
+        yield key, VALUE.unpack_from(buf, offset)[0], offset
+        pos = offset + VALUE.size
+
+
+def read_file(path):
+    """Read a store file written by any process"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        return
+    for key, value, _ in _entries(data, HEADER.unpack_from(data, 0)[0]):
+        yield key, value
+
+
+class MmapValues:
+    """Append-only key -> float64 map in a memory-mapped file with a single writer.
+
+    Entries are written in full before the header's used-bytes count moves
+    past them, so readers in other processes never see a half-written key.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = HEADER.unpack_from(self._map, 0)[0] or HEADER.size
+        self._positions = {key: offset for key, _, offset in _entries(self._map, self._used)}
+
+    def _append(self, key):
+        encoded = key.encode()
+        padding = -(KEY_LEN.size + len(encoded)) % 8
+        size = KEY_LEN.size + len(encoded) + padding + VALUE.size
+        if self._used + size > len(self._map):
+            new_size = len(self._map)
+            while self._used + size > new_size:
+                new_size *= 2
+            self._map.close()
+            self._file.truncate(new_size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+
+        pos = self._used
+        KEY_LEN.pack_into(self._map, pos, len(encoded))
+        self._map[pos + KEY_LEN.size:pos + KEY_LEN.size + len(encoded)] = encoded
+        offset = pos + KEY_LEN.size + len(encoded) + padding
+        VALUE.pack_into(self._map, offset, 0.0)
+        self._used += size
+        HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = offset
+        return offset
+
+    def add(self, key, amount):
+        offset = self._positions.get(key)
+        if offset is None:
+            offset = self._append(key)
+        VALUE.pack_into(self._map, offset, VALUE.unpack_from(self._map, offset)[0] + amount)
+
+    def set(self, key, value):
+        offset = self._positions.get(key)
+        if offset is None:
+            offset = self._append(key)
+        VALUE.pack_into(self._map, offset, value)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class MetricsStore:
+    """Per-process writer plus all-process reader over one metrics directory"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_directory()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+
+    def _file(self):
+        pid = os.getpid()
+        # Also true in a freshly forked worker when the app was preloaded
+        if pid != self._pid:
+            os.makedirs(self.directory, exist_ok=True)
+            self._values = MmapValues(os.path.join(self.directory, f'worker-{pid}.db'))
+            self._pid = pid
+        return self._values
+
+    def add(self, key, amount=1.0):
+        with self._lock:
+            self._file().add(key, amount)
+
+    def set(self, key, value):
+        with self._lock:
+            self._file().set(key, value)
+
+    def collect(self):
+        totals = defaultdict(float)
+        for name in os.listdir(self.directory):
+            if name.endswith('.db'):
+                try:
+                    for key, value in read_file(os.path.join(self.directory, name)):
+                        totals[key] += value
+                except FileNotFoundError:
+                    # Worker file archived between listdir and open
+                    continue
+        return totals
+
+
+def clear_directory(directory=None):
+    """Remove files left over from a previous server run; call from the master on startup"""
+    directory = directory or default_directory()
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.db'):
+            os.remove(os.path.join(directory, name))
+
+
+def mark_process_dead(pid, directory=None):
+    """Fold a dead worker's counters into the archive and drop its gauges"""
+    directory = directory or default_directory()
+    path = os.path.join(directory, f'worker-{pid}.db')
+    if not os.path.exists(path):
+        return
+    archive = MmapValues(os.path.join(directory, ARCHIVE_FILE))
+    try:
+        for key, value in read_file(path):
+            if json.loads(key)[3] == MODE_SUM:
+                archive.add(key, value)
+    finally:
+        archive.close()
+    os.remove(path)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(int(value)) if value == int(value) else repr(value)
+
+
+class PrometheusMetrics:
+    """Flask extension feeding the shared store and serving /metrics"""
+
+    def __init__(self, app=None, store=None):
+        self.store = store
+        self.collectors = []
+        self.publish_interval = 1.0
+        self._last_publish = 0.0
+        self._keys = {}
+        self._parsed = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.store is None:
+            self.store = MetricsStore()
+        self.publish_interval = app.config.get('PROMETHEUS_PUBLISH_INTERVAL', self.publish_interval)
+
+        request_metrics = app.extensions.get('request_metrics')
+        if request_metrics is None:
+            raise RuntimeError('PrometheusMetrics requires RequestMetrics to be initialised first')
+        request_metrics.observers.append(self._observe_request)
+        app.wsgi_app = self._wrap(app.wsgi_app)
+
+        self.add_collector(lambda: self._pool_samples(app))
+        if 'response_cache' in app.extensions:
+            self.add_collector(lambda: self._cache_samples(app.extensions['response_cache']))
+        if 'rate_limiter' in app.extensions:
+            self.add_collector(lambda: self._rate_limit_samples(app.extensions['rate_limiter']))
+        if 'server_session' in app.extensions:
+            self.add_collector(lambda: self._session_samples(app.extensions['server_session']))
+        self.add_collector(lambda: self._log_queue_samples(app))
+
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['prometheus_metrics'] = self
+
+    def add_collector(self, collect):
+        """Register a callable yielding (family, labels, value) for this worker's state"""
+        self.collectors.append(collect)
+
+    def key(self, family, sample, labels=()):
+        cache_key = (sample, labels)
+        key = self._keys.get(cache_key)
+        if key is None:
+            mode = MODE_LIVE if FAMILIES[family][0] == 'gauge' else MODE_SUM
+            key = self._keys[cache_key] = json.dumps([family, sample, sorted(labels), mode])
+        return key
+
+    def _wrap(self, wsgi_app):
+        in_flight = self.key('flask_http_requests_in_flight', 'flask_http_requests_in_flight')
+        store = self.store
+
+        def counted_wsgi_app(environ, start_response):
+            store.add(in_flight, 1)
+            try:
+                app_iter = wsgi_app(environ, start_response)
+            except BaseException:
+                store.add(in_flight, -1)
+                raise
+            # Streaming responses stay in flight until the server closes them
+            return ClosingIterator(app_iter, lambda: store.add(in_flight, -1))
+
+        return counted_wsgi_app
+
+    def _observe_request(self, route, method, status, elapsed_us):
+        family = 'flask_http_request_duration_seconds'
+        seconds = elapsed_us / 1e6
+        labels = (('method', method), ('route', route))
+        le = LATENCY_BUCKETS[bisect_left(LATENCY_BUCKETS, seconds)]
+        self.store.add(self.key('flask_http_requests_total', 'flask_http_requests_total',
+                                labels + (('status', str(status)),)))
+        self.store.add(self.key(family, family + '_bucket', labels + (('le', le),)))
+        self.store.add(self.key(family, family + '_sum', labels), seconds)
+        self.store.add(self.key(family, family + '_count', labels))
+
+        now = monotonic()
+        if now - self._last_publish >= self.publish_interval:
+            self._last_publish = now
+            self.publish()
+
+    def _cache_samples(self, cache):
+        stats = cache.stats()
+        for event in CACHE_EVENTS:
+            yield 'flask_response_cache_events_total', (('event', event),), stats[event]
+        yield 'flask_response_cache_entries', (), stats['entries']
+
+    def _rate_limit_samples(self, limiter):
+        stats = limiter.stats()
+        for event in RATE_LIMIT_EVENTS:
+            yield 'flask_rate_limit_events_total', (('event', event),), stats[event]
+
+    def _session_samples(self, sessions):
+        stats = sessions.stats()
+        for event in SESSION_EVENTS:
+            yield 'flask_session_events_total', (('event', event),), stats[event]
+
+    def _log_queue_samples(self, app):
+        for name, label in LOG_QUEUES:
+            pipeline = app.extensions.get(name)
+            if pipeline is None:
+                continue
+            stats = pipeline.stats()
+            yield 'flask_log_queue_depth', (('queue', label),), stats['queue_depth']
+            yield 'flask_log_records_dropped_total', (('queue', label),), stats['dropped']
+
+    def _pool_samples(self, app):
+        ext = app.extensions.get('sqlalchemy')
+        if ext is None:
+            return
+        # Flask-SQLAlchemy 2.x stores a state object, 3.x the extension itself
+        pool = getattr(ext, 'db', ext).engine.pool
+        if not hasattr(pool, 'checkedout'):
+            return
+        yield 'flask_db_pool_size', (), pool.size()
+        yield 'flask_db_pool_checked_out', (), pool.checkedout()
+        yield 'flask_db_pool_overflow', (), pool.overflow()
+
+    def publish(self):
+        """Copy this worker's cache and pool state into the shared store.
+
+        Cache counters are cumulative per worker, so they are stored by value
+        rather than incremented; the archive keeps them once the worker exits.
+        """
+        for collect in self.collectors:
+            try:
+                for family, labels, value in collect():
+                    self.store.set(self.key(family, family, labels), value)
+            except Exception:
+                logger.debug('Metrics collector failed', exc_info=True)
+
+    def _parse(self, key):
+        parsed = self._parsed.get(key)
+        if parsed is None:
+            family, sample, labels, _ = json.loads(key)
+            parsed = self._parsed[key] = (family, sample, tuple(map(tuple, labels)))
+        return parsed
+
+    def render(self):
+        self.publish()
+        samples = defaultdict(list)
+        histograms = defaultdict(lambda: defaultdict(dict))
+        for key, value in self.store.collect().items():
+            family, sample, labels = self._parse(key)
+            if sample.endswith('_bucket'):
+                base = tuple(label for label in labels if label[0] != 'le')
+                histograms[family][base][dict(labels)['le']] = value
+            else:
+                samples[family].append((sample, labels, value))
+
+        lines = []
+        for family, (kind, help_text) in FAMILIES.items():
+            if family not in samples and family not in histograms:
+                continue
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            # Buckets are stored per bucket; Prometheus wants them cumulative
+            for base, counts in histograms.get(family, {}).items():
+                cumulative = 0
+                for le in LATENCY_BUCKETS:
+                    cumulative += counts.get(le, 0)
+                    labels = _format_labels(base + (('le', _format_value(le)),))
+                    lines.append(f'{family}_bucket{labels} {_format_value(cumulative)}')
+            for sample, labels, value in sorted(samples.get(family, ())):
+                lines.append(f'{sample}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
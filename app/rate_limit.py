@@ -0,0 +1,390 @@
+"""
+Token-bucket rate limiting with per-worker buckets and batched Redis sync.
+
+Each worker answers the allow/deny question from its own bucket, so a
+client it already knows costs no I/O on the request path. A background thread pushes the tokens consumed since
+the last sync to Redis in one pipelined round trip, and the shared bucket
+levels it gets back replace the local ones. A worker may hold at most
+``max_unsynced`` unpushed tokens per client; reaching that limit forces a
+sync before the next request is admitted. So across W workers a client can
+get at most about (W - 1) * max_unsynced requests beyond the configured limit.
+
+Each worker keeps buckets for its ``max_keys`` most recent clients. An
+evicted bucket's unsynced tokens wait for the next sync. A client without a
+bucket, whether new or evicted, gets its shared level in one round trip
+before its request is decided, so eviction never hands out a full bucket.
+"""
+
+import os
+import re
+import time
+import atexit
+import logging
+import threading
+import importlib.util
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LIMIT = re.compile(r'^\s*(\d+)\s*(?:per|/)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$')
+
+# Refill the shared bucket from Redis server time, so app hosts' clocks don't matter.
+# The level may go negative: tokens admitted locally beyond the limit are a
+# debt that later refills pay off first.
+CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local used = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or capacity
+local at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - at) * rate) - used
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(tokens)
+"""
+
+
+def parse_limit(value):
+    """'1000 per hour', '10/minute' or '100 per 5 minutes' -> (tokens, seconds)"""
+    match = _LIMIT.match(value or '')
+    if not match:
+        raise ValueError(f'Unrecognised rate limit {value!r}')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+class InMemoryBucketStore:
+    """Shared bucket levels kept in this process; stands in for Redis in tests and development"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, updates):
+        """Apply [(key, capacity, rate, used)] and return the resulting levels"""
+        now = time.time()
+        levels = []
+        with self._lock:
+            for key, capacity, rate, used in updates:
+                tokens, at = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + max(0.0, now - at) * rate) - used
+                self._buckets[key] = (tokens, now)
+                levels.append(tokens)
+        return levels
+
+
+class RedisBucketStore:
+    """Shared bucket levels in Redis, every update of a sync in one pipeline"""
+
+    def __init__(self, url, **options):
+        self.url = url
+        self.options = options
+        self._client = None
+        self._script = None
+        self._lock = threading.Lock()
+
+    @property
+    def script(self):
+        if self._script is None:
+            with self._lock:
+                if self._script is None:
+                    import redis
+                    self._client = redis.Redis.from_url(self.url, **self.options)
+                    self._script = self._client.register_script(CONSUME_SCRIPT)
+        return self._script
+
+    def consume(self, updates):
+        script = self.script
+        pipe = self._client.pipeline(transaction=False)
+        for key, capacity, rate, used in updates:
+            script(keys=[key], args=[capacity, rate, used], client=pipe)
+        return [float(level) for level in pipe.execute()]
+
+
+def create_bucket_store(app):
+    """Shared store for bucket levels, from RATELIMIT_STORAGE_URL"""
+    url = app.config.get('RATELIMIT_STORAGE_URL')
+    if app.config.get('TESTING') or not url or url.startswith('memory://'):
+        return InMemoryBucketStore()
+    if importlib.util.find_spec('redis') is None:
+        logger.warning('redis package not installed, rate limits are per-worker only')
+        return None
+    return RedisBucketStore(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+
+
+class RateLimiter:
+    """Flask extension enforcing RATELIMIT_DEFAULT per client address"""
+
+    # After a store error, limit from local buckets only for this many seconds
+    REMOTE_BACKOFF = 5.0
+
+    def __init__(self, app=None, store=None, sync_interval=0.5, max_unsynced=10, max_keys=10000):
+        self.store = store
+        self.sync_interval = sync_interval
+        self.max_unsynced = max_unsynced
+        self.max_keys = max_keys
+        self.enabled = True
+        self.headers_enabled = False
+        self.capacity, self.period = 1000, 3600
+        self.rate = self.capacity / self.period
+        self.key_prefix = 'flask_app:ratelimit:'
+        self.exempt_prefixes = ('/health', '/metrics')
+        self._exempt_views = set()
+        # key -> [tokens, updated (monotonic), unsynced tokens]
+        self._buckets = OrderedDict()
+        # key -> unsynced tokens of evicted buckets, pushed by the next sync
+        self._evicted = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._remote_down_until = 0.0
+        self.allowed = 0
+        self.limited = 0
+        self.syncs = 0
+        self.forced_syncs = 0
+        self.remote_errors = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True) and bool(app.config.get('RATELIMIT_DEFAULT'))
+        self.headers_enabled = app.config.get('RATELIMIT_HEADERS_ENABLED', False)
+        self.sync_interval = app.config.get('RATELIMIT_SYNC_INTERVAL', self.sync_interval)
+        self.max_unsynced = max(1, app.config.get('RATELIMIT_MAX_UNSYNCED', self.max_unsynced))
+        self.key_prefix = app.config.get('SESSION_KEY_PREFIX', 'flask_app:') + 'ratelimit:'
+        self.exempt_prefixes = tuple(app.config.get('RATELIMIT_EXEMPT_PREFIXES', self.exempt_prefixes))
+        app.extensions['rate_limiter'] = self
+        if not self.enabled:
+            return
+        self.capacity, self.period = parse_limit(app.config['RATELIMIT_DEFAULT'])
+        self.rate = self.capacity / self.period
+        if self.store is None:
+            self.store = create_bucket_store(app)
+        app.before_request(self._before)
+        if self.headers_enabled:
+            app.after_request(self._after)
+        if self.store is not None:
+            self.start()
+
+    def exempt(self, view):
+        """Decorator for views that are never rate limited"""
+        self._exempt_views.add(view)
+        return view
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='rate-limit-sync', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the sync thread and push whatever consumption is still pending"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.sync()
+        except Exception as e:
+            logger.warning('Final rate limit sync failed: %s', e)
+
+    def _after_fork(self):
+        # The parent's buckets and pending consumption stay with the parent
+        running = self._thread is not None
+        self._buckets = OrderedDict()
+        self._evicted = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if running:
+            self.start()
+
+    def client_key(self):
+        # nginx appends the address it saw to X-Forwarded-For, so the last
+        # entry is the one the client cannot forge
+        route = request.access_route
+        return route[-1] if route else request.remote_addr or 'unknown'
+
+    def hit(self, key, cost=1):
+        """Take ``cost`` tokens for ``key`` if available; returns (allowed, tokens left)"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._buckets.move_to_end(key)
+        if bucket is None:
+            bucket = self._new_bucket(key)
+        now = time.monotonic()
+        with self._lock:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < cost:
+                self.limited += 1
+                return False, bucket[0]
+            bucket[0] -= cost
+            bucket[2] += cost
+            self.allowed += 1
+            remaining, unsynced = bucket[0], bucket[2]
+            if self._buckets.get(key) is not bucket:
+                # Evicted since the first lock; keep its consumption for the sync
+                self._evicted[key] = self._evicted.get(key, 0) + bucket[2]
+                bucket[2] = 0
+        if unsynced >= self.max_unsynced and self.store is not None and \
+                time.monotonic() >= self._remote_down_until:
+            # The accuracy bound: don't admit more before the store has this
+            self.forced_syncs += 1
+            self._safe_sync()
+        elif unsynced * 2 >= self.max_unsynced:
+            self._wake.set()
+        return True, remaining
+
+    def _new_bucket(self, key):
+        """Bucket for a client this worker holds none for, starting at the shared level"""
+        with self._lock:
+            used = self._evicted.pop(key, 0)
+        tokens = float(self.capacity)
+        if self.store is not None and time.monotonic() >= self._remote_down_until:
+            try:
+                # Pushes what an evicted bucket still owed, and reads the level
+                tokens = self.store.consume([(self.key_prefix + key, self.capacity, self.rate,
+                                              min(used, self.capacity))])[0]
+                used = 0
+            except Exception as e:
+                self._remote_failed(e)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [tokens, time.monotonic(), used]
+                if len(self._buckets) > self.max_keys:
+                    self._evict()
+            elif used:
+                # Another thread created it meanwhile
+                bucket[2] += used
+            backlog = len(self._evicted) > self.max_keys
+        if backlog:
+            if self.store is not None and time.monotonic() >= self._remote_down_until:
+                # Churn outpaces the background sync; push before it grows further
+                self.forced_syncs += 1
+                self._safe_sync()
+            else:
+                # Nowhere to push it to; the oldest debts go
+                with self._lock:
+                    while len(self._evicted) > self.max_keys:
+                        del self._evicted[next(iter(self._evicted))]
+        return bucket
+
+    def _evict(self):
+        # Called with self._lock held
+        key, bucket = self._buckets.popitem(last=False)
+        if bucket[2]:
+            self._evicted[key] = self._evicted.get(key, 0) + bucket[2]
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+            self._safe_sync()
+
+    def _safe_sync(self):
+        try:
+            self.sync()
+        except Exception as e:
+            self._remote_failed(e)
+
+    def _remote_failed(self, error):
+        self.remote_errors += 1
+        self._remote_down_until = time.monotonic() + self.REMOTE_BACKOFF
+        logger.warning('Rate limit store unavailable: %s', error)
+
+    def sync(self):
+        """Push unsynced consumption in one round trip and adopt the shared levels"""
+        if self.store is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                pending, self._evicted = list(self._evicted.items()), {}
+                for key, bucket in self._buckets.items():
+                    if bucket[2]:
+                        pending.append((key, bucket[2]))
+                        bucket[2] = 0
+            if not pending:
+                return 0
+            try:
+                # Consumption piled up while the store was down is capped at
+                # one full bucket, so recovery doesn't lock clients out for long
+                levels = self.store.consume([(self.key_prefix + key, self.capacity, self.rate,
+                                              min(used, self.capacity)) for key, used in pending])
+            except Exception:
+                # Keep the consumption so it is pushed with the next sync
+                with self._lock:
+                    for key, used in pending:
+                        bucket = self._buckets.get(key)
+                        if bucket is not None:
+                            bucket[2] += used
+                        else:
+                            self._evicted[key] = self._evicted.get(key, 0) + used
+                raise
+            now = time.monotonic()
+            with self._lock:
+                for (key, _), level in zip(pending, levels):
+                    bucket = self._buckets.get(key)
+                    if bucket is not None:
+                        # Tokens taken while the sync was in flight aren't in level yet
+                        bucket[0], bucket[1] = level - bucket[2], now
+            self.syncs += 1
+            return len(pending)
+
+    def _limit_headers(self, remaining):
+        missing = self.capacity - max(remaining, 0)
+        return {
+            'X-RateLimit-Limit': str(self.capacity),
+            'X-RateLimit-Remaining': str(max(int(remaining), 0)),
+            'X-RateLimit-Reset': str(int(time.time() + missing / self.rate) + 1)
+        }
+
+    def _before(self):
+        if request.path.startswith(self.exempt_prefixes):
+            return None
+        if current_app.view_functions.get(request.endpoint) in self._exempt_views:
+            return None
+        allowed, remaining = self.hit(self.client_key())
+        if allowed:
+            request.environ['rate_limit.remaining'] = remaining
+            return None
+        response = jsonify({'error': 'Too many requests'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(int((1 - remaining) / self.rate) + 1)
+        if self.headers_enabled:
+            response.headers.extend(self._limit_headers(remaining))
+        return response
+
+    def _after(self, response):
+        remaining = request.environ.get('rate_limit.remaining')
+        if remaining is not None:
+            response.headers.extend(self._limit_headers(remaining))
+        return response
+
+    def stats(self):
+        return {
+            'limit': self.capacity,
+            'period': self.period,
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'syncs': self.syncs,
+            'forced_syncs': self.forced_syncs,
+            'remote_errors': self.remote_errors,
+            'keys': len(self._buckets)
+        }
@@ -0,0 +1,184 @@
+"""
+Per-request latency histograms and sampled structured access logging.
+
+Each worker keeps one log-linear (HDR-style) histogram per route and method,
+plus status and response-size counters. Access log lines are JSON, sampled
+at ACCESS_LOG_SAMPLE_RATE; server errors and slow requests are always logged.
+"""
+
+import json
+import random
+import threading
+from time import perf_counter
+
+from flask import request
+
+# 2**SUB_BUCKET_BITS linear sub-buckets per power of two: ~6% relative error
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Values are microseconds; anything above 2**36 us (about 19 hours) is clamped
+MAX_EXPONENT = 36
+MAX_VALUE = (1 << MAX_EXPONENT) - 1
+BUCKET_COUNT = (MAX_EXPONENT - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+
+class LatencyHistogram:
+    """Log-linear histogram of microsecond values with bounded relative error"""
+
+    __slots__ = ('counts', 'count', 'total', 'max', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket_index(value):
+        # Values below SUB_BUCKETS get exact buckets; above that each power of
+        # two is split into SUB_BUCKETS equal-width buckets
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return shift * SUB_BUCKETS + (value >> shift)
+
+    @staticmethod
+    def bucket_upper_bound(index):
+        """Largest value that falls into bucket ``index``"""
+        if index < SUB_BUCKETS:
+            return index
+        octave, sub = divmod(index, SUB_BUCKETS)
+        return ((sub + SUB_BUCKETS + 1) << (octave - 1)) - 1
+
+    def record(self, value):
+        value = min(int(value), MAX_VALUE)
+        index = self.bucket_index(value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0
+        target = max(1, int(round(self.count * pct / 100.0)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self.bucket_upper_bound(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            count = self.count
+            return {
+                'count': count,
+                'mean_us': round(self.total / count, 1) if count else 0,
+                'p50_us': self.percentile(50),
+                'p90_us': self.percentile(90),
+                'p99_us': self.percentile(99),
+                'max_us': self.max,
+            }
+
+
+class RouteStats:
+    """Latency histogram plus status and size counters for one route/method"""
+
+    __slots__ = ('latency', 'statuses', 'bytes_sent')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.statuses = {}
+        self.bytes_sent = 0
+
+
+class RequestMetrics:
+    """Flask extension recording route, status, latency and size of every request"""
+
+    START_KEY = 'request_metrics.start'
+
+    def __init__(self, app=None):
+        self.routes = {}
+        self._lock = threading.Lock()
+        self.sample_rate = 0.01
+        self.always_log_status = 500
+        self.slow_threshold_us = 1_000_000
+        self.logger = None
+        # Callables taking (route, method, status, elapsed_us) for every request
+        self.observers = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('ACCESS_LOG_SAMPLE_RATE', self.sample_rate)
+        self.always_log_status = app.config.get('ACCESS_LOG_ALWAYS_STATUS', self.always_log_status)
+        self.slow_threshold_us = int(app.config.get('ACCESS_LOG_SLOW_MS', 1000) * 1000)
+        self.logger = app.logger.getChild('access')
+        # The start stamp is taken in WSGI middleware rather than a
+        # before_request hook: it covers request context setup too, and every
+        # Flask hook costs a few microseconds of dispatch
+        app.wsgi_app = self._wrap(app.wsgi_app)
+        app.after_request(self._after)
+        app.extensions['request_metrics'] = self
+
+    def _wrap(self, wsgi_app):
+        key = self.START_KEY
+
+        def timed_wsgi_app(environ, start_response):
+            environ[key] = perf_counter()
+            return wsgi_app(environ, start_response)
+
+        return timed_wsgi_app
+
+    def _stats_for(self, key):
+        stats = self.routes.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self.routes.setdefault(key, RouteStats())
+        return stats
+
+    def _after(self, response):
+        # Also runs for the 500 response built from an unhandled exception
+        req = request._get_current_object()
+        started = req.environ.get(self.START_KEY)
+        if started is not None:
+            self.observe(req, response.status_code, response.content_length or 0,
+                         (perf_counter() - started) * 1e6)
+        return response
+
+    def observe(self, req, status, size, elapsed_us):
+        rule = req.url_rule
+        route = rule.rule if rule is not None else '<unmatched>'
+        stats = self._stats_for((route, req.method))
+        stats.latency.record(elapsed_us)
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        stats.bytes_sent += size
+        for observer in self.observers:
+            observer(route, req.method, status, elapsed_us)
+
+        if (status >= self.always_log_status or elapsed_us >= self.slow_threshold_us
+                or random.random() < self.sample_rate):
+            self.logger.info(json.dumps({
+                'route': route,
+                'method': req.method,
+                'status': status,
+                'latency_ms': round(elapsed_us / 1000.0, 3),
+                'bytes': size,
+                'path': req.path,
+                'remote_addr': req.remote_addr,
+                'sample_rate': 1.0 if status >= self.always_log_status else self.sample_rate,
+            }, separators=(',', ':')))
+
+    def snapshot(self):
+        return {
+            f'{method} {route}': dict(
+                stats.latency.snapshot(),
+                statuses={str(k): v for k, v in stats.statuses.items()},
+                bytes_sent=stats.bytes_sent
+            )
+            for (route, method), stats in list(self.routes.items())
+        }
@@ -0,0 +1,289 @@
+"""
+Two-tier response cache for Flask views.
+
+Responses are cached per worker in a bounded LRU with a TTL and shared
+between workers through Redis. Cached entries carry a strong ETag, so a
+matching If-None-Match is answered with 304 without touching the body.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+import importlib.util
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Serialized response body plus the metadata needed to replay it"""
+
+    __slots__ = ('body', 'etag', 'mimetype', 'expires_at')
+
+    def __init__(self, body, etag, mimetype, expires_at):
+        self.body = body
+        self.etag = etag
+        self.mimetype = mimetype
+        self.expires_at = expires_at
+
+    def encode(self):
+        header = f"{self.etag}\n{self.mimetype}\n{self.expires_at}\n".encode()
+        return header + self.body
+
+    @classmethod
+    def decode(cls, raw):
+        etag, mimetype, expires_at, body = raw.split(b'\n', 3)
+        return cls(body, etag.decode(), mimetype.decode(), float(expires_at))
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry and hit/miss/eviction counters"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class InMemoryStore:
+    """Minimal stand-in for the Redis client, used in tests and development"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return None
+            raw, expires_at = value
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            return raw
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+class LazyRedisStore:
+    """Redis client that imports redis and connects on first use, not at startup"""
+
+    def __init__(self, url, **options):
+        self.url = url
+        self.options = options
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+                    self._client = redis.Redis.from_url(self.url, **self.options)
+        return self._client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ex=None):
+        return self.client.set(key, value, ex=ex)
+
+    def delete(self, *keys):
+        return self.client.delete(*keys)
+
+
+def create_store(app):
+    """Shared store for the second tier, chosen from CACHE_TYPE"""
+    if app.config.get('TESTING') or app.config.get('CACHE_TYPE', 'simple') != 'redis':
+        return InMemoryStore()
+    # find_spec checks that redis is installed without paying for the import
+    if importlib.util.find_spec('redis') is None:
+        logger.warning('redis package not installed, response cache is per-worker only')
+        return None
+    url = app.config.get('CACHE_REDIS_URL') or app.config.get('REDIS_URL')
+    return LazyRedisStore(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+
+
+class ResponseCache:
+    """Flask extension providing the ``cached`` view decorator"""
+
+    # After a Redis error, skip the shared tier for this many seconds
+    REMOTE_BACKOFF = 5.0
+
+    def __init__(self, app=None, store=None):
+        self.local = LRUCache()
+        self.store = store
+        self.default_timeout = 300
+        self.key_prefix = 'flask_app:response:'
+        self.remote_hits = 0
+        self.remote_errors = 0
+        self.decode_errors = 0
+        self.not_modified = 0
+        self._remote_down_until = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+        self.local.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        # Shared entries are per release, so a rollout never serves the old one's bodies and ETags
+        version = app.config.get('APP_VERSION') or os.getenv('APP_VERSION', '1.0.0')
+        self.key_prefix = f"{app.config.get('SESSION_KEY_PREFIX', 'flask_app:')}response:{version}:"
+        if self.store is None:
+            self.store = create_store(app)
+        app.extensions['response_cache'] = self
+
+    def make_key(self, vary=('Accept',)):
+        """Cache key for the current request: method, path, sorted query and vary headers"""
+        parts = [request.method, request.path]
+        parts += [f"{k}={v}" for k, v in sorted(request.args.items(multi=True))]
+        parts += [f"{h}:{request.headers.get(h, '')}" for h in vary]
+        return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+    def _remote_get(self, key):
+        if self.store is None or time.time() < self._remote_down_until:
+            return None
+        try:
+            raw = self.store.get(self.key_prefix + key)
+        except Exception as e:
+            self._remote_failed(e)
+            return None
+        if raw is None:
+            return None
+        try:
+            entry = CachedResponse.decode(raw)
+        except (ValueError, TypeError) as e:
+            # Corrupt or foreign value: a miss, and the next response replaces it
+            self.decode_errors += 1
+            logger.warning('Dropping undecodable response cache entry %s: %s', key, e)
+            try:
+                self.store.delete(self.key_prefix + key)
+            except Exception as e:
+                self._remote_failed(e)
+            return None
+        if entry.expires_at <= time.time():
+            return None
+        self.remote_hits += 1
+        return entry
+
+    def _remote_set(self, key, entry, timeout):
+        if self.store is None or time.time() < self._remote_down_until:
+            return
+        try:
+            self.store.set(self.key_prefix + key, entry.encode(), ex=max(int(timeout), 1))
+        except Exception as e:
+            self._remote_failed(e)
+
+    def _remote_failed(self, error):
+        self.remote_errors += 1
+        self._remote_down_until = time.time() + self.REMOTE_BACKOFF
+        logger.warning('Response cache store unavailable: %s', error)
+
+    def lookup(self, key):
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self._remote_get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def _respond(self, entry, status_header):
+        if request.if_none_match.contains(entry.etag.strip('"')):
+            self.not_modified += 1
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype=entry.mimetype)
+        response.headers['ETag'] = entry.etag
+        max_age = max(int(entry.expires_at - time.time()), 0)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        response.headers['X-Cache'] = status_header
+        return response
+
+    def cached(self, timeout=None, vary=('Accept',)):
+        """Cache successful GET responses of a view for ``timeout`` seconds"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET' or current_app.debug:
+                    return view(*args, **kwargs)
+
+                key = self.make_key(vary)
+                entry = self.lookup(key)
+                if entry is not None:
+                    return self._respond(entry, 'HIT')
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+
+                ttl = self.default_timeout if timeout is None else timeout
+                body = response.get_data()
+                etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+                entry = CachedResponse(body, etag, response.mimetype, time.time() + ttl)
+                self.local.set(key, entry)
+                self._remote_set(key, entry, ttl)
+                return self._respond(entry, 'MISS')
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {
+            'hits': self.local.hits,
+            'misses': self.local.misses,
+            'evictions': self.local.evictions,
+            'expirations': self.local.expirations,
+            'remote_hits': self.remote_hits,
+            'remote_errors': self.remote_errors,
+            'decode_errors': self.decode_errors,
+            'not_modified': self.not_modified,
+            'entries': len(self.local)
+        }
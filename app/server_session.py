@@ -0,0 +1,519 @@
+"""
+Server-side sessions in Redis, loaded lazily and written back only when changed.
+
+The cookie carries nothing but a (signed) random session id. The session
+is fetched the first time a view reads or writes it, so requests that never
+touch it make no Redis call at all. Each worker keeps recently used sessions
+in a bounded LRU together with the version they were stored under; loading a
+cached session asks Redis for the current version only and skips the
+transfer when it still matches. Writes are compare-and-set on the version,
+and a conflicting write from another worker is merged key by key. TTL
+refreshes for sessions that were used but not changed are collected and sent
+in one pipeline by a background thread.
+"""
+
+import os
+import zlib
+import time
+import atexit
+import secrets
+import logging
+import threading
+import importlib.util
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# One format byte, then the tagged session dict as JSON, deflated past COMPRESS_MIN bytes
+FORMAT_JSON = b'\x01'
+FORMAT_ZLIB = b'\x02'
+COMPRESS_MIN = 512
+
+_DELETED = object()
+
+# Returns false for a missing session, {version} when the caller's copy is
+# current, {version, data} otherwise
+LOAD_SCRIPT = """
+local version = redis.call('HGET', KEYS[1], 'v')
+if not version then return false end
+if version == ARGV[1] then return {version} end
+return {version, redis.call('HGET', KEYS[1], 'd')}
+"""
+
+# Writes only if the stored version is still ARGV[1]; returns {1, new version}
+# or, on conflict, {0, version, data} so the caller can merge without another read
+SAVE_SCRIPT = """
+local version = redis.call('HGET', KEYS[1], 'v') or '0'
+if version ~= ARGV[1] then
+    return {0, version, redis.call('HGET', KEYS[1], 'd') or ''}
+end
+local new_version = redis.call('HINCRBY', KEYS[1], 'v', 1)
+redis.call('HSET', KEYS[1], 'd', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, new_version}
+"""
+
+
+class SessionCodec:
+    """Flask's tagged JSON (tuples, bytes, datetimes, ...) as compact bytes"""
+
+    def __init__(self):
+        self.serializer = TaggedJSONSerializer()
+
+    def _untag(self, value):
+        # Bottom-up, like the object_hook Flask's own loads() uses
+        if isinstance(value, dict):
+            return self.serializer.untag({k: self._untag(v) for k, v in value.items()})
+        if isinstance(value, list):
+            return [self._untag(item) for item in value]
+        return value
+
+    def encode(self, data):
+        tagged = self.serializer.tag(data)
+        if orjson is not None:
+            raw = orjson.dumps(tagged)
+        else:
+            raw = self.serializer.dumps(data).encode()
+        if len(raw) >= COMPRESS_MIN:
+            return FORMAT_ZLIB + zlib.compress(raw, 1)
+        return FORMAT_JSON + raw
+
+    def decode(self, blob):
+        kind, raw = blob[:1], blob[1:]
+        if kind == FORMAT_ZLIB:
+            raw = zlib.decompress(raw)
+        elif kind != FORMAT_JSON:
+            raise ValueError(f'Unknown session format {kind!r}')
+        if orjson is not None:
+            return self._untag(orjson.loads(raw))
+        return self.serializer.loads(raw.decode())
+
+
+class InMemorySessionStore:
+    """Versioned session storage in this process, for tests"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[2] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def load(self, key, known_version):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None, None
+            version, blob, _ = entry
+            return version, (None if version == known_version else blob)
+
+    def save(self, key, expected_version, blob, ttl):
+        with self._lock:
+            entry = self._live(key)
+            version = entry[0] if entry else 0
+            if version != expected_version:
+                return False, version, entry[1] if entry else b''
+            self._data[key] = (version + 1, blob, time.time() + ttl)
+            return True, version + 1, None
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def refresh(self, keys, ttl):
+        with self._lock:
+            for key in keys:
+                entry = self._live(key)
+                if entry is not None:
+                    self._data[key] = (entry[0], entry[1], time.time() + ttl)
+
+
+class RedisSessionStore:
+    """Versioned session hashes ({v, d}) in Redis"""
+
+    def __init__(self, url, **options):
+        self.url = url
+        self.options = options
+        self._client = None
+        self._load_script = None
+        self._save_script = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+                    client = redis.Redis.from_url(self.url, **self.options)
+                    self._load_script = client.register_script(LOAD_SCRIPT)
+                    self._save_script = client.register_script(SAVE_SCRIPT)
+                    self._client = client
+        return self._client
+
+    def load(self, key, known_version):
+        self._connect()
+        reply = self._load_script(keys=[key], args=[known_version or 0])
+        if not reply:
+            return None, None
+        return int(reply[0]), (reply[1] if len(reply) > 1 else None)
+
+    def save(self, key, expected_version, blob, ttl):
+        self._connect()
+        reply = self._save_script(keys=[key], args=[expected_version, blob, ttl])
+        if reply[0] == 1:
+            return True, int(reply[1]), None
+        return False, int(reply[1]), reply[2]
+
+    def delete(self, key):
+        self._connect().delete(key)
+
+    def refresh(self, keys, ttl):
+        pipe = self._connect().pipeline(transaction=False)
+        for key in keys:
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+
+class LazySession(SessionMixin):
+    """Session whose contents are fetched from the store on first use"""
+
+    def __init__(self, interface, sid=None):
+        self.interface = interface
+        self.sid = sid
+        self.version = 0
+        self.loaded = False
+        self.modified = False
+        self.accessed = False
+        self.changes = {}
+        self._data = {}
+
+    @property
+    def new(self):
+        return self.version == 0
+
+    @property
+    def permanent(self):
+        # Answered without loading, so untouched sessions stay untouched
+        if self.loaded:
+            return self._data.get('_permanent', self.interface.permanent)
+        return self.interface.permanent
+
+    @permanent.setter
+    def permanent(self, value):
+        self['_permanent'] = bool(value)
+
+    def _load(self):
+        self.accessed = True
+        if not self.loaded:
+            self.loaded = True
+            if self.sid is not None:
+                self.version, self._data = self.interface.load(self.sid)
+
+    def _changed(self, key, value):
+        self.modified = True
+        self.changes[key] = value
+
+    def __getitem__(self, key):
+        self._load()
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._load()
+        self._data[key] = value
+        self._changed(key, value)
+
+    def __delitem__(self, key):
+        self._load()
+        del self._data[key]
+        self._changed(key, _DELETED)
+
+    def __iter__(self):
+        self._load()
+        return iter(self._data)
+
+    def __len__(self):
+        self._load()
+        return len(self._data)
+
+    def __contains__(self, key):
+        self._load()
+        return key in self._data
+
+    def clear(self):
+        self._load()
+        for key in list(self._data):
+            self._changed(key, _DELETED)
+        self._data.clear()
+
+    def merge_into(self, data):
+        """Apply this request's changes on top of a newer stored copy"""
+        for key, value in self.changes.items():
+            if value is _DELETED:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        self._data = data
+        return data
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface over a versioned store with a per-worker LRU"""
+
+    codec = SessionCodec()
+    MAX_SAVE_ATTEMPTS = 3
+
+    def __init__(self, store, key_prefix='flask_app:session:', use_signer=True, permanent=False,
+                 ttl=86400, max_entries=2048, refresh_interval=5.0):
+        self.store = store
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.use_signer = use_signer
+        self.permanent = permanent
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self._local = OrderedDict()  # sid -> (version, blob)
+        self._pending_refresh = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.requests = 0
+        self.round_trips = 0
+        self.local_hits = 0
+        self.loads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.conflicts = 0
+        self.refreshed = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    # Background TTL refresh
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='session-refresh', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._safe_refresh()
+
+    def _after_fork(self):
+        running = self._thread is not None
+        self._local = OrderedDict()
+        self._pending_refresh = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if running:
+            self.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            self._safe_refresh()
+
+    def _safe_refresh(self):
+        try:
+            self.flush_refreshes()
+        except Exception as e:
+            logger.warning('Session TTL refresh failed: %s', e)
+
+    def flush_refreshes(self):
+        """Extend the TTL of every session used since the last flush, in one pipeline"""
+        with self._lock:
+            sids, self._pending_refresh = self._pending_refresh, set()
+        if not sids:
+            return 0
+        self.store.refresh([self._key(sid) for sid in sids], self.ttl)
+        self.round_trips += 1
+        self.refreshed += len(sids)
+        return len(sids)
+
+    # Store access
+
+    def _key(self, sid):
+        return self.key_prefix + sid
+
+    def _remember(self, sid, version, blob):
+        with self._lock:
+            self._local[sid] = (version, blob)
+            self._local.move_to_end(sid)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def load(self, sid):
+        """(version, data) for a session id; (0, {}) if it doesn't exist"""
+        cached = self._local.get(sid)
+        self.loads += 1
+        self.round_trips += 1
+        version, blob = self.store.load(self._key(sid), cached[0] if cached else None)
+        if version is None:
+            with self._lock:
+                self._local.pop(sid, None)
+            return 0, {}
+        if blob is None:
+            # Our copy is current; only the version crossed the network
+            self.local_hits += 1
+            blob = cached[1]
+        else:
+            self._remember(sid, version, blob)
+        return version, self.codec.decode(blob)
+
+    def _write(self, session):
+        data = dict(session._data)
+        for _ in range(self.MAX_SAVE_ATTEMPTS):
+            blob = self.codec.encode(data)
+            self.round_trips += 1
+            saved, version, current = self.store.save(self._key(session.sid), session.version,
+                                                      blob, self.ttl)
+            if saved:
+                self.writes += 1
+                session.version = version
+                self._remember(session.sid, version, blob)
+                return
+            # Another request changed the session since we loaded it
+            self.conflicts += 1
+            session.version = version
+            data = session.merge_into(self.codec.decode(current) if current else {})
+        logger.warning('Session %s kept changing, giving up after %d attempts',
+                       session.sid[:8], self.MAX_SAVE_ATTEMPTS)
+
+    # SessionInterface
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='flask-session', key_derivation='hmac')
+
+    def get_expiration_time(self, app, session):
+        if session.permanent:
+            return datetime.now(timezone.utc) + app.permanent_session_lifetime
+        return None
+
+    def open_session(self, app, request):
+        self.requests += 1
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return LazySession(self)
+        if self.use_signer:
+            try:
+                cookie = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                return LazySession(self)
+        return LazySession(self, cookie)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session.modified:
+            if session.sid is not None and not (session.loaded and session.new):
+                with self._lock:
+                    self._pending_refresh.add(session.sid)
+                if self.should_set_cookie(app, session):
+                    self._set_cookie(app, session, response)
+            return
+
+        if not session._data:
+            if session.sid is not None and not session.new:
+                self.round_trips += 1
+                self.deletes += 1
+                self.store.delete(self._key(session.sid))
+                with self._lock:
+                    self._local.pop(session.sid, None)
+            response.delete_cookie(name, domain=domain, path=path,
+                                   secure=self.get_cookie_secure(app),
+                                   samesite=self.get_cookie_samesite(app))
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        self._write(session)
+        self._set_cookie(app, session, response)
+
+    def _set_cookie(self, app, session, response):
+        value = session.sid
+        if self.use_signer:
+            value = self._signer(app).sign(value).decode()
+        response.set_cookie(
+            self.get_cookie_name(app), value,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'round_trips': self.round_trips,
+            'round_trips_per_request': round(self.round_trips / self.requests, 3) if self.requests else 0.0,
+            'loads': self.loads,
+            'local_hits': self.local_hits,
+            'writes': self.writes,
+            'deletes': self.deletes,
+            'conflicts': self.conflicts,
+            'refreshed': self.refreshed,
+            'cached_sessions': len(self._local)
+        }
+
+
+def create_session_store(app):
+    """Session store from SESSION_TYPE; None leaves Flask's cookie sessions in place"""
+    if app.config.get('SESSION_TYPE') != 'redis':
+        return None
+    if app.config.get('TESTING'):
+        return InMemorySessionStore()
+    if importlib.util.find_spec('redis') is None:
+        logger.warning('redis package not installed, using cookie sessions')
+        return None
+    url = app.config.get('SESSION_REDIS') or app.config.get('REDIS_URL')
+    return RedisSessionStore(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+
+def init_sessions(app, store=None):
+    """Install server-side sessions when the config asks for them"""
+    store = store or create_session_store(app)
+    if store is None:
+        return None
+    interface = ServerSessionInterface(
+        store,
+        key_prefix=app.config.get('SESSION_KEY_PREFIX', 'flask_app:') + 'session:',
+        use_signer=app.config.get('SESSION_USE_SIGNER', True),
+        permanent=app.config.get('SESSION_PERMANENT', False),
+        ttl=int(app.permanent_session_lifetime.total_seconds()),
+        max_entries=app.config.get('SESSION_CACHE_MAX_ENTRIES', 2048),
+        refresh_interval=app.config.get('SESSION_REFRESH_INTERVAL', 5.0)
+    )
+    app.session_interface = interface
+    app.extensions['server_session'] = interface
+    interface.start()
+    return interface
@@ -0,0 +1,103 @@
+import os
+import sys
+
+import pytest
+
+# The sharded test run puts deployment/ on PYTHONPATH; this covers a plain pytest run
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'deployment'))
+
+from canary import CanaryAnalysis, TrafficSample  # noqa: E402
+
+ROUTE = 'GET /api/data'
+
+
+def make_sample(requests, latency=0.02, errors=0, route=ROUTE):
+    """Sample of ``requests`` requests spread over two buckets around ``latency``."""
+    sample = TrafficSample()
+    for i in range(requests):
+        status = 500 if i < errors else 200
+        sample.observe(route, latency * (0.6 if i % 2 else 1.2), status)
+    return sample
+
+
+@pytest.fixture
+def analysis():
+    return CanaryAnalysis(min_requests=200)
+
+
+def test_identical_samples_pass(analysis):
+    """Test a canary behaving like the baseline passes."""
+    report = analysis.compare(make_sample(2000, errors=10), make_sample(1000, errors=5))
+    assert report.verdict == 'pass'
+    assert report.passed
+    assert all(check.passed for check in report.checks)
+
+
+def test_shifted_latency_fails(analysis):
+    """Test a canary whose latency histogram moved up several buckets fails."""
+    report = analysis.compare(make_sample(2000, latency=0.02), make_sample(1000, latency=0.2))
+    assert report.verdict == 'fail'
+    assert not report.passed
+    failed = {check.metric for check in report.checks if not check.passed}
+    assert 'p50' in failed
+    assert 'error_rate' not in failed
+
+
+def test_error_rate_increase_fails(analysis):
+    """Test a canary with a higher 5xx rate fails."""
+    report = analysis.compare(make_sample(2000, errors=10), make_sample(1000, errors=100))
+    assert report.verdict == 'fail'
+    failed = [check for check in report.checks if not check.passed]
+    assert [check.metric for check in failed] == ['error_rate']
+    assert failed[0].canary == pytest.approx(0.1)
+
+
+def test_small_window_is_inconclusive(analysis):
+    """Test a canary below min_requests is neither passed nor failed."""
+    report = analysis.compare(make_sample(2000), make_sample(150, errors=150))
+    assert report.verdict == 'inconclusive'
+    assert not report.passed
+    assert report.canary_requests == 150
+    assert report.checks == []
+
+
+def test_ignored_routes_do_not_count(analysis):
+    """Test health checks and scrapes don't make up the minimum."""
+    canary = make_sample(150).merge(make_sample(1000, route='GET /health'))
+    assert analysis.compare(make_sample(2000), canary).verdict == 'inconclusive'
+
+
+METRICS = """\
+# HELP flask_http_request_duration_seconds HTTP request latency by route and method
+# TYPE flask_http_request_duration_seconds histogram
+flask_http_request_duration_seconds_bucket{{method="GET",route="/api/data",le="0.005"}} {fast}
+flask_http_request_duration_seconds_bucket{{method="GET",route="/api/data",le="0.01"}} {fast}
+flask_http_request_duration_seconds_bucket{{method="GET",route="/api/data",le="0.025"}} {total}
+flask_http_request_duration_seconds_bucket{{method="GET",route="/api/data",le="+Inf"}} {total}
+flask_http_request_duration_seconds_sum{{method="GET",route="/api/data"}} 1.5
+flask_http_request_duration_seconds_count{{method="GET",route="/api/data"}} {total}
+flask_http_requests_total{{method="GET",route="/api/data",status="200"}} {ok}
+flask_http_requests_total{{method="GET",route="/api/data",status="503"}} {errors}
+"""
+
+
+def scrape(fast, total, errors):
+    return TrafficSample.from_metrics(METRICS.format(fast=fast, total=total, ok=total - errors, errors=errors))
+
+
+def test_from_metrics_and_since():
+    """Test /metrics parsing and the window between two scrapes."""
+    before = scrape(fast=40, total=100, errors=2)
+    histogram = before.routes[ROUTE]
+    assert histogram.requests == 100
+    assert histogram.counts[:3] == [40, 0, 60]
+    assert histogram.errors == 2
+
+    window = scrape(fast=70, total=250, errors=5).since(before).routes[ROUTE]
+    assert window.counts[:3] == [30, 0, 120]
+    assert window.requests == 150
+    assert window.errors == 3
+
+    # A replica restart resets its counters; the window is then everything since
+    restarted = scrape(fast=10, total=20, errors=0).since(before).routes[ROUTE]
+    assert restarted.requests == 20
@@ -0,0 +1,107 @@
+import pytest
+from flask import Flask
+
+from response_cache import InMemoryStore, ResponseCache
+
+
+@pytest.fixture
+def cache():
+    """Response cache backed by an in-process shared store."""
+    return ResponseCache(store=InMemoryStore())
+
+
+@pytest.fixture
+def app(cache):
+    """Create a minimal application with one cached view."""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    cache.init_app(app)
+    app.calls = 0
+
+    @app.route('/data')
+    @cache.cached(timeout=60)
+    def data():
+        app.calls += 1
+        return {'calls': app.calls}
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """Create test client."""
+    return app.test_client()
+
+
+def test_miss_then_hit(app, client):
+    """Test the second request is served from the cache."""
+    first = client.get('/data')
+    second = client.get('/data')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert 'public' in second.headers['Cache-Control']
+    assert app.calls == 1
+
+
+def test_hit_from_shared_store(app, cache, client):
+    """Test an entry another worker stored is served without calling the view."""
+    client.get('/data')
+    cache.local.clear()
+    response = client.get('/data')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert cache.remote_hits == 1
+    assert app.calls == 1
+
+
+def test_if_none_match_returns_304(cache, client):
+    """Test a matching If-None-Match is answered with 304 and no body."""
+    etag = client.get('/data').headers['ETag']
+    response = client.get('/data', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert cache.not_modified == 1
+
+
+def test_stale_etag_gets_full_response(client):
+    """Test a different ETag gets the body."""
+    client.get('/data')
+    response = client.get('/data', headers={'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+    assert response.json == {'calls': 1}
+
+
+def test_key_varies_by_query_and_accept(app, client):
+    """Test query strings and the Accept header select separate entries."""
+    client.get('/data')
+    assert client.get('/data?page=2').headers['X-Cache'] == 'MISS'
+    assert client.get('/data', headers={'Accept': 'text/html'}).headers['X-Cache'] == 'MISS'
+    assert client.get('/data?page=2').headers['X-Cache'] == 'HIT'
+    assert app.calls == 3
+
+
+def test_query_order_does_not_change_key(client):
+    """Test the same query parameters in another order share an entry."""
+    client.get('/data?a=1&b=2')
+    assert client.get('/data?b=2&a=1').headers['X-Cache'] == 'HIT'
+
+
+def test_undecodable_entry_is_a_miss(app, cache, client):
+    """Test a corrupt shared entry is dropped and replaced."""
+    with app.test_request_context('/data'):
+        key = cache.key_prefix + cache.make_key()
+    cache.store.set(key, b'not an entry')
+    response = client.get('/data')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert cache.decode_errors == 1
+    assert cache.store.get(key) != b'not an entry'
+
+
+def test_post_is_not_cached(app, client):
+    """Test only GET requests are cached."""
+    app.add_url_rule('/echo', 'echo', app.view_functions['data'], methods=['GET', 'POST'])
+    client.post('/echo')
+    client.post('/echo')
+    assert app.calls == 2
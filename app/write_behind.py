@@ -0,0 +1,213 @@
+"""
+Write-behind buffer for high-volume, low-value writes.
+
+DeploymentLog inserts and User.last_login updates are queued in memory and
+flushed in one transaction, either when ``max_batch`` writes are pending or
+every ``flush_interval`` seconds. Inserts go out as a single executemany
+INSERT; last_login updates are coalesced so only the latest timestamp per
+user is written.
+
+A failed flush puts its batch back for the next one. After ``max_retries``
+failures in a row the batch is written row by row instead, and rows the
+database rejects (constraint or data errors) are dropped and logged, so one
+bad row cannot block every later flush. At most ``max_pending`` log rows
+are held; beyond that the oldest are dropped, which bounds memory while the
+database is down.
+"""
+
+import os
+import uuid
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models import DeploymentLog, User, db
+
+logger = logging.getLogger(__name__)
+
+DEPLOYMENT_LOG_FIELDS = ('version', 'environment', 'status', 'deployed_by',
+                         'deployment_time', 'rollback_version', 'notes')
+
+
+class WriteBehindQueue:
+    """Coalesce and batch DeploymentLog inserts and last_login updates"""
+
+    def __init__(self, app=None, engine=None, max_batch=500, flush_interval=1.0,
+                 max_retries=3, max_pending=10000):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+        self._logs = []
+        self._last_login = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.dropped = 0
+        self._failures = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_batch = app.config.get('WRITE_BEHIND_MAX_BATCH', self.max_batch)
+        self.flush_interval = app.config.get('WRITE_BEHIND_FLUSH_INTERVAL', self.flush_interval)
+        self.max_retries = app.config.get('WRITE_BEHIND_MAX_RETRIES', self.max_retries)
+        self.max_pending = app.config.get('WRITE_BEHIND_MAX_PENDING', self.max_pending)
+        if self.engine is None:
+            with app.app_context():
+                self.engine = db.engine
+        app.extensions['write_behind'] = self
+        self.start()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the background thread and flush whatever is still pending"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+        self.flush()
+
+    def _after_fork(self):
+        # Pending rows belong to the parent, which flushes them itself; the
+        # child gets fresh locks and, if the parent was running, its own thread
+        running = self._thread is not None
+        self._logs, self._last_login = [], {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if running:
+            self.start()
+
+    @property
+    def pending(self):
+        return len(self._logs) + len(self._last_login)
+
+    def add_deployment_log(self, version, environment, status, **fields):
+        now = datetime.utcnow()
+        row = dict.fromkeys(DEPLOYMENT_LOG_FIELDS)
+        row.update(fields, version=version, environment=environment, status=status)
+        row['deployment_time'] = row['deployment_time'] or now
+        row.update(id=str(uuid.uuid4()), created_at=now, updated_at=now)
+        with self._lock:
+            if len(self._logs) >= self.max_pending:
+                # Database unreachable for a while; keep the newest rows
+                del self._logs[0]
+                self.dropped += 1
+            self._logs.append(row)
+            full = self.pending >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def touch_last_login(self, user_id, when=None):
+        when = when or datetime.utcnow()
+        with self._lock:
+            current = self._last_login.get(user_id)
+            if current is None or when > current:
+                self._last_login[user_id] = when
+            full = self.pending >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Write-behind flush failed')
+
+    def _requeue(self, logs, last_login):
+        """Put a failed batch back in front of anything queued since"""
+        with self._lock:
+            self._logs[:0] = logs
+            overflow = len(self._logs) - self.max_pending
+            if overflow > 0:
+                del self._logs[:overflow]
+                self.dropped += overflow
+                logger.warning('Write-behind buffer full, dropped %d oldest deployment logs', overflow)
+            for uid, at in last_login.items():
+                if uid not in self._last_login or at > self._last_login[uid]:
+                    self._last_login[uid] = at
+
+    def _write(self, logs, last_login, now):
+        with self.engine.begin() as conn:
+            if logs:
+                conn.execute(DeploymentLog.__table__.insert(), logs)
+            if last_login:
+                users = User.__table__
+                conn.execute(
+                    users.update()
+                    .where(users.c.id == bindparam('user_id'))
+                    .values(last_login=bindparam('login_at'), updated_at=now),
+                    [{'user_id': uid, 'login_at': at} for uid, at in last_login.items()]
+                )
+
+    def _write_rows(self, logs, last_login, now):
+        """Write one row per transaction, dropping the rows the database rejects"""
+        rows = [([row], {}) for row in logs] + [([], {uid: at}) for uid, at in last_login.items()]
+        written = 0
+        for i, (row_logs, row_login) in enumerate(rows):
+            try:
+                self._write(row_logs, row_login, now)
+                written += 1
+            except (IntegrityError, DataError) as e:
+                self.dropped += 1
+                logger.error('Write-behind dropped a row the database rejects: %s', e.orig)
+            except Exception:
+                # Not the row's fault; keep it and the rest for the next flush
+                self._requeue([row for batch, _ in rows[i:] for row in batch],
+                              {uid: at for _, login in rows[i:] for uid, at in login.items()})
+                raise
+        return written
+
+    def flush(self):
+        """Write all pending rows in one transaction; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                logs, self._logs = self._logs, []
+                last_login, self._last_login = self._last_login, {}
+            if not logs and not last_login:
+                return 0
+
+            now = datetime.utcnow()
+            try:
+                self._write(logs, last_login, now)
+                written = len(logs) + len(last_login)
+            except Exception:
+                self.errors += 1
+                self._failures += 1
+                if self._failures < self.max_retries:
+                    # Retried whole on the next flush
+                    self._requeue(logs, last_login)
+                    raise
+                self._failures = 0
+                written = self._write_rows(logs, last_login, now)
+            else:
+                self._failures = 0
+
+            self.flushes += 1
+            self.rows_written += written
+            return written
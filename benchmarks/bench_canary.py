@@ -0,0 +1,125 @@
+"""
+Check the canary analysis offline: no false alarms, and regressions caught.
+
+Starts two gunicorn servers from app/, a baseline and a canary, and runs
+deployment/canary.py's load generator and analysis against them for each
+scenario in turn. The canary server loads a small gunicorn config whose
+pre_request hook adds ``--delay-ms`` to every request or answers a share of
+them with a 500, standing in for a bad release. The identical scenario
+should pass and the others fail; the wall time per scenario is how long a
+verdict takes at this rate and traffic fraction.
+
+    python benchmarks/bench_canary.py [--rps 300] [--duration 20] [--fraction 0.2]
+        [--delay-ms 20] [--error-rate 0.05]
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import http.client
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'deployment')]
+
+from canary import CanaryAnalysis, LoadGenerator
+
+FAULT_CONFIG = '''import os
+import time
+import random
+
+DELAY = float(os.environ.get('BENCH_FAULT_DELAY_MS', 0)) / 1000
+ERROR_RATE = float(os.environ.get('BENCH_FAULT_ERROR_RATE', 0))
+
+
+def pre_request(worker, req):
+    if random.random() < ERROR_RATE:
+        # gunicorn answers 500 when a hook raises
+        raise RuntimeError('injected fault')
+    if DELAY:
+        time.sleep(DELAY)
+'''
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health/live')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_gunicorn(args, port, config, delay_ms=0.0, error_rate=0.0):
+    command = [sys.executable, '-m', 'gunicorn', '--config', config,
+               '--bind', f'127.0.0.1:{port}', '--worker-class', 'gthread',
+               '--workers', str(args.workers), '--threads', '4', '--log-level', 'critical', 'app:app']
+    # One client address would exhaust RATELIMIT_DEFAULT within a second; no database here
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_ENV=args.environment, RATELIMIT_ENABLED='false',
+               WRITE_BEHIND_ENABLED='false',
+               PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix='bench-canary-metrics-'),
+               BENCH_FAULT_DELAY_MS=str(delay_ms), BENCH_FAULT_ERROR_RATE=str(error_rate))
+    return subprocess.Popen(command, cwd=os.path.join(ROOT, 'app'), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_scenario(name, args, config, delay_ms=0.0, error_rate=0.0):
+    servers = [start_gunicorn(args, args.port, config),
+               start_gunicorn(args, args.port + 1, config, delay_ms, error_rate)]
+    try:
+        if not (wait_until_up(args.port) and wait_until_up(args.port + 1)):
+            print(f'{name:<10} gunicorn failed to start')
+            return
+        load = LoadGenerator({'baseline': f'http://127.0.0.1:{args.port}',
+                              'canary': f'http://127.0.0.1:{args.port + 1}'},
+                             args.paths, rps=args.rps, duration=args.duration,
+                             weights={'baseline': 1 - args.fraction, 'canary': args.fraction}, seed=1)
+        started = time.perf_counter()
+        samples = load.run()
+        report = CanaryAnalysis(min_requests=args.min_requests).compare(samples['baseline'], samples['canary'])
+        seconds = time.perf_counter() - started
+    finally:
+        for server in servers:
+            server.send_signal(signal.SIGTERM)
+        for server in servers:
+            server.wait(timeout=30)
+
+    lines = report.lines()
+    print(f'{name:<10} {lines[0]} ({seconds:.1f}s)')
+    for line in lines[1:]:
+        print(f'{"":<10} {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rps', type=float, default=300)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--fraction', type=float, default=0.2)
+    parser.add_argument('--delay-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--min-requests', type=int, default=200)
+    parser.add_argument('--paths', nargs='+', default=['/api/data', '/'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5097)
+    parser.add_argument('--environment', default='production')
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile('w', prefix='bench-canary-', suffix='.py', delete=False) as f:
+        f.write(FAULT_CONFIG)
+    try:
+        run_scenario('identical', args, f.name)
+        run_scenario('slower', args, f.name, delay_ms=args.delay_ms)
+        run_scenario('errors', args, f.name, error_rate=args.error_rate)
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Load-test gunicorn worker models against the app's endpoints.
+
+Starts gunicorn from app/ with gunicorn.conf.py for each worker model in
+turn, drives it with ``--concurrency`` client processes over keep-alive
+connections for ``--duration`` seconds, and reports throughput and latency
+percentiles per endpoint. Run the clients on other cores than the server
+(``taskset``) for absolute numbers; on a shared box only the comparison is
+meaningful.
+
+    python benchmarks/bench_gunicorn.py [--models sync gthread gevent] [--workers 4]
+        [--concurrency 16] [--duration 10]
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import http.client
+import subprocess
+import multiprocessing
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENDPOINTS = ('/health/live', '/health', '/', '/api/data', '/api/data?stream=ndjson')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def client(port, duration, results):
+    latencies = {path: [] for path in ENDPOINTS}
+    errors = 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    deadline = time.monotonic() + duration
+    i = 0
+    while time.monotonic() < deadline:
+        path = ENDPOINTS[i % len(ENDPOINTS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors += 1
+            # Sync workers close the connection after every response
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            continue
+        latencies[path].append(time.perf_counter() - started)
+    results.put((latencies, errors))
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health/live')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_model(model, args):
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{args.port}',
+               '--worker-class', model, '--workers', str(args.workers),
+               '--threads', str(args.threads), '--log-level', 'warning', 'app:app']
+    # One client address would exhaust RATELIMIT_DEFAULT within a second; no database here
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_ENV=args.environment, RATELIMIT_ENABLED='false',
+               WRITE_BEHIND_ENABLED='false')
+    server = subprocess.Popen(command, cwd=os.path.join(ROOT, 'app'), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_up(args.port):
+            print(f'{model:<8} failed to start')
+            return
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(args.port, args.duration, results))
+                   for _ in range(args.concurrency)]
+        for process in clients:
+            process.start()
+        collected = [results.get() for _ in clients]
+        for process in clients:
+            process.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    total = sum(len(v) for latencies, _ in collected for v in latencies.values())
+    errors = sum(e for _, e in collected)
+    print(f'{model:<8} {total / args.duration:>9.0f} req/s  errors {errors}')
+    for path in ENDPOINTS:
+        values = sorted(v for latencies, _ in collected for v in latencies[path])
+        print(f'  {path:<26} p50 {percentile(values, 50) * 1000:7.2f} ms'
+              f'  p99 {percentile(values, 99) * 1000:7.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--models', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--environment', default='production')
+    args = parser.parse_args()
+
+    for model in args.models:
+        run_model(model, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare Flask's default JSON provider with FastJSONProvider.
+
+Payloads mirror the real response shapes: the /health and / bodies, an
+/api/data page, and a page of DeploymentLog rows as produced by to_dict().
+
+    python benchmarks/bench_json.py [--rows 500] [--number 2000]
+"""
+
+import os
+import sys
+import uuid
+import timeit
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider, orjson
+
+
+def payloads(rows):
+    now = datetime.utcnow()
+    return {
+        'health': {'status': 'healthy', 'timestamp': now, 'version': '1.0.0'},
+        'home': {'message': 'Flask Deployment Pipeline Demo', 'environment': 'production',
+                 'version': '1.0.0'},
+        'api_data': {'data': list(range(rows)), 'timestamp': now},
+        'deployment_logs': {'items': [
+            {
+                'id': uuid.uuid4(),
+                'version': f'v1.{i}.0',
+                'environment': 'production',
+                'status': 'success' if i % 7 else 'failed',
+                'deployed_by': 'ci',
+                'deployment_time': now - timedelta(minutes=i),
+                'rollback_version': None,
+                'notes': 'stage timings attached',
+                'created_at': now,
+                'updated_at': now
+            }
+            for i in range(rows)
+        ]}
+    }
+
+
+def stdlib_ready(obj):
+    """Flask's default provider renders datetimes as HTTP dates; pre-convert for a fair comparison"""
+    if isinstance(obj, dict):
+        return {k: stdlib_ready(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [stdlib_ready(v) for v in obj]
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    return obj
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = {
+        'flask-default': DefaultJSONProvider(app),
+        'fast-stdlib': FastJSONProvider(app, use_orjson=False),
+    }
+    if orjson is not None:
+        providers['fast-orjson'] = FastJSONProvider(app)
+    for provider in providers.values():
+        if isinstance(provider, FastJSONProvider):
+            provider.configure()
+
+    print(f"{'payload':<18}" + ''.join(f'{name:>16}' for name in providers) + '   (us per response)')
+    with app.app_context():
+        for name, payload in payloads(args.rows).items():
+            row = f'{name:<18}'
+            for provider_name, provider in providers.items():
+                obj = stdlib_ready(payload) if provider_name == 'flask-default' else payload
+                seconds = timeit.timeit(lambda: provider.response(obj).get_data(), number=args.number)
+                row += f'{seconds / args.number * 1e6:>16.1f}'
+            print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Scrape cost of the shared metrics store as gunicorn recycles workers.
+
+Simulates ``--workers`` live workers, each writing ``--series`` samples, and
+``--recycled`` workers that have already exited. Exited workers are either
+left on disk or folded into the archive the way gunicorn's child_exit hook
+does it.
+
+    python benchmarks/bench_metrics_scrape.py [--workers 4] [--series 500] [--recycled 200]
+"""
+
+import os
+import sys
+import json
+import shutil
+import timeit
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from prometheus_metrics import MODE_SUM, MetricsStore, MmapValues, mark_process_dead
+
+
+def write_worker(directory, pid, series):
+    values = MmapValues(os.path.join(directory, f'worker-{pid}.db'))
+    for i in range(series):
+        key = json.dumps(['flask_http_requests_total', 'flask_http_requests_total',
+                          [['route', f'/route/{i}']], MODE_SUM])
+        values.add(key, 1)
+    values.close()
+
+
+def scrape_ms(directory, number=20):
+    store = MetricsStore(directory)
+    return timeit.timeit(store.collect, number=number) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--series', type=int, default=500)
+    parser.add_argument('--recycled', type=int, default=200)
+    args = parser.parse_args()
+
+    for archive in (False, True):
+        directory = tempfile.mkdtemp()
+        try:
+            for pid in range(args.recycled):
+                write_worker(directory, pid, args.series)
+                if archive:
+                    mark_process_dead(pid, directory)
+            for pid in range(args.recycled, args.recycled + args.workers):
+                write_worker(directory, pid, args.series)
+            label = 'archived' if archive else 'left on disk'
+            print(f'exited workers {label:<13} {len(os.listdir(directory)):>4} files  '
+                  f'{scrape_ms(directory):8.2f} ms per scrape')
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Load-test the generated nginx config against deployment/nginx-dev.conf.
+
+For each config in turn, starts gunicorn from app/ and an unprivileged nginx
+in front of it (in a temporary prefix), then drives nginx with
+``--concurrency`` keep-alive client processes that accept gzip for
+``--duration`` seconds. Reports throughput, latency percentiles, bytes on the
+wire per response, micro-cache hits, and how many requests and TCP
+connections reached gunicorn (from its access log, one line per request
+carrying the peer port). Needs an nginx binary; the app runs with rate
+limiting off so the single client address is not throttled.
+
+    python benchmarks/bench_nginx.py [--environment production] [--workers 4]
+        [--concurrency 16] [--duration 10] [--nginx /usr/sbin/nginx]
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import http.client
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'deployment')]
+
+from config.registry import get_registry
+from nginx_config import NginxSettings
+from rollout import write_upstream
+
+DEV_CONF = os.path.join(ROOT, 'deployment', 'nginx-dev.conf')
+ENDPOINTS = ('/', '/api/data', '/api/data?limit=3', '/health', '/api/data?stream=json')
+TEMP_PATHS = ('client_body', 'proxy', 'fastcgi', 'uwsgi', 'scgi')
+MINIMAL_MIME_TYPES = 'types {\n    application/json json;\n    text/css css;\n    text/plain txt;\n}\n'
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def client(port, duration, results):
+    latencies = []
+    wire_bytes = 0
+    cache_hits = 0
+    errors = 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    deadline = time.monotonic() + duration
+    i = 0
+    while time.monotonic() < deadline:
+        path = ENDPOINTS[i % len(ENDPOINTS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            # http.client does not decompress, so this is what crossed the wire
+            wire_bytes += len(response.read())
+            if response.status >= 400:
+                errors += 1
+            if response.getheader('X-Cache-Status') in ('HIT', 'STALE', 'UPDATING'):
+                cache_hits += 1
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put((latencies, wire_bytes, cache_hits, errors))
+
+
+def wait_until_up(port, path='/health/live', timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', path)
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def mime_types_path(workdir):
+    if os.path.exists('/etc/nginx/mime.types'):
+        return '/etc/nginx/mime.types'
+    path = workdir / 'mime.types'
+    path.write_text(MINIMAL_MIME_TYPES)
+    return str(path)
+
+
+def run_as():
+    # As root, nginx would hand the workers to "nobody", who can't write the temp prefix
+    return 'root' if os.geteuid() == 0 else None
+
+
+def unprivileged(text, workdir):
+    """Keep nginx's temp files in the prefix; packaged builds default to /var/lib/nginx"""
+    paths = ''.join(f'    {kind}_temp_path {workdir}/{kind}_temp;\n' for kind in TEMP_PATHS)
+    return text.replace('http {\n', 'http {\n' + paths, 1)
+
+
+def dev_config(workdir, port, app_port):
+    text = Path(DEV_CONF).read_text()
+    for pattern, replacement in (
+            (r'^user .*;$', f'user {run_as()};' if run_as() else ''),
+            (r'^error_log .*;$', f'error_log {workdir}/error.log warn;'),
+            (r'^pid .*;$', f'pid {workdir}/nginx.pid;'),
+            (r'access_log \S+', f'access_log {workdir}/access.log'),
+            (r'include /etc/nginx/mime.types;', f'include {mime_types_path(workdir)};'),
+            (r'listen 80;', f'listen {port};'),
+            (r'server app:5000;', f'server 127.0.0.1:{app_port};')):
+        text = re.sub(pattern, replacement, text, flags=re.M)
+    return text + '\n'
+
+
+def generated_config(workdir, port, app_port, args):
+    # One local replica running --workers gunicorn workers; no static folder
+    deploy = dict(get_registry(args.environment).deploy_settings(), replicas=1,
+                  gunicorn_workers=args.workers, static_folder=None)
+    settings = NginxSettings(deploy, args.environment, listen=port, user=run_as(),
+                             upstream_dir=str(workdir / 'upstreams'), cache_dir=str(workdir / 'cache'),
+                             log_dir=str(workdir), pid=str(workdir / 'nginx.pid'),
+                             mime_types=mime_types_path(workdir))
+    write_upstream(workdir / 'upstreams' / 'flask_app.conf', ['127.0.0.1'], app_port,
+                   options=settings.upstream_options())
+    return settings.render()
+
+
+def start_gunicorn(args, access_log):
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{args.app_port}',
+               '--workers', str(args.workers), '--log-level', 'warning',
+               '--access-logfile', str(access_log), '--access-logformat', '%({REMOTE_PORT}e)s',
+               'app:app']
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_ENV=args.environment, RATELIMIT_ENABLED='false',
+               WRITE_BEHIND_ENABLED='false')
+    return subprocess.Popen(command, cwd=os.path.join(ROOT, 'app'), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_config(name, render, args):
+    workdir = Path(tempfile.mkdtemp(prefix='bench-nginx-'))
+    conf = workdir / 'nginx.conf'
+    conf.write_text(unprivileged(render(workdir, args.port, args.app_port), workdir))
+    access_log = workdir / 'gunicorn-access.log'
+
+    check = subprocess.run([args.nginx, '-p', str(workdir), '-c', str(conf), '-t'],
+                           capture_output=True, text=True)
+    if check.returncode != 0:
+        print(f'{name:<12} invalid config:\n{check.stderr}')
+        return
+
+    server = start_gunicorn(args, access_log)
+    proxy = None
+    try:
+        if not wait_until_up(args.app_port):
+            print(f'{name:<12} gunicorn failed to start')
+            return
+        proxy = subprocess.Popen([args.nginx, '-p', str(workdir), '-c', str(conf), '-g', 'daemon off;'],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not wait_until_up(args.port, '/health'):
+            print(f'{name:<12} nginx failed to start')
+            return
+        # Connections made while waiting are not part of the run
+        skip = len(access_log.read_text().splitlines()) if access_log.exists() else 0
+
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(args.port, args.duration, results))
+                   for _ in range(args.concurrency)]
+        for process in clients:
+            process.start()
+        collected = [results.get() for _ in clients]
+        for process in clients:
+            process.join()
+    finally:
+        if proxy is not None:
+            proxy.send_signal(signal.SIGQUIT)
+            proxy.wait(timeout=30)
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    ports = access_log.read_text().split()[skip:] if access_log.exists() else []
+    latencies = sorted(v for values, _, _, _ in collected for v in values)
+    total = len(latencies)
+    wire = sum(b for _, b, _, _ in collected)
+    hits = sum(h for _, _, h, _ in collected)
+    errors = sum(e for _, _, _, e in collected)
+    print(f'{name:<12} {total / args.duration:>8.0f} req/s  p50 {percentile(latencies, 50) * 1000:6.2f} ms'
+          f'  p99 {percentile(latencies, 99) * 1000:6.2f} ms  {wire / max(total, 1):7.1f} B/response'
+          f'  cache hits {hits / max(total, 1):6.1%}  errors {errors}')
+    print(f'{"":<12} {len(ports)} requests reached gunicorn over {len(set(ports))} connections')
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--environment', default='production', help='config the generated nginx.conf is for')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--app-port', type=int, default=5099)
+    parser.add_argument('--nginx', default=shutil.which('nginx') or '/usr/sbin/nginx')
+    args = parser.parse_args()
+
+    if not os.access(args.nginx, os.X_OK):
+        sys.exit(f'nginx not found at {args.nginx}; install it or pass --nginx')
+
+    run_config('dev', dev_config, args)
+    run_config(args.environment, lambda workdir, port, app_port: generated_config(workdir, port, app_port, args),
+               args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Per-request cost of RateLimiter against a Redis round trip per request.
+
+The Redis stand-in is a loopback TCP server: every store call costs one real
+network round trip (plus --rtt-ms of added delay) before the bucket update is
+applied in memory, which is what a pipelined call to a local Redis costs.
+Also checks the accuracy bound: several limiters sharing one store, hammering
+the same client, must admit at most (workers - 1) * max_unsynced requests
+beyond the limit.
+
+    python benchmarks/bench_rate_limit.py [--number 20000] [--rtt-ms 0]
+"""
+
+import os
+import sys
+import time
+import socket
+import timeit
+import argparse
+import threading
+import socketserver
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from rate_limit import InMemoryBucketStore, RateLimiter
+
+
+class _EchoHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while self.request.recv(65536):
+            if self.server.delay:
+                time.sleep(self.server.delay)
+            self.request.sendall(b'+OK\r\n')
+
+
+class LoopbackStore(InMemoryBucketStore):
+    """InMemoryBucketStore reached through one loopback round trip per call"""
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _EchoHandler)
+        self.server.daemon_threads = True
+        self.server.delay = delay
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._local = threading.local()
+        self.round_trips = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = socket.create_connection(self.server.server_address)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def consume(self, updates):
+        conn = self._connection()
+        conn.sendall(b''.join(f'EVALSHA {key} {used}\r\n'.encode() for key, _, _, used in updates))
+        conn.recv(64)
+        self.round_trips += 1
+        return super().consume(updates)
+
+
+def per_request_hit(store, capacity, rate):
+    def hit(key):
+        return store.consume([(key, capacity, rate, 1)])[0] >= 0
+    return hit
+
+
+def best_us(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def accuracy(workers, max_unsynced, capacity):
+    store = InMemoryBucketStore()
+    limiters = [RateLimiter(store=store, max_unsynced=max_unsynced) for _ in range(workers)]
+    admitted = [0] * workers
+    for limiter in limiters:
+        limiter.capacity, limiter.rate = capacity, 1e-9
+        limiter.start()
+
+    def hammer(i):
+        for _ in range(capacity * 2):
+            admitted[i] += limiters[i].hit('client')[0]
+
+    threads = [threading.Thread(target=hammer, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for limiter in limiters:
+        limiter.stop()
+    return sum(admitted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='delay added to each round trip')
+    parser.add_argument('--max-unsynced', type=int, default=10)
+    args = parser.parse_args()
+
+    keys = [f'10.0.{i // 256}.{i % 256}' for i in range(args.clients)]
+    capacity, rate = 10 ** 9, 10 ** 9 / 3600
+
+    store = LoopbackStore(args.rtt_ms / 1000)
+    direct = per_request_hit(store, capacity, rate)
+    counter = iter(range(10 ** 12))
+    direct_us = best_us(lambda: direct(keys[next(counter) % len(keys)]), args.number // 10)
+
+    store = LoopbackStore(args.rtt_ms / 1000)
+    limiter = RateLimiter(store=store, max_unsynced=args.max_unsynced)
+    limiter.capacity, limiter.rate = capacity, rate
+    limiter.start()
+    local_us = best_us(lambda: limiter.hit(keys[next(counter) % len(keys)]), args.number)
+    limiter.stop()
+    trips = store.round_trips / limiter.allowed * 1000
+
+    print(f'{"Redis round trip per request":<40} {direct_us:8.2f} us/request   1000 round trips per 1000 requests')
+    print(f'{"local buckets, batched sync":<40} {local_us:8.2f} us/request   {trips:6.1f} round trips per 1000 requests')
+    print()
+
+    limit = 1000
+    for workers in (1, 4, 8):
+        admitted = accuracy(workers, args.max_unsynced, limit)
+        bound = limit + (workers - 1) * args.max_unsynced
+        print(f'{workers} workers, limit {limit}: admitted {admitted} (bound {bound})')
+
+
+if __name__ == '__main__':
+    main()
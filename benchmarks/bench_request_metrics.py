@@ -0,0 +1,98 @@
+"""
+Measure what RequestMetrics adds to a /health request.
+
+Runs the same /health view through the WSGI stack with and without the
+extension and reports the per-request difference, plus the cost of the
+after_request hook and of a histogram record() on their own.
+
+    python benchmarks/bench_request_metrics.py [--number 20000] [--sample-rate 0.01]
+"""
+
+import os
+import sys
+import timeit
+import logging
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from flask import Flask, jsonify
+from werkzeug.test import EnvironBuilder
+
+from request_metrics import LatencyHistogram, RequestMetrics
+
+
+def make_app(sample_rate=None):
+    app = Flask(__name__)
+    app.logger.addHandler(logging.NullHandler())
+    app.logger.propagate = False
+    metrics = None
+    if sample_rate is not None:
+        app.config['ACCESS_LOG_SAMPLE_RATE'] = sample_rate
+        metrics = RequestMetrics(app)
+
+    @app.route('/health')
+    def health_check():
+        return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow(), 'version': '1.0.0'})
+
+    return app, metrics
+
+
+def wsgi_call(app):
+    environ = EnvironBuilder(path='/health').get_environ()
+
+    def call():
+        for _ in app.wsgi_app(dict(environ), lambda status, headers: None):
+            pass
+
+    call()
+    return call
+
+
+def best_us(func, number, repeat=7):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--sample-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    plain, _ = make_app()
+    instrumented, metrics = make_app(args.sample_rate)
+    plain_call, instrumented_call = wsgi_call(plain), wsgi_call(instrumented)
+
+    # Interleave the two so CPU frequency drift hits both equally
+    base, with_metrics = [], []
+    for _ in range(5):
+        base.append(best_us(plain_call, args.number, repeat=1))
+        with_metrics.append(best_us(instrumented_call, args.number, repeat=1))
+    base, with_metrics = min(base), min(with_metrics)
+    stats = metrics.snapshot()['GET /health']
+
+    with instrumented.test_request_context('/health') as ctx:
+        response = instrumented.make_response(('ok', 200))
+        stamp = metrics._wrap(lambda environ, start_response: None)
+        environ = ctx.request.environ
+
+        def hook():
+            stamp(environ, None)
+            metrics._after(response)
+
+        hook_us = best_us(hook, args.number)
+
+    histogram = LatencyHistogram()
+    record_us = best_us(lambda: histogram.record(1234), args.number)
+
+    print(f'/health without metrics   {base:8.2f} us')
+    print(f'/health with metrics      {with_metrics:8.2f} us  (sample rate {args.sample_rate:g})')
+    print(f'difference                {with_metrics - base:8.2f} us')
+    print(f'stamp + after_request     {hook_us:8.2f} us')
+    print(f'histogram record()        {record_us:8.2f} us')
+    print(f"p50/p99 seen by metrics   {stats['p50_us']}/{stats['p99_us']} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Store round trips and time per request: lazy server-side sessions vs naive ones.
+
+The naive interface GETs the session when a request starts and SETs it when
+it ends, whether or not the view used it. Both talk to the same in-process
+store through a loopback TCP hop per call, standing in for a local Redis.
+The request mix is configurable; by default most requests never touch the
+session, as with API and health traffic.
+
+    python benchmarks/bench_sessions.py [--requests 5000] [--read 0.25] [--write 0.05]
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import argparse
+import threading
+import socketserver
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from flask import Flask, session
+from flask.sessions import SecureCookieSession, SessionInterface
+
+from server_session import InMemorySessionStore, SessionCodec, init_sessions
+
+
+class _EchoHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while self.request.recv(65536):
+            self.request.sendall(b'+OK\r\n')
+
+
+class LoopbackStore(InMemorySessionStore):
+    """InMemorySessionStore reached through one loopback round trip per call"""
+
+    def __init__(self):
+        super().__init__()
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _EchoHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.conn = socket.create_connection(server.server_address)
+        self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.round_trips = 0
+        self.bytes = 0
+
+    def _round_trip(self, payload=b''):
+        self.conn.sendall(b'*' + payload[:60000] + b'\r\n')
+        self.conn.recv(64)
+        self.round_trips += 1
+        self.bytes += len(payload)
+
+    def load(self, key, known_version):
+        version, blob = super().load(key, known_version)
+        self._round_trip(blob or b'')
+        return version, blob
+
+    def save(self, key, expected_version, blob, ttl):
+        self._round_trip(blob)
+        return super().save(key, expected_version, blob, ttl)
+
+    def delete(self, key):
+        self._round_trip()
+        super().delete(key)
+
+    def refresh(self, keys, ttl):
+        self._round_trip()
+        super().refresh(keys, ttl)
+
+    # Plain GET/SET for the naive interface
+    def get(self, key):
+        entry = self._data.get(key)
+        blob = entry[1] if entry else None
+        self._round_trip(blob or b'')
+        return blob
+
+    def set(self, key, blob, ttl):
+        self._round_trip(blob)
+        self._data[key] = (0, blob, time.time() + ttl)
+
+
+class NaiveSessionInterface(SessionInterface):
+    """GET on every request, SET on every response"""
+
+    codec = SessionCodec()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get('session') or os.urandom(16).hex()
+        blob = self.store.get(sid)
+        data = self.codec.decode(blob) if blob else {}
+        session = SecureCookieSession(data)
+        session.sid = sid
+        return session
+
+    def save_session(self, app, session, response):
+        self.store.set(session.sid, self.codec.encode(dict(session)), 3600)
+        response.set_cookie('session', session.sid)
+
+
+def make_app(interface):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='bench', SESSION_TYPE='redis',
+                      PERMANENT_SESSION_LIFETIME=timedelta(hours=1))
+    if isinstance(interface, NaiveSessionInterface):
+        app.session_interface = interface
+    else:
+        interface = init_sessions(app, interface)
+
+    @app.route('/api')
+    def api():
+        return 'data'
+
+    @app.route('/read')
+    def read():
+        return str(session.get('cart', []))
+
+    @app.route('/write')
+    def write():
+        session['cart'] = session.get('cart', []) + [len(session.get('cart', []))]
+        return 'ok'
+
+    return app, interface
+
+
+def run(app, paths, clients):
+    client = app.test_client()
+    # Each simulated user keeps their own cookie
+    cookies = {}
+    started = time.perf_counter()
+    for i, path in enumerate(paths):
+        user = i % clients
+        if user in cookies:
+            client.set_cookie('session', cookies[user])
+        else:
+            client.delete_cookie('session')
+        client.get(path)
+        cookie = client.get_cookie('session')
+        if cookie is not None and cookie.value:
+            cookies[user] = cookie.value
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--read', type=float, default=0.25, help='share of requests reading the session')
+    parser.add_argument('--write', type=float, default=0.05, help='share of requests changing it')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    # Every user writes once first, so all of them have a session
+    paths = ['/write'] * args.clients
+    for _ in range(args.requests):
+        r = rng.random()
+        paths.append('/write' if r < args.write else '/read' if r < args.write + args.read else '/api')
+
+    for name, make in (('naive GET+SET', lambda s: NaiveSessionInterface(s)),
+                       ('lazy, versioned LRU', lambda s: s)):
+        store = LoopbackStore()
+        app, interface = make_app(make(store))
+        seconds = run(app, paths, args.clients)
+        if hasattr(interface, 'flush_refreshes'):
+            interface.flush_refreshes()
+        print(f'{name:<22} {store.round_trips / len(paths):6.3f} round trips/request   '
+              f'{store.bytes / len(paths):8.1f} bytes/request   '
+              f'{seconds / len(paths) * 1e6:8.1f} us/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark: time from process spawn to the first successful /health.
+
+Starts gunicorn from app/ with gunicorn.conf.py ``--runs`` times and polls
+/health every few milliseconds until it returns 200. Also times the deploy
+CLI for an action that needs no external commands. Compare the numbers
+against the compose healthcheck start_period and the Docker HEALTHCHECK
+--start-period.
+
+    python benchmarks/bench_startup.py [--runs 5] [--environment production]
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import statistics
+import http.client
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def first_health(port, path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', path)
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.005)
+    return False
+
+
+def time_to_health(args, path):
+    # No database server here for the write-behind engine
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_ENV=args.environment, WRITE_BEHIND_ENABLED='false')
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{args.port}',
+         '--workers', str(args.workers), 'app:app'],
+        cwd=os.path.join(ROOT, 'app'), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        ok = first_health(args.port, path)
+        return time.perf_counter() - started if ok else None
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def time_deploy_cli(args):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(ROOT, 'deployment', 'deploy.py'),
+                    '--environment', args.environment, '--action', 'config'],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+
+def summarize(label, samples):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        print(f'{label:<34} failed')
+        return
+    print(f'{label:<34} median {statistics.median(samples) * 1000:8.1f} ms'
+          f'   min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5097)
+    parser.add_argument('--environment', default='production')
+    args = parser.parse_args()
+
+    summarize('spawn -> first /health/live 200', [time_to_health(args, '/health/live')
+                                                  for _ in range(args.runs)])
+    summarize('spawn -> first /health 200', [time_to_health(args, '/health')
+                                             for _ in range(args.runs)])
+    summarize('deploy.py --action config', [time_deploy_cli(args) for _ in range(args.runs)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-row ORM writes versus the write-behind queue, against SQLite.
+
+    python benchmarks/bench_write_behind.py [--logs 2000] [--logins 5000] [--users 200]
+
+The per-row path commits one ORM transaction per DeploymentLog insert and
+per last_login update, which is what a request handler does by default.
+The batched path queues the same writes and flushes them in one go.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from flask import Flask
+
+from models import DeploymentLog, User, db
+from write_behind import WriteBehindQueue
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+
+def seed_users(count):
+    users = [User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x')
+             for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [u.id for u in users]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write-behind throughput benchmark')
+    parser.add_argument('--logs', type=int, default=2000)
+    parser.add_argument('--logins', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    args = parser.parse_args()
+
+    base = datetime.utcnow()
+    logins = [(random.randrange(args.users), base + timedelta(seconds=i)) for i in range(args.logins)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'per_row.db'))
+        with app.app_context():
+            db.create_all()
+            user_ids = seed_users(args.users)
+            started = time.perf_counter()
+            for i in range(args.logs):
+                db.session.add(DeploymentLog(version=f'v{i}', environment='production', status='success'))
+                db.session.commit()
+            logs_elapsed = time.perf_counter() - started
+            started = time.perf_counter()
+            for index, when in logins:
+                db.session.get(User, user_ids[index]).last_login = when
+                db.session.commit()
+            logins_elapsed = time.perf_counter() - started
+        print(f"per-row   logs {args.logs / logs_elapsed:>10,.0f}/s   "
+              f"last_login {args.logins / logins_elapsed:>10,.0f}/s")
+
+        app = make_app(os.path.join(tmp, 'batched.db'))
+        with app.app_context():
+            db.create_all()
+            user_ids = seed_users(args.users)
+            queue = WriteBehindQueue(engine=db.engine, max_batch=10 ** 9)
+            started = time.perf_counter()
+            for i in range(args.logs):
+                queue.add_deployment_log(f'v{i}', 'production', 'success')
+            queue.flush()
+            logs_elapsed = time.perf_counter() - started
+            started = time.perf_counter()
+            for index, when in logins:
+                queue.touch_last_login(user_ids[index], when)
+            queue.flush()
+            logins_elapsed = time.perf_counter() - started
+            assert DeploymentLog.query.count() == args.logs
+        print(f"batched   logs {args.logs / logs_elapsed:>10,.0f}/s   "
+              f"last_login {args.logins / logins_elapsed:>10,.0f}/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,24 @@
-"""
-import os
 from datetime import timedelta
 
+from config.registry import Setting
+
 class DevelopmentConfig:
-    \"\"\"Development configuration.\"\"\"
+    """Development configuration."""
     
     # Basic Flask config
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
+    SECRET_KEY = Setting('SECRET_KEY', 'dev-secret-key')
     DEBUG = True
     TESTING = False
     
     # Database configuration (SQLite for simplicity)
-    DATABASE_URL = os.environ.get('DATABASE_URL') or 'sqlite:///flask_app_dev.db'
+    DATABASE_URL = Setting('DATABASE_URL', 'sqlite:///flask_app_dev.db')
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = True  # Enabled for development
     SQLALCHEMY_ECHO = True  # Log SQL queries
+    WRITE_BEHIND_ENABLED = Setting('WRITE_BEHIND_ENABLED', False, bool)
     
     # Redis configuration (optional in development)
-    REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/2'
+    REDIS_URL = Setting('REDIS_URL', 'redis://localhost:6379/2')
     
     # Cache configuration (simple cache for development)
     CACHE_TYPE = 'simple'
@@ -42,6 +43,9 @@ class DevelopmentConfig:
     # Logging configuration (console only)
     LOG_LEVEL = 'DEBUG'
     LOG_TO_STDOUT = True
+    ACCESS_LOG_SAMPLE_RATE = 1.0
+    ACCESS_LOG_ALWAYS_STATUS = 400
+    ACCESS_LOG_SLOW_MS = 200
     
     # Email configuration (console backend)
     MAIL_BACKEND = 'console'
@@ -84,15 +88,51 @@ class DevelopmentConfig:
     # Monitoring (minimal)
     PROMETHEUS_METRICS = False
     HEALTH_CHECK_TIMEOUT = 1
+    HEALTH_READY_TTL = 1  # seconds a /health/ready result is reused
     
     # Development flags
     DEVELOPMENT_MODE = True
     SKIP_AUTH_FOR_TESTING = True
-    ENABLE_PROFILER = os.environ.get('ENABLE_PROFILER', 'false').lower() == 'true'
+    ENABLE_PROFILER = Setting('ENABLE_PROFILER', False, bool)
+    
+    # Gunicorn (read by app/gunicorn.conf.py): one reloading worker
+    GUNICORN_WORKER_CLASS = 'sync'
+    GUNICORN_WORKERS = 1
+    GUNICORN_PRELOAD_APP = False
+    GUNICORN_MAX_REQUESTS = 0
+    GUNICORN_RELOAD = True
+    
+    # nginx front end: no caching or compression, so responses are the app's own
+    NGINX_WORKER_PROCESSES = 1
+    NGINX_WORKER_CONNECTIONS = 512
+    NGINX_GZIP_LEVEL = 0
+    NGINX_MICROCACHE_SECONDS = 0
+    
+    # Deployment (read by deployment/deploy.py through the config registry)
+    DOCKER_REGISTRY = Setting('DOCKER_REGISTRY', 'your-registry.com')
+    DEPLOY_NAMESPACE = 'flask-app'
+    DEPLOY_DOMAIN = 'development.yourdomain.com'
+    DEPLOY_REPLICAS = Setting('DEPLOY_REPLICAS', 1, int)
+    ROLLOUT_STRATEGY = 'recreate'
+    ROLLOUT_BATCH_SIZE = 1
+    ROLLOUT_MAX_SURGE = 1
+    ROLLOUT_DRAIN_SECONDS = 10
+    DEPLOY_COMMAND_TIMEOUTS = {'tests': 1800, 'build': 1800, 'push': 900, 'deploy': 600}
+    TEST_SELECTION = Setting('TEST_SELECTION', 'impact')
+    TEST_SHARDS = Setting('TEST_SHARDS', None, int)  # default: one per CPU
+    IMAGE_GC_MODE = Setting('IMAGE_GC_MODE', 'background')
+    IMAGE_GC_KEEP = 3
+    IMAGE_GC_BATCH_SIZE = 20
+    IMAGE_GC_CONCURRENCY = 2
+    CANARY_ENABLED = Setting('CANARY_ENABLED', False, bool)  # reads /metrics: needs PROMETHEUS_METRICS
+    CANARY_TRAFFIC_FRACTION = Setting('CANARY_TRAFFIC_FRACTION', 0.5, float)
+    CANARY_DURATION = Setting('CANARY_DURATION', 60, int)
+    CANARY_MIN_REQUESTS = 100
+    CANARY_LOAD_RPS = Setting('CANARY_LOAD_RPS', 20, int)
     
     @staticmethod
     def init_app(app):
-        \"\"\"Initialize application with development-specific settings.\"\"\"
+        """Initialize application with development-specific settings."""
         
         import logging
         
@@ -103,4 +143,3 @@ class DevelopmentConfig:
         ))
         console_handler.setLevel(logging.DEBUG)
         app.logger.addHandler(console_handler)
-"""
@@ -0,0 +1,261 @@
+"""
+Non-blocking logging pipeline shared by the Flask app and the deploy tool.
+
+Loggers get a single BoundedQueueHandler whose emit() only enqueues. A
+background listener drains the queue in batches and hands each batch to the
+real handlers, so file writes and SMTP handshakes never happen on the
+caller's thread.
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import BaseRotatingHandler, RotatingFileHandler, SMTPHandler
+
+OVERFLOW_DROP = 'drop'
+OVERFLOW_BLOCK = 'block'
+
+
+class BoundedQueueHandler(logging.Handler):
+    """Enqueue records onto a bounded queue, dropping or blocking when full.
+
+    Under the block policy the caller waits for space however long it takes,
+    so nothing is lost but a stalled handler stalls requests. Under the drop
+    policy a record that does not fit is counted and discarded, except that
+    ERROR and above first wait up to ``block_timeout`` for space, so a flood
+    of INFO records cannot push out an error.
+    """
+
+    def __init__(self, record_queue, overflow=OVERFLOW_DROP, block_timeout=1.0):
+        super().__init__()
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_BLOCK):
+            raise ValueError(f'Unknown overflow policy: {overflow}')
+        self.queue = record_queue
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render message and traceback now; args may not be safe to use later
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            record = self.prepare(record)
+            if self.overflow == OVERFLOW_BLOCK:
+                self.queue.put(record)
+            elif record.levelno >= logging.ERROR:
+                # Errors are worth a short wait even under the drop policy
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class DigestSMTPHandler(SMTPHandler):
+    """SMTPHandler that coalesces bursts of records into one digest mail.
+
+    The first record of a burst starts a window of ``digest_seconds``; every
+    record arriving in that window goes into the same message.
+    """
+
+    def __init__(self, *args, digest_seconds=60, max_records=100, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.digest_seconds = digest_seconds
+        self.max_records = max_records
+        self.pending = []
+        self.window_started = None
+        self.suppressed = 0
+        self.mails_sent = 0
+
+    def emit(self, record):
+        if not self.pending:
+            self.window_started = time.monotonic()
+        if len(self.pending) < self.max_records:
+            self.pending.append(record)
+        else:
+            self.suppressed += 1
+
+    def due(self):
+        return bool(self.pending) and time.monotonic() - self.window_started >= self.digest_seconds
+
+    def format(self, record):
+        # The digest body is already made of formatted records
+        if getattr(record, 'digest', False):
+            return record.getMessage()
+        return super().format(record)
+
+    def getSubject(self, record):
+        count = getattr(record, 'digest_count', 1)
+        return f'{self.subject} ({count} errors)' if count > 1 else self.subject
+
+    def flush(self):
+        if not self.pending:
+            return
+        records, self.pending = self.pending, []
+        suppressed, self.suppressed = self.suppressed, 0
+        body = '\n\n'.join(super(DigestSMTPHandler, self).format(r) for r in records)
+        if suppressed:
+            body += f'\n\n... and {suppressed} more records in this window'
+        levelno = max(r.levelno for r in records)
+        super().emit(logging.makeLogRecord({
+            'name': records[0].name,
+            'levelno': levelno,
+            'levelname': logging.getLevelName(levelno),
+            'msg': body,
+            'digest': True,
+            'digest_count': len(records) + suppressed,
+        }))
+        self.mails_sent += 1
+
+
+class QueueLoggingPipeline:
+    """Bounded queue plus a listener thread that feeds handlers in batches"""
+
+    def __init__(self, handlers, maxsize=10000, overflow=OVERFLOW_DROP, batch_size=256):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.handler = BoundedQueueHandler(self.queue, overflow)
+        self.handlers = list(handlers)
+        self.batch_size = batch_size
+        self.processed = 0
+        self._stop = threading.Event()
+        self._start_listener()
+        atexit.register(self.stop)
+        # A worker forked from a preloading master inherits the queue but not
+        # the listener thread, and the queue's locks may be mid-use
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_listener(self):
+        self._thread = threading.Thread(target=self._run, name='log-listener', daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        if self._stop.is_set():
+            return
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.handler.queue = self.queue
+        self.processed = 0
+        self._start_listener()
+
+    def _drain(self):
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        # None is the wake-up sentinel put by stop()
+        return [record for record in batch if record is not None]
+
+    def _write_stream_batch(self, handler, records):
+        """Write a batch to a stream/file handler with a single flush at the end"""
+        handler.acquire()
+        try:
+            if handler.stream is None and hasattr(handler, '_open'):
+                handler.stream = handler._open()
+            rotating = isinstance(handler, BaseRotatingHandler)
+            for record in records:
+                if rotating and handler.shouldRollover(record):
+                    handler.doRollover()
+                # Buffered by the stream; only the final flush hits the OS
+                handler.stream.write(handler.format(record) + handler.terminator)
+            handler.flush()
+        finally:
+            handler.release()
+
+    def _dispatch(self, records):
+        for handler in self.handlers:
+            selected = [r for r in records if r.levelno >= handler.level and handler.filter(r)]
+            if not selected:
+                continue
+            try:
+                if isinstance(handler, logging.StreamHandler):
+                    self._write_stream_batch(handler, selected)
+                else:
+                    for record in selected:
+                        handler.handle(record)
+            except Exception:
+                handler.handleError(selected[-1])
+
+    def _flush_digests(self, force=False):
+        for handler in self.handlers:
+            if isinstance(handler, DigestSMTPHandler) and (force or handler.due()):
+                handler.flush()
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            batch = self._drain()
+            if batch:
+                self._dispatch(batch)
+                self.processed += len(batch)
+            self._flush_digests()
+
+    def attach(self, logger):
+        logger.addHandler(self.handler)
+        return self
+
+    def stop(self):
+        """Drain the queue, flush pending digests and close handlers"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=10)
+        self._flush_digests(force=True)
+        for handler in self.handlers:
+            handler.close()
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'enqueued': self.handler.enqueued,
+            'dropped': self.handler.dropped,
+            'processed': self.processed,
+        }
+
+
+def install_queue_logging(logger, handlers, config=None):
+    """Route ``logger`` through a queue pipeline feeding ``handlers``"""
+    config = config or {}
+    pipeline = QueueLoggingPipeline(
+        handlers,
+        maxsize=config.get('LOG_QUEUE_SIZE', 10000),
+        overflow=config.get('LOG_QUEUE_OVERFLOW', OVERFLOW_DROP),
+        batch_size=config.get('LOG_BATCH_SIZE', 256),
+    )
+    return pipeline.attach(logger)
+
+
+def install_access_log(app, path='logs/access.log'):
+    """Send the app's sampled JSON access lines to their own file, one object per line"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    access_handler = RotatingFileHandler(path, maxBytes=10240000, backupCount=10)
+    access_handler.setFormatter(logging.Formatter('%(message)s'))
+    access_logger = app.logger.getChild('access')
+    access_logger.propagate = False
+    app.extensions['access_log_queue'] = install_queue_logging(access_logger, [access_handler], app.config)
+    return app.extensions['access_log_queue']
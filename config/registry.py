@@ -0,0 +1,241 @@
+"""
+Single entry point to the environment config classes.
+
+The environment is resolved once per process and maps to one of the classes
+in this package. Values that come from the process environment are declared
+as ``Setting`` descriptors, which read and type-check the variable the first
+time the value is used instead of at import time. ``ConfigRegistry`` memoizes
+lookups, validates every Setting at once, and builds an immutable snapshot.
+The Flask app factory, gunicorn.conf.py and the deploy tool all read through
+it.
+"""
+
+import os
+import logging
+import importlib
+import threading
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+ENVIRONMENTS = {
+    'development': 'config.development.DevelopmentConfig',
+    'staging': 'config.staging.StagingConfig',
+    'production': 'config.production.ProductionConfig'
+}
+DEFAULT_ENVIRONMENT = 'production'
+
+_TRUE = {'1', 'true', 'yes', 'on'}
+_FALSE = {'0', 'false', 'no', 'off'}
+
+
+class ConfigError(ValueError):
+    """Raised when a setting cannot be parsed as its declared type"""
+
+
+class Setting:
+    """Class attribute read from an environment variable on first access.
+
+    Empty and unset variables both fall back to ``default``. Parsed values are
+    memoized, so later changes to os.environ are not seen.
+    """
+
+    _UNSET = object()
+
+    def __init__(self, env_var, default=None, type=str):
+        self.env_var = env_var
+        self.default = default
+        self.type = type
+        self._value = self._UNSET
+        self._lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def parse(self, raw):
+        if self.type is bool:
+            lowered = raw.strip().lower()
+            if lowered in _TRUE or lowered in _FALSE:
+                return lowered in _TRUE
+            raise ConfigError(f'{self.env_var}={raw!r} is not a boolean')
+        try:
+            return self.type(raw)
+        except (TypeError, ValueError):
+            raise ConfigError(f'{self.env_var}={raw!r} is not a valid {self.type.__name__}')
+
+    def resolve(self):
+        if self._value is self._UNSET:
+            with self._lock:
+                if self._value is self._UNSET:
+                    raw = os.environ.get(self.env_var)
+                    self._value = self.parse(raw) if raw else self.default
+        return self._value
+
+    def __get__(self, instance, owner):
+        return self.resolve()
+
+
+def resolve_environment(name=None):
+    """Map an environment name (or FLASK_ENV) to a known config environment"""
+    name = name or os.getenv('FLASK_ENV') or DEFAULT_ENVIRONMENT
+    if name not in ENVIRONMENTS:
+        logger.warning(f'Unknown environment {name!r}, using {DEFAULT_ENVIRONMENT} config')
+        name = DEFAULT_ENVIRONMENT
+    return name
+
+
+class ConfigRegistry:
+    """Memoized, validated view of one environment's config class"""
+
+    def __init__(self, environment=None):
+        self.environment = resolve_environment(environment)
+        self._config_class = None
+        self._values = {}
+        self._snapshot = None
+
+    @property
+    def config_class(self):
+        if self._config_class is None:
+            module_name, class_name = ENVIRONMENTS[self.environment].rsplit('.', 1)
+            self._config_class = getattr(importlib.import_module(module_name), class_name)
+        return self._config_class
+
+    def keys(self):
+        # The same rule Flask's from_object applies
+        return [key for key in dir(self.config_class) if key.isupper()]
+
+    def get(self, key, default=None):
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = getattr(self.config_class, key, default)
+            return value
+
+    def __getitem__(self, key):
+        if not hasattr(self.config_class, key):
+            raise KeyError(key)
+        return self.get(key)
+
+    def __contains__(self, key):
+        return hasattr(self.config_class, key)
+
+    def settings(self):
+        """Every Setting descriptor on the config class, by attribute name"""
+        found = {}
+        for klass in reversed(self.config_class.__mro__):
+            for name, value in vars(klass).items():
+                if isinstance(value, Setting):
+                    found[name] = value
+        return found
+
+    def validate(self):
+        """Resolve every Setting, raising one ConfigError that lists all bad values"""
+        errors = []
+        for setting in self.settings().values():
+            try:
+                setting.resolve()
+            except ConfigError as e:
+                errors.append(str(e))
+        if errors:
+            raise ConfigError(f'Invalid {self.environment} configuration: ' + '; '.join(errors))
+
+    def snapshot(self):
+        """Immutable mapping of every setting, built once per process.
+
+        Built in the gunicorn master when the app is preloaded, so workers
+        share it copy-on-write instead of each re-reading the environment.
+        """
+        if self._snapshot is None:
+            self.validate()
+            self._snapshot = MappingProxyType({key: self.get(key) for key in self.keys()})
+        return self._snapshot
+
+    def init_app(self, app):
+        app.config.from_mapping(self.snapshot())
+        app.config['ENVIRONMENT'] = self.environment
+        app.extensions['config_registry'] = self
+        # Environment-specific setup such as the queued log handlers
+        init = getattr(self.config_class, 'init_app', None)
+        if init is not None:
+            init(app)
+
+    def deploy_settings(self):
+        """Settings the deploy tool needs, straight from the config class"""
+        engine = self.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        static_max_age = self.get('SEND_FILE_MAX_AGE_DEFAULT')
+        if hasattr(static_max_age, 'total_seconds'):
+            static_max_age = int(static_max_age.total_seconds())
+        return {
+            'docker_registry': self.get('DOCKER_REGISTRY', 'local'),
+            'namespace': self.get('DEPLOY_NAMESPACE', 'flask-app'),
+            'replicas': self.get('DEPLOY_REPLICAS', 1),
+            'domain': self.get('DEPLOY_DOMAIN'),
+            'rollout_strategy': self.get('ROLLOUT_STRATEGY', 'recreate'),
+            'rollout_batch_size': self.get('ROLLOUT_BATCH_SIZE', 1),
+            'rollout_max_surge': self.get('ROLLOUT_MAX_SURGE', 1),
+            'rollout_drain_seconds': self.get('ROLLOUT_DRAIN_SECONDS', 10),
+            'command_timeouts': dict(self.get('DEPLOY_COMMAND_TIMEOUTS') or {}),
+            'test_selection': self.get('TEST_SELECTION', 'full'),
+            'test_shards': self.get('TEST_SHARDS'),
+            'image_gc_mode': self.get('IMAGE_GC_MODE', 'background'),
+            'image_gc_keep': self.get('IMAGE_GC_KEEP', 5),
+            'image_gc_batch_size': self.get('IMAGE_GC_BATCH_SIZE', 20),
+            'image_gc_concurrency': self.get('IMAGE_GC_CONCURRENCY', 2),
+            'canary_enabled': self.get('CANARY_ENABLED', False),
+            'canary_traffic_fraction': self.get('CANARY_TRAFFIC_FRACTION', 0.1),
+            'canary_duration': self.get('CANARY_DURATION', 300),
+            'canary_min_requests': self.get('CANARY_MIN_REQUESTS', 200),
+            'canary_latency_quantiles': list(self.get('CANARY_LATENCY_QUANTILES') or (0.5, 0.99)),
+            'canary_max_latency_ratio': self.get('CANARY_MAX_LATENCY_RATIO', 1.2),
+            'canary_max_error_rate_increase': self.get('CANARY_MAX_ERROR_RATE_INCREASE', 0.01),
+            'canary_confidence': self.get('CANARY_CONFIDENCE', 0.95),
+            'canary_load_rps': self.get('CANARY_LOAD_RPS', 0),
+            'canary_load_url': self.get('CANARY_LOAD_URL', 'http://localhost'),
+            'canary_load_paths': list(self.get('CANARY_LOAD_PATHS') or ('/api/data',)),
+            'db_pool_size': engine.get('pool_size', 5),
+            'db_max_overflow': engine.get('max_overflow', 10),
+            'gunicorn_workers': self.get('GUNICORN_WORKERS'),
+            'gunicorn_max_workers': self.get('GUNICORN_MAX_WORKERS', 16),
+            'gunicorn_worker_class': self.get('GUNICORN_WORKER_CLASS', 'gthread'),
+            'gunicorn_threads': self.get('GUNICORN_THREADS', 4),
+            'gunicorn_worker_connections': self.get('GUNICORN_WORKER_CONNECTIONS', 1000),
+            'gunicorn_keepalive': self.get('GUNICORN_KEEPALIVE', 5),
+            'gunicorn_timeout': self.get('GUNICORN_TIMEOUT', 30),
+            'max_content_length': self.get('MAX_CONTENT_LENGTH'),
+            'session_cookie': self.get('SESSION_COOKIE_NAME', 'session'),
+            'static_folder': self.get('STATIC_FOLDER'),
+            'static_max_age': static_max_age or 0,
+            'nginx_worker_processes': self.get('NGINX_WORKER_PROCESSES', 'auto'),
+            'nginx_worker_connections': self.get('NGINX_WORKER_CONNECTIONS', 4096),
+            'nginx_gzip_level': self.get('NGINX_GZIP_LEVEL', 4),
+            'nginx_brotli': self.get('NGINX_BROTLI', False),
+            'nginx_microcache_seconds': self.get('NGINX_MICROCACHE_SECONDS', 0),
+            'nginx_microcache_size': self.get('NGINX_MICROCACHE_SIZE', '100m'),
+        }
+
+    def describe(self):
+        """One-line summary of the capacity-relevant settings"""
+        deploy = self.deploy_settings()
+        workers = deploy['gunicorn_workers'] or deploy['gunicorn_max_workers']
+        per_worker = deploy['db_pool_size'] + deploy['db_max_overflow']
+        return (
+            f"{self.environment}: {deploy['replicas']} replicas from {deploy['docker_registry']}, "
+            f"{deploy['rollout_strategy']} rollout, "
+            f"{'' if deploy['gunicorn_workers'] else 'up to '}{workers} workers per replica, "
+            f"DB pool {deploy['db_pool_size']}+{deploy['db_max_overflow']} per worker "
+            f"(up to {per_worker * workers * deploy['replicas']} connections)"
+        )
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(environment=None):
+    """Process-wide registry for ``environment`` (default: FLASK_ENV)"""
+    name = resolve_environment(environment)
+    registry = _registries.get(name)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.setdefault(name, ConfigRegistry(name))
+    return registry
@@ -0,0 +1,126 @@
+"""
+Import-time and initialization breakdown for cold starts.
+
+Enabled by a ``--profile-startup`` argument or PROFILE_STARTUP=1. Once
+installed, a meta path finder times every module executed from then on,
+and ``mark()`` closes a named initialization phase. ``report()`` prints the
+slowest imports and the phases, showing how much of each phase was import time.
+"""
+
+import os
+import sys
+import threading
+from time import perf_counter
+
+FLAG = '--profile-startup'
+
+
+class _TimedLoader:
+    """Loader proxy that times exec_module; everything else goes to the real loader"""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit(module.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class StartupProfiler:
+    """Times module imports and named startup phases"""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.imports = {}  # module -> (cumulative seconds, self seconds)
+        self.phases = []  # (name, seconds, import seconds)
+        self.import_seconds = 0.0
+        self._last_mark = self.started
+        self._imports_at_mark = 0.0
+        self._local = threading.local()
+        self._finding = threading.local()
+
+    @classmethod
+    def start_if_requested(cls, argv=None):
+        """Install and return a profiler if startup profiling was asked for, else None"""
+        argv = sys.argv if argv is None else argv
+        if FLAG in argv or os.getenv('PROFILE_STARTUP', '').lower() in ('1', 'true', 'yes'):
+            return cls().install()
+        return None
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    # Meta path finder protocol
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._finding, 'active', False):
+            return None
+        self._finding.active = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                        spec.loader = _TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._finding.active = False
+
+    def _enter(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        # [start, seconds spent in nested imports]
+        stack.append([perf_counter(), 0.0])
+
+    def _exit(self, name):
+        stack = self._local.stack
+        started, nested = stack.pop()
+        elapsed = perf_counter() - started
+        self.imports[name] = (elapsed, elapsed - nested)
+        if stack:
+            stack[-1][1] += elapsed
+        else:
+            self.import_seconds += elapsed
+
+    # Phases and reporting
+
+    def mark(self, name):
+        """Close the phase that started at the previous mark (or at install)"""
+        now = perf_counter()
+        self.phases.append((name, now - self._last_mark, self.import_seconds - self._imports_at_mark))
+        self._last_mark = now
+        self._imports_at_mark = self.import_seconds
+
+    def report(self, top=15, stream=None):
+        stream = stream or sys.stderr
+        total = perf_counter() - self.started
+        write = stream.write
+        write(f'Startup profile: {total * 1000:.1f} ms total, '
+              f'{self.import_seconds * 1000:.1f} ms in {len(self.imports)} imports\n')
+        write('\n  phase                              total ms   import ms\n')
+        for name, seconds, import_seconds in self.phases:
+            write(f'  {name:<32} {seconds * 1000:>10.1f} {import_seconds * 1000:>11.1f}\n')
+        write(f'\n  slowest imports (of {len(self.imports)})        cumulative ms     self ms\n')
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        for name, (cumulative, own) in slowest:
+            write(f'  {name:<36} {cumulative * 1000:>13.1f} {own * 1000:>11.1f}\n')
+        stream.flush()
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import hashlib
+import fnmatch
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Always excluded from the context hash, whether or not .dockerignore says so
+DEFAULT_IGNORES = ['**/__pycache__', '**/*.pyc', '.git', '.pytest_cache']
+
+
+def load_json(path: Path) -> Dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json(path: Path, data: Dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class IgnoreRules:
+    """Subset of .dockerignore semantics: globs, ``**`` and ``!`` re-includes"""
+
+    def __init__(self, patterns: List[str]):
+        self.rules: List[Tuple[str, bool]] = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            negate = pattern.startswith('!')
+            pattern = pattern.lstrip('!').strip('/')
+            self.rules.append((pattern, negate))
+
+    @classmethod
+    def from_context(cls, context_dir: Path) -> 'IgnoreRules':
+        patterns = list(DEFAULT_IGNORES)
+        ignore_file = context_dir / '.dockerignore'
+        if ignore_file.exists():
+            patterns += ignore_file.read_text().splitlines()
+        return cls(patterns)
+
+    @staticmethod
+    def _matches(pattern: str, path: str) -> bool:
+        # A pattern naming a directory also excludes everything below it
+        parts = path.split('/')
+        for i in range(1, len(parts) + 1):
+            prefix = '/'.join(parts[:i])
+            if fnmatch.fnmatchcase(prefix, pattern):
+                return True
+            if pattern.startswith('**/') and fnmatch.fnmatchcase(prefix, pattern[3:]):
+                return True
+        return False
+
+    def may_reinclude(self, directory: str) -> bool:
+        """Whether a ``!`` pattern could re-include something below ``directory``"""
+        parts = directory.split('/')
+        for pattern, negate in self.rules:
+            if not negate:
+                continue
+            if pattern.startswith('**'):
+                return True
+            if all(fnmatch.fnmatchcase(part, p) for part, p in zip(parts, pattern.split('/'))):
+                return True
+        return False
+
+    def ignored(self, path: str) -> bool:
+        result = False
+        for pattern, negate in self.rules:
+            if self._matches(pattern, path):
+                result = not negate
+        return result
+
+
+class ContextHasher:
+    """Incremental content hash of a Docker build context.
+
+    File digests are kept in an index keyed by relative path together with
+    the file's mtime and size, so a file is only re-read when either changed.
+    """
+
+    def __init__(self, context_dir: Path, index_path: Path):
+        self.context_dir = Path(context_dir)
+        self.index_path = Path(index_path)
+        self.files_hashed = 0
+        self.files_reused = 0
+
+    def _files(self) -> List[Tuple[str, Path]]:
+        rules = IgnoreRules.from_context(self.context_dir)
+        files = []
+        for root, dirs, names in os.walk(self.context_dir):
+            rel_root = os.path.relpath(root, self.context_dir)
+            rel_root = '' if rel_root == '.' else rel_root.replace(os.sep, '/') + '/'
+            dirs[:] = sorted(d for d in dirs if not rules.ignored(rel_root + d) or
+                             rules.may_reinclude(rel_root + d))
+            for name in names:
+                rel = rel_root + name
+                if not rules.ignored(rel):
+                    files.append((rel, Path(root) / name))
+        return sorted(files)
+
+    def _file_digest(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def compute(self) -> str:
+        """Hash of every file in the context, reusing digests of unchanged files"""
+        index = load_json(self.index_path)
+        new_index = {}
+        combined = hashlib.sha256()
+        self.files_hashed = self.files_reused = 0
+
+        for rel, path in self._files():
+            st = path.stat()
+            cached = index.get(rel)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                digest = cached[2]
+                self.files_reused += 1
+            else:
+                digest = self._file_digest(path)
+                self.files_hashed += 1
+            new_index[rel] = [st.st_mtime_ns, st.st_size, digest]
+            combined.update(f"{rel}\0{digest}\n".encode())
+
+        save_json(self.index_path, new_index)
+        return combined.hexdigest()
+
+
+class BuildCache:
+    """Maps build-context hashes to the image that was built from them"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries = load_json(self.path)
+
+    def lookup(self, context_hash: str) -> Optional[Dict]:
+        return self.entries.get(context_hash)
+
+    def store(self, context_hash: str, image: str, build_seconds: float) -> None:
+        self.entries[context_hash] = {
+            'image': image,
+            'build_seconds': round(build_seconds, 3),
+            'built_at': time.time()
+        }
+        save_json(self.path, self.entries)
+
+    def record_push(self, context_hash: str, push_seconds: float) -> None:
+        """Add push time so a later hit can report the full time it saved"""
+        entry = self.entries.get(context_hash)
+        if entry is not None:
+            entry['push_seconds'] = round(push_seconds, 3)
+            save_json(self.path, self.entries)
+
+    def invalidate(self, context_hash: str) -> None:
+        if self.entries.pop(context_hash, None) is not None:
+            save_json(self.path, self.entries)
+
+    def retarget(self, image: str, replacement: Optional[str]) -> None:
+        """Entries for a removed image tag: move them to ``replacement`` (another
+        tag of the same image) or drop them if the image itself is gone"""
+        changed = False
+        for context_hash, entry in list(self.entries.items()):
+            if entry['image'] != image:
+                continue
+            if replacement:
+                entry['image'] = replacement
+            else:
+                del self.entries[context_hash]
+            changed = True
+        if changed:
+            save_json(self.path, self.entries)
@@ -0,0 +1,158 @@
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from build_cache import load_json, save_json
+
+# BuildKit --progress=plain lines: "#7 [builder 3/4] RUN pip wheel ...",
+# "#7 DONE 41.2s", "#7 CACHED", "#7 ERROR: ..."
+STEP_HEADER = re.compile(r'^#(\d+) \[([^\]]+)\] (.+)$')
+STEP_DONE = re.compile(r'^#(\d+) DONE (\d+(?:\.\d+)?)s$')
+STEP_CACHED = re.compile(r'^#(\d+) CACHED$')
+STEP_ERROR = re.compile(r'^#(\d+) ERROR')
+
+# Growth over the previous build that is logged as a regression
+SIZE_REGRESSION = 0.10
+STEP_REGRESSION_SECONDS = 10.0
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+class BuildStep:
+    """One Dockerfile instruction as BuildKit reported it"""
+
+    def __init__(self, number: int, stage: str, instruction: str):
+        self.number = number
+        self.stage = stage
+        self.instruction = instruction
+        self.seconds = 0.0
+        self.status = 'running'
+
+    @property
+    def name(self) -> str:
+        return f"[{self.stage}] {self.instruction}"
+
+    def to_dict(self) -> Dict:
+        return {'name': self.name, 'seconds': self.seconds, 'status': self.status}
+
+
+def parse_build_steps(lines: List[str]) -> List[BuildStep]:
+    """Per-instruction timings from ``docker build --progress=plain`` output.
+
+    BuildKit's own bookkeeping steps ("[internal] load ...") are dropped.
+    """
+    steps: Dict[int, BuildStep] = {}
+    for line in lines:
+        match = STEP_HEADER.match(line)
+        if match:
+            number = int(match.group(1))
+            if number not in steps and not match.group(2).startswith('internal'):
+                steps[number] = BuildStep(number, match.group(2), match.group(3))
+            continue
+        match = STEP_DONE.match(line)
+        if match and int(match.group(1)) in steps:
+            step = steps[int(match.group(1))]
+            step.seconds, step.status = float(match.group(2)), 'built'
+            continue
+        match = STEP_CACHED.match(line)
+        if match and int(match.group(1)) in steps:
+            steps[int(match.group(1))].status = 'cached'
+            continue
+        match = STEP_ERROR.match(line)
+        if match and int(match.group(1)) in steps:
+            steps[int(match.group(1))].status = 'error'
+    return [steps[number] for number in sorted(steps)]
+
+
+def parse_layers(history_output: str) -> List[Dict]:
+    """Layers from ``docker history --human=false --format '{{.Size}}\\t{{.CreatedBy}}'``.
+
+    docker history lists the newest layer first; the result is in build order.
+    Metadata-only instructions (ENV, CMD, ...) have no size and are skipped.
+    """
+    layers = []
+    for line in history_output.splitlines():
+        size, _, created_by = line.partition('\t')
+        try:
+            size = int(size)
+        except ValueError:
+            continue
+        if size:
+            layers.append({'size': size, 'created_by': created_by.strip()})
+    layers.reverse()
+    return layers
+
+
+class BuildReport:
+    """Size and timing of one image build, comparable with earlier builds"""
+
+    def __init__(self, image: str, build_seconds: float, steps: List[BuildStep],
+                 image_size: Optional[int] = None, layers: Optional[List[Dict]] = None):
+        self.image = image
+        self.build_seconds = build_seconds
+        self.steps = steps
+        self.image_size = image_size
+        self.layers = layers or []
+
+    def to_dict(self) -> Dict:
+        return {
+            'image': self.image,
+            'built_at': time.time(),
+            'build_seconds': round(self.build_seconds, 3),
+            'image_size': self.image_size,
+            'layers': self.layers,
+            'steps': [step.to_dict() for step in self.steps]
+        }
+
+    def lines(self, top: int = 5) -> List[str]:
+        """Human-readable summary for the build stage log"""
+        cached = sum(1 for step in self.steps if step.status == 'cached')
+        size = _format_bytes(self.image_size) if self.image_size is not None else 'unknown size'
+        lines = [f"Image {self.image}: {size}, built in {self.build_seconds:.1f}s "
+                 f"({cached}/{len(self.steps)} steps cached)"]
+        for step in sorted(self.steps, key=lambda s: s.seconds, reverse=True)[:top]:
+            if step.status == 'built':
+                lines.append(f"  {step.seconds:7.1f}s  {step.name[:100]}")
+        for layer in sorted(self.layers, key=lambda l: l['size'], reverse=True)[:top]:
+            lines.append(f"  {_format_bytes(layer['size']):>8}  {layer['created_by'][:100]}")
+        return lines
+
+    def regressions(self, previous: Optional[Dict]) -> List[str]:
+        """Ways this build is worse than ``previous`` (a stored to_dict())"""
+        if not previous:
+            return []
+        found = []
+        before = previous.get('image_size')
+        if before and self.image_size and self.image_size > before * (1 + SIZE_REGRESSION):
+            found.append(f"image grew from {_format_bytes(before)} to "
+                         f"{_format_bytes(self.image_size)}")
+        earlier = {step['name']: step['seconds'] for step in previous.get('steps', [])
+                   if step.get('status') == 'built'}
+        for step in self.steps:
+            if step.status == 'built' and step.name in earlier and \
+                    step.seconds - earlier[step.name] > STEP_REGRESSION_SECONDS:
+                found.append(f"{step.name[:80]} took {step.seconds:.1f}s "
+                             f"(was {earlier[step.name]:.1f}s)")
+        return found
+
+
+class BuildReports:
+    """Most recent build reports, kept so each build can be compared with the last"""
+
+    def __init__(self, path: Path, keep: int = 20):
+        self.path = Path(path)
+        self.keep = keep
+        self.reports: List[Dict] = load_json(self.path).get('reports', [])
+
+    def latest(self) -> Optional[Dict]:
+        return self.reports[-1] if self.reports else None
+
+    def add(self, report: BuildReport) -> None:
+        self.reports = (self.reports + [report.to_dict()])[-self.keep:]
+        save_json(self.path, {'reports': self.reports})
@@ -0,0 +1,578 @@
+import re
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import subprocess
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from health_prober import ConnectionPool, ProbeError
+from rollout import RollingUpdate, container_addresses
+
+# Upper bounds of the app's latency histogram (app/prometheus_metrics.LATENCY_BUCKETS)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# One sample line of the Prometheus text format, and the labels inside it
+SAMPLE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+# nginx weight of every live replica while the canary takes its share
+BASELINE_WEIGHT = 100
+
+# Marks synthetic requests; nginx's micro-cache passes them through to the app
+# (deployment/nginx_config.MICROCACHE_TEMPLATE)
+LOAD_HEADERS = {'X-Canary-Load': '1'}
+
+# Rate limiter rejections: answered before the release's code runs
+RATE_LIMITED = 429
+
+
+def _normal_sf(z: float) -> float:
+    """P(Z > z) for a standard normal Z"""
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def proportion_p(baseline_hits: int, baseline_requests: int,
+                 canary_hits: int, canary_requests: int) -> float:
+    """One-sided two-proportion z-test p-value that a larger share of canary requests are hits"""
+    if not baseline_requests or not canary_requests:
+        return 1.0
+    pooled = (baseline_hits + canary_hits) / (baseline_requests + canary_requests)
+    if pooled in (0.0, 1.0):
+        return 1.0
+    se = math.sqrt(pooled * (1 - pooled) * (1 / baseline_requests + 1 / canary_requests))
+    return _normal_sf((canary_hits / canary_requests - baseline_hits / baseline_requests) / se)
+
+
+class LatencyHistogram:
+    """Request latencies in fixed buckets plus how many requests failed with a 5xx"""
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * len(self.bounds)
+        self.errors = 0
+
+    @property
+    def requests(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+    def observe(self, seconds: float, status: Optional[int]) -> None:
+        """Record one request; a status of None is a request that got no response"""
+        index = next(i for i, bound in enumerate(self.bounds) if seconds <= bound)
+        self.counts[index] += 1
+        if status is None or status >= 500:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Interpolated within the bucket, like PromQL's histogram_quantile"""
+        total = self.requests
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.bounds, self.counts):
+            if count and seen + count >= rank:
+                # Nothing to interpolate towards in the +Inf bucket
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            if bound != float('inf'):
+                lower = bound
+        return lower
+
+    def slower_than(self, seconds: float) -> int:
+        """Requests in the buckets above the one ``seconds`` falls in"""
+        index = next(i for i, bound in enumerate(self.bounds) if seconds <= bound)
+        return sum(self.counts[index + 1:])
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.errors += other.errors
+        return self
+
+    def since(self, earlier: Optional['LatencyHistogram']) -> 'LatencyHistogram':
+        """Requests recorded after ``earlier`` was taken"""
+        delta = LatencyHistogram(self.bounds)
+        if earlier is None:
+            return delta.merge(self)
+        delta.counts = [a - b for a, b in zip(self.counts, earlier.counts)]
+        delta.errors = self.errors - earlier.errors
+        if delta.errors < 0 or min(delta.counts) < 0:
+            # Counters went back: the replica restarted in between
+            return LatencyHistogram(self.bounds).merge(self)
+        return delta
+
+
+class TrafficSample:
+    """Latency histograms and 5xx counts per route ("GET /api/data") for one side of a comparison"""
+
+    def __init__(self):
+        self.routes: Dict[str, LatencyHistogram] = {}
+
+    def route(self, name: str) -> LatencyHistogram:
+        histogram = self.routes.get(name)
+        if histogram is None:
+            histogram = self.routes[name] = LatencyHistogram()
+        return histogram
+
+    def observe(self, route: str, seconds: float, status: Optional[int]) -> None:
+        self.route(route).observe(seconds, status)
+
+    @classmethod
+    def from_metrics(cls, text: str) -> 'TrafficSample':
+        """Read the request histograms and status counters out of a /metrics page"""
+        cumulative: Dict[str, Dict[float, float]] = {}
+        errors: Dict[str, float] = {}
+        for line in text.splitlines():
+            match = SAMPLE.match(line.strip())
+            if not match or match.group(1) not in ('flask_http_request_duration_seconds_bucket',
+                                                   'flask_http_requests_total'):
+                continue
+            labels = dict(LABEL.findall(match.group(2) or ''))
+            route = f"{labels.get('method', 'GET')} {labels.get('route', '')}"
+            value = float(match.group(3))
+            if match.group(1) == 'flask_http_requests_total':
+                if labels.get('status', '').startswith('5'):
+                    errors[route] = errors.get(route, 0) + value
+            else:
+                cumulative.setdefault(route, {})[float(labels.get('le', '+Inf'))] = value
+
+        sample = cls()
+        for route, buckets in cumulative.items():
+            histogram = sample.route(route)
+            previous = 0.0
+            for i, bound in enumerate(histogram.bounds):
+                total = buckets.get(bound, previous)
+                histogram.counts[i] = int(total - previous)
+                previous = total
+            histogram.errors = int(errors.get(route, 0))
+        return sample
+
+    def since(self, earlier: Optional['TrafficSample']) -> 'TrafficSample':
+        delta = TrafficSample()
+        for name, histogram in self.routes.items():
+            delta.routes[name] = histogram.since(earlier.routes.get(name) if earlier else None)
+        return delta
+
+    def merge(self, other: 'TrafficSample') -> 'TrafficSample':
+        for name, histogram in other.routes.items():
+            self.route(name).merge(histogram)
+        return self
+
+    def combined(self, routes: Optional[Iterable[str]] = None) -> LatencyHistogram:
+        """All routes, or the given ones, in one histogram"""
+        total = LatencyHistogram()
+        for name in self.routes if routes is None else routes:
+            if name in self.routes:
+                total.merge(self.routes[name])
+        return total
+
+
+class CanaryCheck:
+    """One comparison between baseline and canary"""
+
+    def __init__(self, metric: str, scope: str, baseline: float, canary: float,
+                 p_value: float, passed: bool, detail: str = ''):
+        self.metric = metric
+        self.scope = scope
+        self.baseline = baseline
+        self.canary = canary
+        self.p_value = p_value
+        self.passed = passed
+        self.detail = detail
+
+    def line(self) -> str:
+        if self.metric == 'error_rate':
+            values = f"{self.baseline:.2%} -> {self.canary:.2%}"
+        else:
+            values = f"{self.baseline * 1000:.1f}ms -> {self.canary * 1000:.1f}ms"
+        outcome = 'ok' if self.passed else 'FAIL'
+        return f"{outcome:<4} {self.metric} {self.scope}: {values} (p={self.p_value:.3g}){self.detail}"
+
+    def to_dict(self) -> Dict:
+        return {
+            'metric': self.metric,
+            'scope': self.scope,
+            'baseline': self.baseline,
+            'canary': self.canary,
+            'p_value': self.p_value,
+            'passed': self.passed
+        }
+
+
+class CanaryReport:
+    """Verdict of one canary analysis: pass, fail, inconclusive or skipped"""
+
+    def __init__(self, verdict: str, reason: str = '', checks: Optional[List[CanaryCheck]] = None,
+                 baseline_requests: int = 0, canary_requests: int = 0):
+        self.verdict = verdict
+        self.reason = reason
+        self.checks = checks or []
+        self.baseline_requests = baseline_requests
+        self.canary_requests = canary_requests
+
+    @property
+    def passed(self) -> bool:
+        # Too little traffic to tell is not a reason to promote
+        return self.verdict in ('pass', 'skipped')
+
+    def lines(self) -> List[str]:
+        lines = [
+            f"Canary {self.verdict}: {self.canary_requests} canary vs {self.baseline_requests} "
+            f"baseline requests" + (f", {self.reason}" if self.reason else '')
+        ]
+        return lines + [check.line() for check in self.checks]
+
+    def to_dict(self) -> Dict:
+        return {
+            'verdict': self.verdict,
+            'reason': self.reason,
+            'baseline_requests': self.baseline_requests,
+            'canary_requests': self.canary_requests,
+            'checks': [check.to_dict() for check in self.checks]
+        }
+
+
+class CanaryAnalysis:
+    """Compare canary traffic with baseline traffic taken over the same window.
+
+    Latency fails when one of the canary's ``latency_quantiles`` is more
+    than ``max_latency_ratio`` times the baseline's and significantly more
+    canary requests land above the baseline's bucket for that quantile
+    (one-sided two-proportion z-test). The median catches a release that
+    is slower on every request even when the tail is dominated by
+    queueing; the p99 catches one that stalls a few. Errors fail when the
+    canary's 5xx rate exceeds the baseline's by more than
+    ``max_error_rate_increase`` and a one-sided two-proportion z-test agrees.
+    Both need significance at ``confidence``, so a noisy window does not fail
+    a good release and a large but harmless difference needs the threshold
+    too. Checks run over all routes and again per route with at least
+    ``min_requests`` on both sides, Bonferroni-corrected. A canary with
+    fewer than ``min_requests`` in total is inconclusive.
+    """
+
+    def __init__(self, max_latency_ratio: float = 1.2, latency_quantiles: Sequence[float] = (0.5, 0.99),
+                 max_error_rate_increase: float = 0.01, confidence: float = 0.95,
+                 min_requests: int = 200, ignore_routes: Sequence[str] = ('/health', '/metrics')):
+        self.max_latency_ratio = max_latency_ratio
+        self.latency_quantiles = tuple(latency_quantiles)
+        self.max_error_rate_increase = max_error_rate_increase
+        self.confidence = confidence
+        self.min_requests = max(1, min_requests)
+        self.ignore_routes = tuple(ignore_routes)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'CanaryAnalysis':
+        return cls(
+            max_latency_ratio=config.get('canary_max_latency_ratio', 1.2),
+            latency_quantiles=config.get('canary_latency_quantiles', (0.5, 0.99)),
+            max_error_rate_increase=config.get('canary_max_error_rate_increase', 0.01),
+            confidence=config.get('canary_confidence', 0.95),
+            min_requests=config.get('canary_min_requests', 200),
+            ignore_routes=config.get('canary_ignore_routes', ('/health', '/metrics'))
+        )
+
+    def _analyzed(self, route: str) -> bool:
+        # Probes and scrapes hit every replica alike and say nothing about the release
+        path = route.partition(' ')[2]
+        return not any(path == prefix or path.startswith(prefix + '/') for prefix in self.ignore_routes)
+
+    def _latency(self, scope: str, baseline: LatencyHistogram, canary: LatencyHistogram,
+                 alpha: float) -> List[CanaryCheck]:
+        checks = []
+        for q in self.latency_quantiles:
+            base = baseline.quantile(q)
+            new = canary.quantile(q)
+            ratio = new / base if base else 1.0
+            # Buckets are too coarse to test the quantile itself; test the share beyond it
+            p_value = proportion_p(baseline.slower_than(base), baseline.requests,
+                                   canary.slower_than(base), canary.requests)
+            checks.append(CanaryCheck(f"p{q * 100:g}", scope, base, new, p_value,
+                                      passed=not (ratio > self.max_latency_ratio and p_value < alpha),
+                                      detail=f" x{ratio:.2f}"))
+        return checks
+
+    def _errors(self, scope: str, baseline: LatencyHistogram, canary: LatencyHistogram,
+                alpha: float) -> CanaryCheck:
+        p_value = proportion_p(baseline.errors, baseline.requests, canary.errors, canary.requests)
+        increase = canary.error_rate - baseline.error_rate
+        return CanaryCheck('error_rate', scope, baseline.error_rate, canary.error_rate, p_value,
+                           passed=not (increase > self.max_error_rate_increase and p_value < alpha))
+
+    def compare(self, baseline: TrafficSample, canary: TrafficSample) -> CanaryReport:
+        routes = sorted(name for name in set(baseline.routes) | set(canary.routes) if self._analyzed(name))
+        base_all = baseline.combined(routes)
+        canary_all = canary.combined(routes)
+        if canary_all.requests < self.min_requests or base_all.requests < self.min_requests:
+            return CanaryReport('inconclusive', f"need {self.min_requests} requests on each side",
+                                baseline_requests=base_all.requests, canary_requests=canary_all.requests)
+
+        scopes = [('all routes', base_all, canary_all)]
+        for name in routes if len(routes) > 1 else ():
+            base_route = baseline.routes.get(name)
+            canary_route = canary.routes.get(name)
+            if (base_route and canary_route and base_route.requests >= self.min_requests
+                    and canary_route.requests >= self.min_requests):
+                scopes.append((name, base_route, canary_route))
+        # Keep the chance of any false alarm across all tests within 1 - confidence
+        alpha = (1 - self.confidence) / ((len(self.latency_quantiles) + 1) * len(scopes))
+
+        checks = []
+        for scope, base, new in scopes:
+            checks += self._latency(scope, base, new, alpha)
+            checks.append(self._errors(scope, base, new, alpha))
+        failed = [f"{check.metric} {check.scope}" for check in checks if not check.passed]
+        return CanaryReport('fail' if failed else 'pass',
+                            f"worse {', '.join(failed)}" if failed else '',
+                            checks, base_all.requests, canary_all.requests)
+
+
+class LoadGenerator:
+    """Open-loop GETs at a fixed rate over keep-alive connections.
+
+    Requests go out on schedule whether or not earlier ones have returned,
+    and latency is measured from the scheduled start, so a stalled server
+    shows up as latency instead of silently lowering the rate. With several
+    targets each request picks one at random by weight, which is how the
+    offline analysis splits traffic without nginx.
+
+    Every request carries LOAD_HEADERS so that nginx never answers it from
+    the micro-cache. A 429 says nothing about the release either, so
+    rate-limited requests are left out of the samples and only counted in
+    ``rate_limited``.
+    """
+
+    def __init__(self, targets: Dict[str, str], paths: Sequence[str] = ('/api/data',), rps: float = 50,
+                 duration: float = 60, weights: Optional[Dict[str, float]] = None,
+                 concurrency: int = 64, timeout: float = 5.0, seed: Optional[int] = None):
+        self.targets = {name: url.rstrip('/') for name, url in targets.items()}
+        self.paths = list(paths)
+        self.rps = rps
+        self.duration = duration
+        self.weights = weights or {}
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.rate_limited: Dict[str, int] = {}
+
+    async def _request(self, pool: ConnectionPool, slots: asyncio.Semaphore, sample: TrafficSample,
+                       name: str, url: str, route: str, scheduled: float) -> None:
+        loop = asyncio.get_running_loop()
+        async with slots:
+            try:
+                status, _ = await pool.get(url, headers=LOAD_HEADERS)
+            except ProbeError:
+                status = None
+        if status == RATE_LIMITED:
+            self.rate_limited[name] += 1
+            return
+        sample.observe(route, loop.time() - scheduled, status)
+
+    async def _run(self) -> Dict[str, TrafficSample]:
+        names = list(self.targets)
+        weights = [self.weights.get(name, 1.0) for name in names]
+        samples = {name: TrafficSample() for name in names}
+        self.rate_limited = {name: 0 for name in names}
+        pool = ConnectionPool(self.timeout)
+        slots = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tasks = []
+        for i in range(int(self.rps * self.duration)):
+            scheduled = started + i / self.rps
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = self.random.choices(names, weights)[0]
+            path = self.paths[i % len(self.paths)]
+            route = f"GET {urlsplit(path).path}"
+            tasks.append(asyncio.ensure_future(
+                self._request(pool, slots, samples[name], name, self.targets[name] + path, route, scheduled)
+            ))
+        await asyncio.gather(*tasks)
+        pool.close()
+        return samples
+
+    def run(self) -> Dict[str, TrafficSample]:
+        """Client-side samples per target"""
+        return asyncio.run(self._run())
+
+
+def canary_weight(replicas: int, fraction: float) -> int:
+    """nginx weight giving one canary ``fraction`` of the requests next to ``replicas``
+    baseline servers of weight BASELINE_WEIGHT"""
+    fraction = min(max(fraction, 0.001), 0.999)
+    return max(1, round(BASELINE_WEIGHT * replicas * fraction / (1 - fraction)))
+
+
+class CanaryRelease(RollingUpdate):
+    """Run one replica of the new version next to the live ones and judge it.
+
+    The canary joins the nginx upstream with a weight that gives it
+    ``traffic_fraction`` of the requests. Each replica's /metrics is scraped
+    when the window opens and when it closes, so baseline and canary are
+    compared over the same ``duration`` seconds of the same traffic. An
+    optional load generator drives requests through the front door for
+    environments without real users. A canary that does not pass is taken
+    out of the upstream and removed; one that passes keeps serving until the
+    rollout replaces it along with the old replicas.
+    """
+
+    def __init__(self, runner, compose: List[str], cwd: Path, env: Dict,
+                 probe: Callable[[Dict[str, str]], bool], upstream_path: Path,
+                 analysis: CanaryAnalysis, traffic_fraction: float = 0.1, duration: float = 300,
+                 load: Optional[LoadGenerator] = None, scrape_timeout: float = 10.0,
+                 drain_seconds: float = 10, stop_timeout: int = 30, service: str = 'app',
+                 port: int = 5000, upstream_options: Optional[List[str]] = None,
+                 logger: Optional[logging.Logger] = None):
+        super().__init__(runner, compose, cwd, env, replicas=1, probe=probe,
+                         upstream_path=upstream_path, drain_seconds=drain_seconds,
+                         stop_timeout=stop_timeout, service=service, port=port,
+                         upstream_options=upstream_options, logger=logger)
+        self.analysis = analysis
+        self.traffic_fraction = traffic_fraction
+        self.duration = duration
+        self.load = load
+        self.scrape_timeout = scrape_timeout
+
+    async def _scrape_all(self, addresses: Dict[str, str]) -> Dict[str, Optional[TrafficSample]]:
+        pool = ConnectionPool(self.scrape_timeout)
+
+        async def scrape(ip: str) -> Optional[TrafficSample]:
+            try:
+                status, body = await pool.get(f"http://{ip}:{self.port}/metrics")
+            except ProbeError as e:
+                self.logger.warning(f"Could not scrape {ip}: {e}")
+                return None
+            if status != 200:
+                self.logger.warning(f"Could not scrape {ip}: HTTP {status}")
+                return None
+            return TrafficSample.from_metrics(body.decode('utf-8', 'replace'))
+
+        try:
+            samples = await asyncio.gather(*(scrape(ip) for ip in addresses.values()))
+        finally:
+            pool.close()
+        return dict(zip(addresses, samples))
+
+    def _scrape(self, addresses: Dict[str, str]) -> Dict[str, Optional[TrafficSample]]:
+        return asyncio.run(self._scrape_all(addresses))
+
+    def _window(self, baseline: List[str], canary: str) -> CanaryReport:
+        addresses = container_addresses(self.runner, baseline + [canary])
+        before = self._scrape(addresses)
+        if before.get(canary) is None:
+            return CanaryReport('inconclusive', "canary serves no /metrics")
+
+        weight = canary_weight(len(baseline), self.traffic_fraction)
+        weights = dict({cid: BASELINE_WEIGHT for cid in baseline}, **{canary: weight})
+        self._route_to(baseline + [canary], weights=weights)
+        share = weight / (weight + BASELINE_WEIGHT * len(baseline))
+        self.logger.info(f"Canary {canary} takes {share:.1%} of requests for {self.duration:.0f}s")
+
+        if self.load is not None:
+            self.load.duration = self.duration
+            generated = TrafficSample()
+            for sample in self.load.run().values():
+                generated.merge(sample)
+            total = generated.combined()
+            limited = sum(self.load.rate_limited.values())
+            self.logger.info(f"Synthetic load: {total.requests} requests, {total.errors} failed, "
+                             f"{limited} rate limited")
+            # The load is the only traffic here; too little of it reaching the app proves nothing
+            if total.requests < self.analysis.min_requests:
+                return CanaryReport('inconclusive', f"only {total.requests} synthetic requests reached "
+                                    f"the app ({limited} rate limited), need {self.analysis.min_requests}")
+        else:
+            time.sleep(self.duration)
+
+        after = self._scrape(addresses)
+        if after.get(canary) is None:
+            return CanaryReport('inconclusive', "lost the canary's /metrics")
+        baseline_sample = TrafficSample()
+        for cid in baseline:
+            if after.get(cid) is not None:
+                baseline_sample.merge(after[cid].since(before.get(cid)))
+        return self.analysis.compare(baseline_sample, after[canary].since(before[canary]))
+
+    def run(self) -> CanaryReport:
+        baseline = self._containers()
+        if not baseline:
+            return CanaryReport('skipped', "no live replicas to compare with")
+
+        new = self._scale(len(baseline) + 1)
+        if len(new) != 1:
+            self._remove(new)
+            return CanaryReport('fail', f"compose started {len(new)} canary replicas, expected 1")
+        if not self._healthy(new):
+            self._remove(new)
+            return CanaryReport('fail', "canary failed health check")
+
+        try:
+            report = self._window(baseline, new[0])
+        except subprocess.CalledProcessError as e:
+            report = CanaryReport('fail', f"{e.cmd[0]} exited {e.returncode}")
+        if not report.passed:
+            self.logger.info(f"Taking canary {new[0]} out of rotation")
+            self._route_to(baseline)
+            time.sleep(self.drain_seconds)
+            self._remove(new)
+        return report
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Canary analysis against two local servers, with traffic from a built-in load generator')
+    parser.add_argument('--baseline', required=True, help='base URL of the current version')
+    parser.add_argument('--canary', required=True, help='base URL of the new version')
+    parser.add_argument('--fraction', type=float, default=0.1, help='share of requests sent to the canary')
+    parser.add_argument('--rps', type=float, default=200)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--paths', nargs='+', default=['/api/data', '/'])
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--min-requests', type=int, default=200)
+    parser.add_argument('--max-latency-ratio', type=float, default=1.2)
+    parser.add_argument('--latency-quantiles', type=float, nargs='+', default=[0.5, 0.99])
+    parser.add_argument('--max-error-rate-increase', type=float, default=0.01)
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load = LoadGenerator({'baseline': args.baseline, 'canary': args.canary}, args.paths,
+                         rps=args.rps, duration=args.duration,
+                         weights={'baseline': 1 - args.fraction, 'canary': args.fraction},
+                         concurrency=args.concurrency, seed=args.seed)
+    samples = load.run()
+    for name, count in load.rate_limited.items():
+        if count:
+            logging.warning(f"{count} requests to {name} were rate limited and left out")
+    analysis = CanaryAnalysis(max_latency_ratio=args.max_latency_ratio,
+                              latency_quantiles=args.latency_quantiles,
+                              max_error_rate_increase=args.max_error_rate_increase,
+                              confidence=args.confidence, min_requests=args.min_requests)
+    report = analysis.compare(samples['baseline'], samples['canary'])
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        for line in report.lines():
+            print(line)
+    sys.exit(0 if report.passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,131 +1,321 @@
 import os
 import sys
+
+# Make the shared config package importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Installed before the remaining imports so --profile-startup can time them
+from config.startup_profiler import StartupProfiler
+startup_profiler = StartupProfiler.start_if_requested()
+
 import subprocess
 import json
 import time
 import logging
+import threading
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from build_cache import BuildCache, ContextHasher, save_json
+from build_report import BuildReport, BuildReports, parse_build_steps, parse_layers
+from config.logging_queue import install_queue_logging
+from config.registry import ENVIRONMENTS, get_registry
+from history import DeploymentHistory
+from process_runner import ProcessRunner
+from rollout import RollingUpdate, compose_containers, container_addresses, write_upstream
+
+# Only needed by some actions; imported where they are used so the others
+# skip them
+if TYPE_CHECKING:
+    from nginx_config import NginxSettings
+    from stage_graph import GraphRun, StageGraph
 
 class DeploymentPipeline:
-    def __init__(self, environment: str = 'production'):
+    def __init__(self, environment: str = 'production', full_tests: bool = False):
         self.environment = environment
+        self.full_tests = full_tests
         self.project_root = Path(__file__).parent.parent
         self.app_name = 'flask-app'
-        self.version = self._get_version()
+        # Set on every image this pipeline builds, so GC can tell its leftovers apart
+        self.image_label = f"deploy.app={self.app_name}"
         
-        # Setup logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+        # Setup logging; stage threads only enqueue, a listener writes to stderr
         self.logger = logging.getLogger(__name__)
+        self._setup_logging()
+        
+        # Set by the stage scheduler when a stage fails so siblings can abort
+        self.cancel_event = threading.Event()
+        self.last_run: Optional['GraphRun'] = None
+        
+        # Shared runner for every external command; kills commands on cancel
+        self.runner = ProcessRunner(logger=self.logger, cancel_event=self.cancel_event)
         
         # Load environment config
         self.config = self._load_config()
         
+        # Local deployment journal, used for rollback targets and image retention
+        self.state_dir = self.project_root / '.deploy'
+        self.history = DeploymentHistory(self.state_dir / 'history.db')
+        self.deployed_by = os.environ.get('GITHUB_ACTOR') or os.environ.get('USER')
+        
+        # Content-addressed cache of built images, keyed by build context hash
+        self.build_cache = BuildCache(self.state_dir / 'build-cache.json')
+        self.context_hash: Optional[str] = None
+        self.cached_image: Optional[str] = None
+        
+        # Size and per-step timing of recent builds, to spot regressions
+        self.build_reports = BuildReports(self.state_dir / 'build-reports.json')
+        
+        # nginx upstream block listing the live app replicas, mounted into nginx
+        self.upstream_path = self.state_dir / 'upstreams' / 'flask_app.conf'
+        
+        # nginx.conf rendered from this environment's config, mounted into nginx
+        self.nginx_conf_path = self.state_dir / 'nginx' / f"{environment}.conf"
+        
+    def _setup_logging(self) -> None:
+        self.log_queue = None
+        root = logging.getLogger()
+        if root.handlers:
+            return
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        # Block rather than drop: deploy output must be complete
+        self.log_queue = install_queue_logging(root, [console_handler], {'LOG_QUEUE_OVERFLOW': 'block'})
+        root.setLevel(logging.INFO)
+    
+    @cached_property
+    def version(self) -> str:
+        """Release version; resolved on first use because it shells out to git"""
+        return self._get_version()
+    
+    @cached_property
+    def nginx(self) -> 'NginxSettings':
+        """nginx settings for this environment; only the actions that touch nginx need them"""
+        from nginx_config import NginxSettings
+        return NginxSettings(self.config, self.environment)
+    
     def _get_version(self) -> str:
         """Get version from git tag or commit hash"""
-        try:
-            result = subprocess.run(
-                ['git', 'describe', '--tags', '--always'],
-                capture_output=True,
-                text=True,
-                cwd=self.project_root
-            )
-            return result.stdout.strip() or 'latest'
-        except:
-            return 'latest'
+        result = self.runner.run(
+            ['git', 'describe', '--tags', '--always'],
+            stage='version',
+            cwd=self.project_root,
+            timeout=30,
+            capture=True
+        )
+        return result.stdout.strip() if result.ok and result.stdout.strip() else 'latest'
+    
+    def _timeout(self, stage: str) -> Optional[float]:
+        """Per-stage command deadline in seconds"""
+        return self.config.get('command_timeouts', {}).get(stage)
     
     def _load_config(self) -> Dict:
-        """Load environment-specific configuration"""
-        config_file = self.project_root / 'config' / f'{self.environment}.py'
-        if config_file.exists():
-            # In a real scenario, you'd properly import the config
-            return {
-                'docker_registry': 'your-registry.com',
-                'namespace': 'flask-app',
-                'replicas': 3 if self.environment == 'production' else 1,
-                'domain': f'{self.environment}.yourdomain.com'
-            }
-        return {}
+        """Deploy settings from this environment's config class"""
+        registry = get_registry(self.environment)
+        registry.validate()
+        self.logger.info(f"Config {registry.describe()}")
+        return registry.deploy_settings()
     
     def run_tests(self) -> bool:
-        """Run test suite"""
-        self.logger.info("Running tests...")
+        """Run the test suite in parallel shards, or only the tests affected by changes"""
+        selection = 'full' if self.full_tests else self.config.get('test_selection', 'full')
+        self.logger.info(f"Running tests ({selection} selection)...")
+        since = self.history.current_version(self.environment) if selection == 'impact' else None
+        from sharded_tests import ShardedTestRun
+        tests = ShardedTestRun(self.project_root, self.state_dir, runner=self.runner,
+                               logger=self.logger, shards=self.config.get('test_shards'),
+                               timeout=self._timeout('tests'))
         try:
-            result = subprocess.run([
-                'python', '-m', 'pytest',
-                'tests/',
-                '--cov=app',
-                '--cov-report=xml'
-            ], cwd=self.project_root, check=True)
-            self.logger.info("Tests passed successfully")
-            return True
-        except subprocess.CalledProcessError:
-            self.logger.error("Tests failed")
-            return False
+            if tests.run(selection, since):
+                self.logger.info("Tests passed successfully")
+                return True
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            self.logger.error(str(e))
+        self.logger.error("Tests failed")
+        return False
+    
+    def _image_tag(self, version: Optional[str] = None) -> str:
+        return f"{self.config.get('docker_registry', 'local')}/{self.app_name}:{version or self.version}"
+    
+    def _check_build_cache(self) -> Optional[str]:
+        """Hash the build context and return the cached image for it, if any"""
+        hasher = ContextHasher(self.project_root, self.state_dir / 'build-index.json')
+        self.context_hash = hasher.compute()
+        self.logger.info(
+            f"Build context {self.context_hash[:12]} "
+            f"({hasher.files_hashed} files hashed, {hasher.files_reused} unchanged)"
+        )
+        entry = self.build_cache.lookup(self.context_hash)
+        return entry['image'] if entry else None
     
     def build_docker_image(self) -> bool:
         """Build Docker image"""
-        image_tag = f"{self.config.get('docker_registry', 'local')}/{self.app_name}:{self.version}"
+        image_tag = self._image_tag()
+        
+        cached_image = self._check_build_cache()
+        if cached_image:
+            result = self.runner.run(['docker', 'tag', cached_image, image_tag],
+                                     stage='build', timeout=60, capture=True)
+            if result.ok:
+                entry = self.build_cache.lookup(self.context_hash)
+                saved = entry.get('build_seconds', 0) + entry.get('push_seconds', 0)
+                self.cached_image = cached_image
+                self.logger.info(f"Build cache hit: tagged {cached_image} as {image_tag}, saved {saved:.1f}s")
+                return True
+            self.logger.info(f"Cached image {cached_image} is gone, rebuilding")
+            self.build_cache.invalidate(self.context_hash)
+        
         self.logger.info(f"Building Docker image: {image_tag}")
         
         try:
-            subprocess.run([
+            started = time.monotonic()
+            # BuildKit is needed for the Dockerfile's cache mounts; plain
+            # progress output carries the per-step timings
+            env = dict(os.environ, DOCKER_BUILDKIT='1')
+            result = self.runner.run([
                 'docker', 'build',
+                '--progress=plain',
+                '--label', self.image_label,
                 '-t', image_tag,
                 '-f', 'app/Dockerfile',
-                'app/'
-            ], cwd=self.project_root, check=True)
+                '.'
+            ], stage='build', cwd=self.project_root, env=env, timeout=self._timeout('build'),
+                capture=True, echo=True, check=True)
             
+            build_seconds = time.monotonic() - started
+            self.build_cache.store(self.context_hash, image_tag, build_seconds)
             self.logger.info("Docker image built successfully")
+            self._report_build(image_tag, build_seconds, result.lines + result.error_lines)
             return True
         except subprocess.CalledProcessError:
             self.logger.error("Docker build failed")
             return False
     
+    def _report_build(self, image_tag: str, build_seconds: float, output: List[str]) -> None:
+        """Log image size and per-step build time, and compare with the previous build"""
+        inspect = self.runner.run(['docker', 'image', 'inspect', '--format', '{{.Size}}', image_tag],
+                                  stage='build', timeout=60, capture=True)
+        history = self.runner.run([
+            'docker', 'history', '--human=false', '--no-trunc',
+            '--format', '{{.Size}}\t{{.CreatedBy}}', image_tag
+        ], stage='build', timeout=60, capture=True)
+        
+        size = int(inspect.stdout.strip()) if inspect.ok and inspect.stdout.strip().isdigit() else None
+        report = BuildReport(image_tag, build_seconds, parse_build_steps(output), size,
+                             parse_layers(history.stdout) if history.ok else [])
+        for line in report.lines():
+            self.logger.info(line)
+        for regression in report.regressions(self.build_reports.latest()):
+            self.logger.warning(f"Build regression: {regression}")
+        self.build_reports.add(report)
+    
     def push_docker_image(self) -> bool:
         """Push Docker image to registry"""
         if self.config.get('docker_registry') == 'local':
             self.logger.info("Skipping push for local registry")
             return True
             
-        image_tag = f"{self.config['docker_registry']}/{self.app_name}:{self.version}"
+        image_tag = self._image_tag()
+        
+        if self.cached_image:
+            # The layers are already in the registry; only add the new tag there
+            self.logger.info(f"Retagging {self.cached_image} as {image_tag} in registry")
+            try:
+                self.runner.run([
+                    'docker', 'buildx', 'imagetools', 'create',
+                    '--tag', image_tag, self.cached_image
+                ], stage='push', timeout=self._timeout('push'), check=True)
+                return True
+            except subprocess.CalledProcessError:
+                self.logger.warning("Registry retag failed, falling back to docker push")
+        
         self.logger.info(f"Pushing Docker image: {image_tag}")
         
         try:
-            subprocess.run(['docker', 'push', image_tag], check=True)
+            started = time.monotonic()
+            self.runner.run(['docker', 'push', image_tag], stage='push',
+                            timeout=self._timeout('push'), check=True)
+            if not self.cached_image:
+                self.build_cache.record_push(self.context_hash, time.monotonic() - started)
             self.logger.info("Docker image pushed successfully")
             return True
         except subprocess.CalledProcessError:
             self.logger.error("Docker push failed")
             return False
     
+    def _compose_command(self) -> List[str]:
+        return [
+            'docker-compose', '-f', 'deployment/docker-compose.yml',
+            '-p', f"{self.app_name}-{self.environment}"
+        ]
+    
+    def _compose_env(self, version: Optional[str] = None) -> Dict[str, str]:
+        env = os.environ.copy()
+        env.update({
+            'APP_VERSION': version or self.version,
+            'FLASK_ENV': self.environment,
+            'COMPOSE_PROJECT_NAME': f"{self.app_name}-{self.environment}",
+            'NGINX_UPSTREAM_DIR': str(self.upstream_path.parent),
+            'NGINX_CONF': str(self.nginx_conf_path)
+        })
+        if self.config.get('static_folder'):
+            env['STATIC_FOLDER'] = self.config['static_folder']
+        return env
+    
+    def _rolling_update(self, env: Dict[str, str]) -> bool:
+        """Replace app replicas batch by batch, gated on the health prober"""
+        update = RollingUpdate(
+            self.runner, self._compose_command(), self.project_root, env,
+            replicas=self.config.get('replicas', 1),
+            probe=lambda endpoints: self.health_check(endpoints=endpoints),
+            upstream_path=self.upstream_path,
+            batch_size=self.config.get('rollout_batch_size', 1),
+            max_surge=self.config.get('rollout_max_surge', 1),
+            drain_seconds=self.config.get('rollout_drain_seconds', 10),
+            upstream_options=self.nginx.upstream_options(),
+            logger=self.logger
+        )
+        return update.run()
+    
     def deploy_with_docker_compose(self) -> bool:
         """Deploy using Docker Compose"""
         self.logger.info("Deploying with Docker Compose...")
         
         # Set environment variables
-        env = os.environ.copy()
-        env.update({
-            'APP_VERSION': self.version,
-            'FLASK_ENV': self.environment,
-            'COMPOSE_PROJECT_NAME': f"{self.app_name}-{self.environment}"
-        })
+        env = self._compose_env()
+        compose = self._compose_command()
+        
+        self._write_nginx_config()
+        rolling = self.config.get('rollout_strategy') == 'rolling'
+        # nginx refuses to start if the upstream it proxies to is undefined. A
+        # rolling deploy starts nginx before any replica exists, so the
+        # placeholder must not need the app service name to resolve
+        if not self.upstream_path.exists():
+            write_upstream(self.upstream_path, [], 5000, options=self.nginx.upstream_options(),
+                           fallback='server 127.0.0.1:5000 down;' if rolling else None)
         
         try:
             # Pull latest images
-            subprocess.run([
-                'docker-compose', '-f', 'deployment/docker-compose.yml',
-                'pull'
-            ], cwd=self.project_root, env=env, check=True)
+            self.runner.run(compose + ['pull'], stage='deploy', cwd=self.project_root, env=env,
+                            timeout=self._timeout('deploy'), check=True)
             
-            # Deploy with zero-downtime
-            subprocess.run([
-                'docker-compose', '-f', 'deployment/docker-compose.yml',
-                'up', '-d', '--remove-orphans'
-            ], cwd=self.project_root, env=env, check=True)
+            if rolling:
+                # Bring up supporting services, then replace app replicas in batches;
+                # --no-deps keeps nginx's depends_on from starting an ungated app replica
+                self.runner.run(compose + ['up', '-d', '--no-deps', '--no-recreate', 'redis', 'nginx'],
+                                stage='deploy', cwd=self.project_root, env=env,
+                                timeout=self._timeout('deploy'), check=True)
+                if not self._rolling_update(env):
+                    self.logger.error("Deployment failed")
+                    return False
+            else:
+                self.runner.run(compose + [
+                    'up', '-d', '--remove-orphans',
+                    '--scale', f"app={self.config.get('replicas', 1)}"
+                ], stage='deploy', cwd=self.project_root, env=env,
+                    timeout=self._timeout('deploy'), check=True)
+                self._refresh_upstream(env)
             
             self.logger.info("Deployment completed successfully")
             return True
@@ -133,24 +323,110 @@ class DeploymentPipeline:
             self.logger.error("Deployment failed")
             return False
     
-    def health_check(self, max_retries: int = 30) -> bool:
+    def run_canary(self) -> bool:
+        """Send a share of traffic to one new replica and compare it with the live ones"""
+        self.logger.info("Starting canary analysis...")
+        
+        from canary import CanaryAnalysis, CanaryRelease, LoadGenerator
+        
+        env = self._compose_env()
+        self._write_nginx_config()
+        load = None
+        if self.config.get('canary_load_rps'):
+            # No real users in this environment: drive requests through nginx instead
+            load = LoadGenerator({'nginx': self.config.get('canary_load_url', 'http://localhost')},
+                                 paths=self.config.get('canary_load_paths') or ('/api/data',),
+                                 rps=self.config['canary_load_rps'])
+        
+        canary = CanaryRelease(
+            self.runner, self._compose_command(), self.project_root, env,
+            probe=lambda endpoints: self.health_check(endpoints=endpoints),
+            upstream_path=self.upstream_path,
+            analysis=CanaryAnalysis.from_config(self.config),
+            traffic_fraction=self.config.get('canary_traffic_fraction', 0.1),
+            duration=self.config.get('canary_duration', 300),
+            load=load,
+            drain_seconds=self.config.get('rollout_drain_seconds', 10),
+            upstream_options=self.nginx.upstream_options(),
+            logger=self.logger
+        )
+        try:
+            report = canary.run()
+        except subprocess.CalledProcessError as e:
+            self.logger.error(f"Canary failed: {e}")
+            return False
+        
+        for line in report.lines():
+            self.logger.info(line)
+        save_json(self.state_dir / 'canary.json', dict(report.to_dict(), version=self.version))
+        if not report.passed:
+            self.logger.error(f"Canary {report.verdict}, not promoting {self.version}")
+            return False
+        return True
+    
+    def _write_nginx_config(self) -> None:
+        """Render nginx.conf for this environment; running nginx picks it up on the next reload"""
+        from nginx_config import write_nginx_config
+        if write_nginx_config(self.nginx_conf_path, self.nginx.render()):
+            self.logger.info(f"Wrote {self.nginx_conf_path}")
+        self.logger.info(
+            f"nginx upstream keepalive pool: {self.nginx.upstream_keepalive or 'off'} "
+            f"({self.nginx.worker_class} workers, {self.nginx.upstream_concurrency} concurrent requests)"
+        )
+    
+    def _refresh_upstream(self, env: Dict[str, str]) -> None:
+        """Point nginx at the individual app replicas that are running now"""
+        write_upstream(self.upstream_path, self._replica_addresses(), 5000,
+                       options=self.nginx.upstream_options())
+        self.runner.run(self._compose_command() + ['exec', '-T', 'nginx', 'nginx', '-s', 'reload'],
+                        stage='nginx', cwd=self.project_root, env=env, timeout=30)
+    
+    def _replica_addresses(self) -> List[str]:
+        """Container IPs of the running app replicas"""
+        try:
+            container_ids = compose_containers(self.runner, self._compose_command(), 'app',
+                                               self.project_root, self._compose_env())
+            return list(container_addresses(self.runner, container_ids).values())
+        except subprocess.CalledProcessError:
+            return []
+    
+    def _health_endpoints(self) -> Dict[str, str]:
+        """Every replica's /health/ready plus the nginx front door"""
+        if self.config.get('health_endpoints'):
+            return dict(self.config['health_endpoints'])
+        
+        endpoints = {
+            f"replica-{ip}": f"http://{ip}:5000/health/ready"
+            for ip in self._replica_addresses()
+        }
+        if not endpoints:
+            endpoints['app'] = "http://localhost:5000/health/ready"
+        endpoints['nginx'] = self.config.get('public_health_url', "http://localhost/health")
+        return endpoints
+    
+    def health_check(self, max_retries: int = 30, endpoints: Optional[Dict[str, str]] = None) -> bool:
         """Perform health check on deployed application"""
         self.logger.info("Performing health check...")
         
-        import requests
-        health_url = f"http://localhost:5000/health"
+        # asyncio is only worth importing for actions that actually probe
+        from health_prober import HealthProber
         
-        for i in range(max_retries):
-            try:
-                response = requests.get(health_url, timeout=5)
-                if response.status_code == 200:
-                    self.logger.info("Health check passed")
-                    return True
-            except requests.RequestException:
-                pass
-            
-            self.logger.info(f"Health check attempt {i+1}/{max_retries} failed, retrying...")
-            time.sleep(10)
+        prober = HealthProber(
+            endpoints or self._health_endpoints(),
+            failure_threshold=max_retries,
+            logger=self.logger
+        )
+        healthy, results = prober.run()
+        
+        for result in results.values():
+            if result.healthy:
+                self.logger.info(f"{result.name}: healthy in {result.time_to_healthy:.2f}s")
+            else:
+                self.logger.warning(f"{result.name}: not healthy ({result.last_error})")
+        
+        if healthy:
+            self.logger.info("Health check passed")
+            return True
         
         self.logger.error("Health check failed")
         return False
@@ -159,86 +435,138 @@ class DeploymentPipeline:
         """Rollback to previous version"""
         self.logger.info("Initiating rollback...")
         
+        # The version being abandoned is the one this run tried to ship, or
+        # whatever is live right now for a manual rollback
+        failed_version = self.version
+        if self.last_run is None:
+            failed_version = self.history.current_version(self.environment) or self.version
+        
+        previous_version = self.history.rollback_target(self.environment, failed_version)
+        if previous_version is None:
+            self.logger.error("No previous version found for rollback")
+            return False
+        
+        self.logger.info(f"Rolling back to version: {previous_version}")
+        
         try:
-            # Get previous version from deployment history
-            result = subprocess.run([
-                'docker', 'images', '--format', 'table {{.Tag}}',
-                f"{self.config.get('docker_registry', 'local')}/{self.app_name}"
-            ], capture_output=True, text=True)
-            
-            versions = [line.strip() for line in result.stdout.split('\n')[1:] if line.strip()]
-            if len(versions) < 2:
-                self.logger.error("No previous version found for rollback")
-                return False
-            
-            previous_version = versions[1]  # Second most recent
-            self.logger.info(f"Rolling back to version: {previous_version}")
-            
             # Update environment variable and redeploy
-            env = os.environ.copy()
-            env.update({
-                'APP_VERSION': previous_version,
-                'FLASK_ENV': self.environment
-            })
-            
-            subprocess.run([
-                'docker-compose', '-f', 'deployment/docker-compose.yml',
-                'up', '-d'
-            ], cwd=self.project_root, env=env, check=True)
+            env = self._compose_env(previous_version)
+            self.runner.run(self._compose_command() + [
+                'up', '-d', '--scale', f"app={self.config.get('replicas', 1)}"
+            ], stage='rollback', cwd=self.project_root, env=env,
+                timeout=self._timeout('deploy'), check=True)
+            self._refresh_upstream(env)
             
+            self.history.record(previous_version, self.environment, 'rollback',
+                                deployed_by=self.deployed_by, rollback_version=failed_version)
             self.logger.info("Rollback completed successfully")
             return True
         except subprocess.CalledProcessError:
             self.logger.error("Rollback failed")
             return False
     
-    def cleanup_old_images(self, keep_count: int = 5) -> None:
-        """Clean up old Docker images"""
+    def cleanup_old_images(self, keep_count: Optional[int] = None) -> bool:
+        """Remove local images no environment can roll back to, in batched docker rmi calls"""
         self.logger.info("Cleaning up old Docker images...")
         
+        from image_gc import ImageGC
+        
+        gc = ImageGC(
+            self.runner, self.history,
+            repository=f"{self.config.get('docker_registry', 'local')}/{self.app_name}",
+            state_dir=self.state_dir,
+            keep_count=keep_count or self.config.get('image_gc_keep', 5),
+            batch_size=self.config.get('image_gc_batch_size', 20),
+            concurrency=self.config.get('image_gc_concurrency', 2),
+            # The version this run just shipped, even if the journal write raced
+            extra_keep=[self.version] if self.last_run is not None else [],
+            build_cache=self.build_cache,
+            prune_label=self.image_label,
+            logger=self.logger
+        )
         try:
-            # Remove unused images
-            subprocess.run(['docker', 'image', 'prune', '-f'], check=True)
-            
-            # Remove old versions (keep only specified count)
-            result = subprocess.run([
-                'docker', 'images', '--format', '{{.ID}} {{.Tag}}',
-                f"{self.config.get('docker_registry', 'local')}/{self.app_name}"
-            ], capture_output=True, text=True)
-            
-            lines = result.stdout.strip().split('\n')
-            if len(lines) > keep_count:
-                old_images = lines[keep_count:]
-                for line in old_images:
-                    image_id = line.split()[0]
-                    subprocess.run(['docker', 'rmi', image_id], check=True)
-            
-            self.logger.info("Cleanup completed")
-        except subprocess.CalledProcessError:
-            self.logger.warning("Cleanup encountered some issues")
+            report = gc.run()
+        except subprocess.CalledProcessError as e:
+            self.logger.warning(f"Image cleanup failed: {e}")
+            return False
+        if report is not None:
+            for line in report.lines():
+                self.logger.info(line)
+        return True
+    
+    def _start_background_cleanup(self) -> None:
+        """Run image GC in a detached process so it never delays the deploy"""
+        log_path = self.state_dir / 'image-gc.log'
+        with open(log_path, 'a') as log:
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '-e', self.environment, '-a', 'cleanup'],
+                cwd=self.project_root, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+        self.logger.info(f"Image cleanup continues in the background, see {log_path}")
+    
+    def _build_stage_graph(self) -> 'StageGraph':
+        """Declare pipeline stages and the dependencies between them"""
+        from stage_graph import StageGraph
+        graph = StageGraph(max_workers=self.config.get('max_parallel_stages'),
+                           cancel_event=self.cancel_event, logger=self.logger)
+        graph.add('tests', self.run_tests, description="Running tests")
+        graph.add('build', self.build_docker_image, description="Building Docker image")
+        graph.add('push', self.push_docker_image, depends_on=['build'],
+                  description="Pushing Docker image")
+        deploy_after = ['tests', 'push']
+        if self.config.get('canary_enabled'):
+            graph.add('canary', self.run_canary, depends_on=deploy_after,
+                      description="Canary analysis")
+            deploy_after = ['canary']
+        graph.add('deploy', self.deploy_with_docker_compose, depends_on=deploy_after,
+                  description="Deploying application")
+        graph.add('health', self.health_check, depends_on=['deploy'], description="Health check")
+        return graph
+    
+    def _log_stage_timings(self, run: 'GraphRun') -> None:
+        """Log per-stage wall time and the critical path of a pipeline run"""
+        for name, result in run.results.items():
+            self.logger.info(f"Stage {name}: {result.status} in {result.duration:.1f}s")
+        for command in self.runner.results:
+            summary = command.summary()
+            self.logger.info(
+                f"[{summary['stage']}] {summary['command']}: exit {summary['returncode']} "
+                f"in {summary['duration']:.1f}s, {summary['output_bytes']} bytes output "
+                f"(peak {summary['peak_bytes_per_second']} B/s)"
+            )
+        self.logger.info(
+            f"Critical path: {' -> '.join(run.critical_path) or 'n/a'} "
+            f"({run.critical_path_length:.1f}s of {run.wall_time:.1f}s wall time)"
+        )
     
     def deploy(self) -> bool:
         """Execute full deployment pipeline"""
         self.logger.info(f"Starting deployment pipeline for {self.environment} environment")
         
-        steps = [
-            ("Running tests", self.run_tests),
-            ("Building Docker image", self.build_docker_image),
-            ("Pushing Docker image", self.push_docker_image),
-            ("Deploying application", self.deploy_with_docker_compose),
-            ("Health check", self.health_check)
-        ]
+        graph = self._build_stage_graph()
+        run = graph.run()
+        self.last_run = run
+        # Cancellation only applies to the stages themselves, not to rollback
+        self.cancel_event.clear()
+        self._log_stage_timings(run)
+        self.history.record(
+            self.version, self.environment, 'success' if run.succeeded else 'failed',
+            deployed_by=self.deployed_by, notes=json.dumps(run.summary())
+        )
         
-        for step_name, step_func in steps:
-            self.logger.info(f"Step: {step_name}")
-            if not step_func():
-                self.logger.error(f"Pipeline failed at step: {step_name}")
-                self.logger.info("Initiating rollback...")
-                self.rollback()
-                return False
+        if not run.succeeded:
+            self.logger.error(f"Pipeline failed at step: {run.failed_stage}")
+            self.logger.info("Initiating rollback...")
+            self.rollback()
+            return False
         
         # Cleanup old images after successful deployment
-        self.cleanup_old_images()
+        cleanup = self.config.get('image_gc_mode', 'background')
+        if cleanup == 'background':
+            self._start_background_cleanup()
+        elif cleanup == 'inline':
+            self.cleanup_old_images()
         
         self.logger.info("Deployment pipeline completed successfully!")
         return True
@@ -248,15 +576,24 @@ def main():
     
     parser = argparse.ArgumentParser(description='Flask Application Deployment Pipeline')
     parser.add_argument('--environment', '-e', default='production',
-                       choices=['development', 'staging', 'production'],
+                       choices=list(ENVIRONMENTS),
                        help='Deployment environment')
     parser.add_argument('--action', '-a', default='deploy',
-                       choices=['deploy', 'rollback', 'health-check'],
+                       choices=['deploy', 'rollback', 'health-check', 'canary', 'cleanup', 'config',
+                                'nginx-config'],
                        help='Action to perform')
+    parser.add_argument('--full-tests', action='store_true',
+                       help='Run the whole test suite even if impact selection is configured')
+    parser.add_argument('--profile-startup', action='store_true',
+                       help='Print an import and initialization time breakdown')
     
     args = parser.parse_args()
+    if startup_profiler:
+        startup_profiler.mark('imports')
     
-    pipeline = DeploymentPipeline(args.environment)
+    pipeline = DeploymentPipeline(args.environment, full_tests=args.full_tests)
+    if startup_profiler:
+        startup_profiler.mark('pipeline init')
     
     if args.action == 'deploy':
         success = pipeline.deploy()
@@ -264,7 +601,22 @@ def main():
         success = pipeline.rollback()
     elif args.action == 'health-check':
         success = pipeline.health_check()
+    elif args.action == 'canary':
+        success = pipeline.run_canary()
+    elif args.action == 'cleanup':
+        success = pipeline.cleanup_old_images()
+    elif args.action == 'config':
+        print(json.dumps(pipeline.config, indent=2))
+        success = True
+    elif args.action == 'nginx-config':
+        print(pipeline.nginx.render(), end='')
+        success = True
     
+    if startup_profiler:
+        startup_profiler.mark(f'action {args.action}')
+        if pipeline.log_queue:
+            pipeline.log_queue.stop()
+        startup_profiler.report()
     sys.exit(0 if success else 1)
 
 if __name__ == '__main__':
@@ -0,0 +1,196 @@
+import asyncio
+import random
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class ProbeError(Exception):
+    """Raised when a single probe cannot get an HTTP response"""
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections shared by all probes, keyed by (host, port)"""
+
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout
+        self._idle: Dict[Tuple[str, int], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        self.connections_opened = 0
+
+    async def _acquire(self, host: str, port: int):
+        idle = self._idle.get((host, port))
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        self.connections_opened += 1
+        return await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+
+    def _release(self, host: str, port: int, reader, writer, reusable: bool) -> None:
+        if reusable:
+            self._idle.setdefault((host, port), []).append((reader, writer))
+        else:
+            writer.close()
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        """Issue a GET and return (status, body), reusing an idle connection when possible"""
+        parts = urlsplit(url)
+        if parts.scheme != 'http':
+            raise ProbeError(f"Unsupported scheme for health probe: {url}")
+        host, port = parts.hostname, parts.port or 80
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        try:
+            reader, writer = await self._acquire(host, port)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ProbeError(f"connect failed: {e!r}")
+
+        extra = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        try:
+            writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                f"Connection: keep-alive\r\nAccept: application/json\r\n{extra}\r\n".encode('latin-1')
+            )
+            await writer.drain()
+            status, body, reusable = await asyncio.wait_for(self._read_response(reader), self.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            writer.close()
+            raise ProbeError(f"request failed: {e!r}")
+
+        self._release(host, port, reader, writer, reusable)
+        return status, body
+
+    async def _read_response(self, reader: asyncio.StreamReader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ValueError("connection closed before response")
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            return int(status), await reader.read(), False
+
+        reusable = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+        return int(status), body, reusable
+
+    def close(self) -> None:
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+class ProbeResult:
+    """Outcome of probing one endpoint until healthy or given up"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.healthy = False
+        self.attempts = 0
+        self.consecutive_failures = 0
+        self.time_to_healthy: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+
+class HealthProber:
+    """Probe several endpoints concurrently until all are healthy.
+
+    Each endpoint is retried with exponential backoff and full jitter,
+    starting at ``initial_delay``. A probe gives up after
+    ``failure_threshold`` consecutive failures or once ``deadline`` seconds
+    have passed, and the first endpoint to give up fails the whole check.
+    """
+
+    def __init__(self, endpoints: Dict[str, str], timeout: float = 5.0,
+                 initial_delay: float = 0.25, max_delay: float = 5.0,
+                 failure_threshold: int = 30, deadline: float = 300.0,
+                 logger: Optional[logging.Logger] = None):
+        self.endpoints = endpoints
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.deadline = deadline
+        self.logger = logger or logging.getLogger(__name__)
+
+    def _backoff(self, failures: int) -> float:
+        ceiling = min(self.max_delay, self.initial_delay * (2 ** (failures - 1)))
+        return random.uniform(self.initial_delay / 2, max(ceiling, self.initial_delay / 2))
+
+    async def _probe(self, pool: ConnectionPool, result: ProbeResult, started: float) -> ProbeResult:
+        while True:
+            result.attempts += 1
+            try:
+                status, _ = await pool.get(result.url)
+                if 200 <= status < 300:
+                    result.healthy = True
+                    result.time_to_healthy = time.monotonic() - started
+                    self.logger.info(
+                        f"{result.name} healthy after {result.time_to_healthy:.2f}s "
+                        f"({result.attempts} attempts)"
+                    )
+                    return result
+                result.last_error = f"HTTP {status}"
+            except ProbeError as e:
+                result.last_error = str(e)
+
+            result.consecutive_failures += 1
+            if result.consecutive_failures >= self.failure_threshold:
+                raise ProbeError(f"{result.name}: {result.consecutive_failures} consecutive failures, "
+                                 f"last error: {result.last_error}")
+            delay = self._backoff(result.consecutive_failures)
+            if time.monotonic() + delay - started > self.deadline:
+                raise ProbeError(f"{result.name}: not healthy within {self.deadline:.0f}s, "
+                                 f"last error: {result.last_error}")
+            await asyncio.sleep(delay)
+
+    async def probe_all(self) -> Tuple[bool, Dict[str, ProbeResult]]:
+        """Probe every endpoint at once; cancel the rest as soon as one gives up"""
+        pool = ConnectionPool(timeout=self.timeout)
+        started = time.monotonic()
+        results = {name: ProbeResult(name, url) for name, url in self.endpoints.items()}
+        tasks = [asyncio.ensure_future(self._probe(pool, r, started)) for r in results.values()]
+        healthy = True
+        try:
+            for task in asyncio.as_completed(tasks):
+                try:
+                    await task
+                except ProbeError as e:
+                    self.logger.error(f"Health probe failed: {e}")
+                    healthy = False
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            pool.close()
+        return healthy and all(r.healthy for r in results.values()), results
+
+    def run(self) -> Tuple[bool, Dict[str, ProbeResult]]:
+        """Blocking entry point for synchronous callers"""
+        return asyncio.run(self.probe_all())
+
@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Statuses that mean a version actually went live in an environment
+LIVE_STATUSES = ('success', 'rollback')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployment_logs (
+    id TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    status TEXT NOT NULL,
+    deployed_by TEXT,
+    deployment_time TEXT NOT NULL,
+    rollback_version TEXT,
+    notes TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_deployment_logs_env_time
+    ON deployment_logs (environment, deployment_time);
+CREATE INDEX IF NOT EXISTS ix_deployment_logs_env_rollback
+    ON deployment_logs (environment, status, rollback_version);
+CREATE INDEX IF NOT EXISTS ix_deployment_logs_version_time
+    ON deployment_logs (version, deployment_time);
+"""
+
+
+class DeploymentHistory:
+    """Append-only deployment journal stored in SQLite.
+
+    Rows mirror the ``DeploymentLog`` model in ``app/models.py`` so the
+    journal can be loaded into the application database later. Per-environment
+    lookups walk the (environment, deployment_time) index newest first; the
+    "was this version rolled back from" probe is a seek on (environment,
+    status, rollback_version). versions() reads every version once from the
+    covering (version, deployment_time) index. Nothing needs the Docker daemon.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+
+    def record(self, version: str, environment: str, status: str,
+               deployed_by: Optional[str] = None, rollback_version: Optional[str] = None,
+               notes: Optional[str] = None) -> str:
+        """Append one deployment event and return its id"""
+        now = datetime.utcnow().isoformat()
+        entry_id = str(uuid.uuid4())
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO deployment_logs (id, version, environment, status, deployed_by, '
+                'deployment_time, rollback_version, notes, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (entry_id, version, environment, status, deployed_by, now,
+                 rollback_version, notes, now, now)
+            )
+        return entry_id
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def current_version(self, environment: str) -> Optional[str]:
+        """Version most recently made live in an environment"""
+        rows = self._query(
+            'SELECT version FROM deployment_logs '
+            'WHERE environment = ? AND status IN (?, ?) '
+            'ORDER BY deployment_time DESC, rowid DESC LIMIT 1',
+            (environment,) + LIVE_STATUSES
+        )
+        return rows[0]['version'] if rows else None
+
+    def rollback_target(self, environment: str, exclude_version: str) -> Optional[str]:
+        """Most recent live version other than ``exclude_version``.
+
+        A version that was rolled back from after it went live is skipped, so
+        repeated rollbacks keep walking back instead of returning to the
+        release that was just abandoned.
+        """
+        rows = self._query(
+            'SELECT d.version FROM deployment_logs d '
+            'WHERE d.environment = ? AND d.status IN (?, ?) AND d.version != ? '
+            'AND NOT EXISTS (SELECT 1 FROM deployment_logs r '
+            "WHERE r.environment = d.environment AND r.status = 'rollback' "
+            'AND r.rollback_version = d.version AND r.rowid > d.rowid) '
+            'ORDER BY d.deployment_time DESC, d.rowid DESC LIMIT 1',
+            (environment,) + LIVE_STATUSES + (exclude_version,)
+        )
+        return rows[0]['version'] if rows else None
+
+    def recent_versions(self, environment: str, limit: int) -> List[str]:
+        """Distinct live versions, newest first"""
+        rows = self._query(
+            'SELECT version, MAX(deployment_time) AS last_live FROM deployment_logs '
+            'WHERE environment = ? AND status IN (?, ?) '
+            'GROUP BY version ORDER BY last_live DESC LIMIT ?',
+            (environment,) + LIVE_STATUSES + (limit,)
+        )
+        return [row['version'] for row in rows]
+
+    def versions(self) -> List[str]:
+        """Every version in the journal, any status or environment, least recently deployed first"""
+        rows = self._query(
+            'SELECT version, MAX(deployment_time) AS last_seen FROM deployment_logs '
+            'GROUP BY version ORDER BY last_seen',
+            ()
+        )
+        return [row['version'] for row in rows]
+
+    def environments(self) -> List[str]:
+        rows = self._query('SELECT DISTINCT environment FROM deployment_logs', ())
+        return [row['environment'] for row in rows]
+
+    def entries(self, environment: str, limit: int = 20) -> List[Dict]:
+        """Most recent journal entries for an environment"""
+        rows = self._query(
+            'SELECT * FROM deployment_logs WHERE environment = ? '
+            'ORDER BY deployment_time DESC, rowid DESC LIMIT ?',
+            (environment, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,243 @@
+import re
+import time
+import fcntl
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from build_cache import BuildCache, save_json
+from history import DeploymentHistory
+from process_runner import ProcessRunner
+
+# Sizes as the docker CLI prints them: decimal units, "0B", "1.5kB", "1.21GB"
+SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kKMGT]?B)\s*$')
+SIZE_UNITS = {'B': 1, 'kB': 10 ** 3, 'KB': 10 ** 3, 'MB': 10 ** 6, 'GB': 10 ** 9, 'TB': 10 ** 12}
+
+# docker rmi reports each tag it removed on stdout and each failure on stderr
+UNTAGGED = re.compile(r'^Untagged: (\S+)$')
+IN_USE = re.compile(r'must force|is being used|conflict')
+MISSING = re.compile(r'No such image: (\S+)')
+
+
+def parse_size(text: str) -> Optional[int]:
+    match = SIZE.match(text or '')
+    if not match:
+        return None
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if abs(size) < 1000 or unit == 'GB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1000
+
+
+def keep_versions(history: DeploymentHistory, keep_count: int, extra: Iterable[str] = ()) -> Set[str]:
+    """Versions whose images must survive: per environment, the ``keep_count``
+    most recent live versions, the live one and the version rollback would pick"""
+    keep = {version for version in extra if version}
+    for environment in history.environments():
+        keep.update(history.recent_versions(environment, keep_count))
+        current = history.current_version(environment)
+        if current:
+            keep.add(current)
+            target = history.rollback_target(environment, current)
+            if target:
+                keep.add(target)
+    return keep
+
+
+class GCReport:
+    """What one collection run found, removed and freed"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.seconds = 0.0
+        self.kept: List[str] = []
+        self.in_use: List[str] = []
+        self.removed: List[str] = []
+        self.missing: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.batches = 0
+        self.reclaimed_bytes: Optional[int] = None
+
+    def lines(self) -> List[str]:
+        reclaimed = 'unknown' if self.reclaimed_bytes is None else _format_bytes(self.reclaimed_bytes)
+        lines = [
+            f"Image GC: removed {len(self.removed)} tags in {self.batches} batches, "
+            f"kept {len(self.kept)}, skipped {len(self.in_use)} in use, "
+            f"reclaimed {reclaimed} in {self.seconds:.1f}s"
+        ]
+        lines += [f"Could not remove {tag}: {error}" for tag, error in sorted(self.failed.items())]
+        return lines
+
+    def to_dict(self) -> Dict:
+        return {
+            'started_at': self.started_at,
+            'seconds': round(self.seconds, 3),
+            'kept': sorted(self.kept),
+            'in_use': sorted(self.in_use),
+            'removed': sorted(self.removed),
+            'missing': sorted(self.missing),
+            'failed': self.failed,
+            'batches': self.batches,
+            'reclaimed_bytes': self.reclaimed_bytes
+        }
+
+
+class ImageGC:
+    """Remove this app's local images that no environment can still roll back to.
+
+    Only tags of ``repository`` whose version appears in the deployment
+    history are candidates, so images of a build in progress are never
+    touched. Tags still held by a container (running or stopped) are
+    skipped. The rest go to ``docker rmi`` ``batch_size`` tags per call,
+    with at most ``concurrency`` calls in flight; a tag that fails is
+    reported and the others still go. Reclaimed space is the drop in
+    ``docker system df`` image usage, which accounts for shared layers.
+    """
+
+    def __init__(self, runner: ProcessRunner, history: DeploymentHistory, repository: str,
+                 state_dir: Path, keep_count: int = 5, batch_size: int = 20, concurrency: int = 2,
+                 extra_keep: Iterable[str] = (), build_cache: Optional[BuildCache] = None,
+                 prune_label: Optional[str] = None, logger: Optional[logging.Logger] = None):
+        self.runner = runner
+        self.history = history
+        self.repository = repository
+        self.state_dir = Path(state_dir)
+        self.keep_count = keep_count
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.extra_keep = list(extra_keep)
+        self.build_cache = build_cache
+        self.prune_label = prune_label
+        self.logger = logger or logging.getLogger(__name__)
+
+    def local_tags(self) -> Dict[str, str]:
+        """Local tags of the repository mapped to their image IDs"""
+        result = self.runner.run([
+            'docker', 'image', 'ls', '--no-trunc', '--format', '{{.Tag}}\t{{.ID}}', self.repository
+        ], stage='cleanup', timeout=120, capture=True, check=True)
+        tags = {}
+        for line in result.lines:
+            tag, _, image_id = line.partition('\t')
+            if tag and tag != '<none>':
+                tags[f"{self.repository}:{tag}"] = image_id
+        return tags
+
+    def images_in_use(self) -> Set[str]:
+        """IDs of images that any container, running or stopped, was created from"""
+        containers = self.runner.run(['docker', 'ps', '-aq', '--no-trunc'], stage='cleanup',
+                                     timeout=120, capture=True, check=True)
+        if not containers.lines:
+            return set()
+        result = self.runner.run(['docker', 'inspect', '--format', '{{.Image}}'] + containers.lines,
+                                 stage='cleanup', timeout=120, capture=True)
+        # A container removed between the two calls makes inspect exit 1 but
+        # still prints the others
+        return {line.strip() for line in result.lines if line.strip()}
+
+    def disk_usage(self) -> Optional[int]:
+        """Bytes used by images according to ``docker system df``"""
+        result = self.runner.run(['docker', 'system', 'df', '--format', '{{.Type}}\t{{.Size}}'],
+                                 stage='cleanup', timeout=300, capture=True)
+        for line in result.lines if result.ok else []:
+            kind, _, size = line.partition('\t')
+            if kind == 'Images':
+                return parse_size(size)
+        return None
+
+    def plan(self, tags: Dict[str, str], in_use: Set[str], report: GCReport) -> List[str]:
+        """Tags to remove, oldest deployment first"""
+        keep = keep_versions(self.history, self.keep_count, self.extra_keep)
+        # Position in the history, oldest last deployment first
+        known = {version: i for i, version in enumerate(self.history.versions())}
+        candidates = []
+        for tag, image_id in tags.items():
+            version = tag.rsplit(':', 1)[1]
+            if version in keep or version not in known:
+                report.kept.append(tag)
+            elif image_id in in_use:
+                report.in_use.append(tag)
+            else:
+                candidates.append(tag)
+        return sorted(candidates, key=lambda tag: known[tag.rsplit(':', 1)[1]])
+
+    async def _remove_batches(self, batches: List[List[str]]):
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def remove(batch: List[str]):
+            async with slots:
+                return batch, await self.runner.run_async(['docker', 'rmi'] + batch, stage='cleanup',
+                                                          timeout=300, capture=True)
+
+        return await asyncio.gather(*(remove(batch) for batch in batches))
+
+    def _record_removals(self, batch: List[str], result, report: GCReport) -> None:
+        removed = {match.group(1) for match in map(UNTAGGED.match, result.lines) if match}
+        for tag in batch:
+            if tag in removed:
+                report.removed.append(tag)
+                continue
+            error = next((line for line in result.error_lines if tag in line), None)
+            if error is None and result.ok:
+                report.removed.append(tag)
+            elif error is not None and MISSING.search(error):
+                report.missing.append(tag)
+            elif error is not None and IN_USE.search(error):
+                # Started using it after we looked; leave it for next time
+                report.in_use.append(tag)
+            else:
+                report.failed[tag] = error or (result.stderr.strip() or f"exit {result.returncode}")
+
+    def _update_build_cache(self, tags: Dict[str, str], report: GCReport) -> None:
+        """Point cache entries at a surviving tag of the same image, or drop them"""
+        if self.build_cache is None:
+            return
+        gone = set(report.removed) | set(report.missing)
+        for tag in gone:
+            survivors = sorted(other for other, image_id in tags.items()
+                               if image_id == tags.get(tag) and other not in gone)
+            self.build_cache.retarget(tag, survivors[0] if survivors else None)
+
+    def _prune_dangling(self) -> None:
+        # Untagged leftovers of earlier builds of this app only, not the whole host
+        if not self.prune_label:
+            return
+        self.runner.run(['docker', 'image', 'prune', '-f', '--filter', f"label={self.prune_label}"],
+                        stage='cleanup', timeout=300, capture=True)
+
+    def run(self) -> Optional[GCReport]:
+        """Collect once; returns None if another collection holds the lock"""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.state_dir / 'image-gc.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.logger.info("Image GC already running, skipping")
+                return None
+            return self._collect()
+
+    def _collect(self) -> GCReport:
+        report = GCReport()
+        started = time.monotonic()
+        before = self.disk_usage()
+
+        tags = self.local_tags()
+        candidates = self.plan(tags, self.images_in_use(), report)
+        batches = [candidates[i:i + self.batch_size] for i in range(0, len(candidates), self.batch_size)]
+        report.batches = len(batches)
+        if batches:
+            for batch, result in asyncio.run(self._remove_batches(batches)):
+                self._record_removals(batch, result, report)
+            self._update_build_cache(tags, report)
+        self._prune_dangling()
+
+        after = self.disk_usage()
+        if before is not None and after is not None:
+            report.reclaimed_bytes = max(before - after, 0)
+        report.seconds = time.monotonic() - started
+        save_json(self.state_dir / 'image-gc.json', report.to_dict())
+        return report
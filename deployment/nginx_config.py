@@ -0,0 +1,259 @@
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# What the app serves, and what is worth compressing: JSON and NDJSON from
+# the API, plus text assets from the static folder
+COMPRESSED_TYPES = ('application/json', 'application/x-ndjson', 'application/problem+json',
+                    'text/plain', 'text/css', 'application/javascript', 'image/svg+xml')
+
+NGINX_TEMPLATE = """# Generated by deployment/deploy.py for {environment} - do not edit
+{load_modules}{user}worker_processes {worker_processes};
+worker_rlimit_nofile {rlimit_nofile};
+error_log {log_dir}/error.log warn;
+pid {pid};
+
+events {{
+    worker_connections {worker_connections};
+    multi_accept on;
+}}
+
+http {{
+    include {mime_types};
+    default_type application/octet-stream;
+    server_tokens off;
+
+    log_format main '$remote_addr - $remote_user [$time_local] "$request" '
+                    '$status $body_bytes_sent "$http_referer" "$http_user_agent" '
+                    'rt=$request_time urt=$upstream_response_time cache=$upstream_cache_status';
+    access_log {log_dir}/access.log main buffer=64k flush=1s;
+
+    sendfile on;
+    tcp_nopush on;
+    tcp_nodelay on;
+    keepalive_timeout 65;
+    keepalive_requests 1000;
+    client_max_body_size {client_max_body_size};
+
+{compression}
+    # Responses are buffered so a slow client never holds a gunicorn worker
+    proxy_buffering on;
+    proxy_buffer_size 16k;
+    proxy_buffers 32 16k;
+    proxy_busy_buffers_size 32k;
+
+{microcache_zone}    # Upstream block with the live replicas, rewritten on every replica change
+    include {upstream_dir}/*.conf;
+
+    server {{
+        listen {listen} reuseport;
+        server_name {server_name};
+{static_location}
+        location / {{
+            proxy_pass http://{upstream};
+            # HTTP/1.1 without "Connection: close" lets nginx reuse upstream connections
+            proxy_http_version 1.1;
+            proxy_set_header Connection "";
+            proxy_set_header Host $host;
+            proxy_set_header X-Real-IP $remote_addr;
+            proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+            proxy_set_header X-Forwarded-Proto $scheme;
+            # nginx compresses for the client; the app only sends identity
+            proxy_set_header Accept-Encoding "";
+
+            proxy_connect_timeout 5s;
+            proxy_send_timeout {proxy_timeout}s;
+            proxy_read_timeout {proxy_timeout}s;
+            proxy_next_upstream error timeout http_502 http_503;
+            proxy_next_upstream_tries 2;
+{microcache}        }}
+    }}
+}}
+"""
+
+COMPRESSION_TEMPLATE = """    # JSON shrinks 5-10x at low levels; higher levels mostly cost CPU
+    gzip on;
+    gzip_comp_level {level};
+    gzip_min_length 1024;
+    gzip_proxied any;
+    gzip_vary on;
+    gzip_types {types};
+"""
+
+BROTLI_TEMPLATE = """    brotli on;
+    brotli_comp_level {level};
+    brotli_min_length 1024;
+    brotli_types {types};
+"""
+
+MICROCACHE_ZONE_TEMPLATE = """    proxy_cache_path {cache_dir} levels=1:2 keys_zone=microcache:10m
+                     max_size={max_size} inactive=1m use_temp_path=off;
+
+    # Only responses the app marks public (views behind ResponseCache) are stored
+    map $upstream_http_cache_control $microcache_skip {{
+        ~*public 0;
+        default 1;
+    }}
+
+"""
+
+MICROCACHE_TEMPLATE = """
+            # Micro-cache: identical GETs within {seconds}s share one upstream request
+            proxy_cache microcache;
+            proxy_cache_methods GET HEAD;
+            proxy_cache_key "$scheme$request_method$host$request_uri$http_accept";
+            proxy_ignore_headers Cache-Control Expires;
+            proxy_cache_valid 200 {seconds}s;
+            # The canary's load generator (X-Canary-Load) must reach the replicas it compares
+            proxy_cache_bypass $cookie_{session_cookie} $http_authorization $http_x_canary_load;
+            proxy_no_cache $microcache_skip $cookie_{session_cookie} $http_authorization $http_x_canary_load;
+            proxy_cache_lock on;
+            proxy_cache_lock_timeout 2s;
+            proxy_cache_use_stale updating error timeout http_502 http_503;
+            proxy_cache_background_update on;
+            add_header X-Cache-Status $upstream_cache_status always;
+"""
+
+STATIC_TEMPLATE = """
+        location /static/ {{
+            alias {static_folder}/;
+            expires {max_age}s;
+            access_log off;
+            # Keep descriptors and stat() results of hot files between requests
+            open_file_cache max=10000 inactive=5m;
+            open_file_cache_valid 1m;
+            open_file_cache_min_uses 2;
+            open_file_cache_errors on;
+        }}
+"""
+
+
+class NginxSettings:
+    """nginx.conf for one environment, derived from the deploy settings.
+
+    Container paths are the defaults; the load-test benchmark overrides them
+    to run nginx unprivileged from a temporary directory.
+    """
+
+    def __init__(self, deploy: Dict, environment: str = 'production', listen: int = 80,
+                 user: Optional[str] = 'nginx', upstream_dir: str = '/etc/nginx/upstreams',
+                 cache_dir: str = '/var/cache/nginx/microcache', log_dir: str = '/var/log/nginx',
+                 pid: str = '/var/run/nginx.pid', mime_types: str = '/etc/nginx/mime.types',
+                 upstream: str = 'flask_app'):
+        self.deploy = deploy
+        self.environment = environment
+        self.listen = listen
+        self.user = user
+        self.upstream_dir = upstream_dir
+        self.cache_dir = cache_dir
+        self.log_dir = log_dir
+        self.pid = pid
+        self.mime_types = mime_types
+        self.upstream = upstream
+
+    @property
+    def worker_class(self) -> str:
+        return self.deploy.get('gunicorn_worker_class') or 'gthread'
+
+    @property
+    def upstream_concurrency(self) -> int:
+        """Requests all replicas together can serve at once"""
+        workers = self.deploy.get('gunicorn_workers') or self.deploy.get('gunicorn_max_workers') or 1
+        if self.worker_class == 'gthread':
+            per_worker = self.deploy.get('gunicorn_threads') or 1
+        elif self.worker_class == 'gevent':
+            per_worker = self.deploy.get('gunicorn_worker_connections') or 1000
+        else:
+            per_worker = 1
+        return max(self.deploy.get('replicas') or 1, 1) * workers * per_worker
+
+    @property
+    def upstream_keepalive(self) -> int:
+        """Idle upstream connections each nginx worker keeps open"""
+        # Sync workers close the connection after every response, so a pool
+        # would only hold dead sockets
+        if self.worker_class == 'sync':
+            return 0
+        # Enough for every gunicorn thread to be busy, capped for gevent
+        return min(self.upstream_concurrency, 512)
+
+    @property
+    def upstream_keepalive_timeout(self) -> int:
+        # Drop idle connections before gunicorn does, or nginx may send a
+        # request down a socket the worker is closing and answer 502
+        return max(1, (self.deploy.get('gunicorn_keepalive') or 5) - 1)
+
+    def upstream_options(self) -> List[str]:
+        """Extra lines for the upstream block written by rollout.write_upstream"""
+        keepalive = self.upstream_keepalive
+        if not keepalive:
+            return []
+        return [
+            f"keepalive {keepalive};",
+            f"keepalive_timeout {self.upstream_keepalive_timeout}s;",
+        ]
+
+    def _compression(self) -> str:
+        level = self.deploy.get('nginx_gzip_level', 4)
+        if not level:
+            return "    gzip off;\n"
+        types = ' '.join(COMPRESSED_TYPES)
+        text = COMPRESSION_TEMPLATE.format(level=level, types=types)
+        if self.deploy.get('nginx_brotli'):
+            text += BROTLI_TEMPLATE.format(level=level, types=types)
+        return text
+
+    def render(self) -> str:
+        worker_connections = self.deploy.get('nginx_worker_connections', 4096)
+        microcache_seconds = self.deploy.get('nginx_microcache_seconds', 0)
+        static_folder = self.deploy.get('static_folder')
+        load_modules = ''
+        if self.deploy.get('nginx_brotli') and self.deploy.get('nginx_gzip_level', 4):
+            load_modules = 'load_module modules/ngx_http_brotli_filter_module.so;\n'
+
+        return NGINX_TEMPLATE.format(
+            environment=self.environment,
+            load_modules=load_modules,
+            user=f"user {self.user};\n" if self.user else '',
+            worker_processes=self.deploy.get('nginx_worker_processes', 'auto'),
+            # A proxied request holds a client and an upstream connection
+            rlimit_nofile=worker_connections * 2,
+            worker_connections=worker_connections,
+            log_dir=self.log_dir,
+            pid=self.pid,
+            mime_types=self.mime_types,
+            client_max_body_size=self.deploy.get('max_content_length') or '1m',
+            compression=self._compression(),
+            microcache_zone=MICROCACHE_ZONE_TEMPLATE.format(
+                cache_dir=self.cache_dir,
+                max_size=self.deploy.get('nginx_microcache_size', '100m')
+            ) if microcache_seconds else '',
+            upstream_dir=self.upstream_dir,
+            listen=self.listen,
+            server_name=self.deploy.get('domain') or 'localhost',
+            static_location=STATIC_TEMPLATE.format(
+                static_folder=static_folder.rstrip('/'),
+                max_age=self.deploy.get('static_max_age', 0)
+            ) if static_folder else '',
+            upstream=self.upstream,
+            proxy_timeout=(self.deploy.get('gunicorn_timeout') or 30) + 5,
+            microcache=MICROCACHE_TEMPLATE.format(
+                seconds=microcache_seconds,
+                session_cookie=self.deploy.get('session_cookie', 'session')
+            ) if microcache_seconds else '',
+        )
+
+
+def write_nginx_config(path: Path, text: str) -> bool:
+    """Write the config if it changed; returns whether it did"""
+    path = Path(path)
+    if path.exists() and path.read_text() == text:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Rewritten in place rather than renamed over: compose bind-mounts this
+    # single file, and the container would keep seeing the old inode
+    with open(path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
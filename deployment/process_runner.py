@@ -0,0 +1,193 @@
+import os
+import signal
+import asyncio
+import logging
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class CommandTimeout(subprocess.CalledProcessError):
+    """Raised by ``check=True`` runs that hit their deadline or were cancelled.
+
+    Subclasses CalledProcessError so existing failure handling still applies.
+    """
+
+    def __str__(self):
+        return f"Command '{self.cmd}' was killed after exceeding its deadline or being cancelled"
+
+
+class ProcessResult:
+    """Exit status and output statistics for one command"""
+
+    def __init__(self, args: List[str], stage: str):
+        self.args = args
+        self.stage = stage
+        self.returncode: Optional[int] = None
+        self.duration = 0.0
+        self.output_bytes = 0
+        self.output_lines = 0
+        self.peak_bytes_per_second = 0
+        self.timed_out = False
+        self.cancelled = False
+        self.lines: List[str] = []
+        self.error_lines: List[str] = []
+
+    @property
+    def stdout(self) -> str:
+        return ''.join(line + '\n' for line in self.lines)
+
+    @property
+    def stderr(self) -> str:
+        return ''.join(line + '\n' for line in self.error_lines)
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not (self.timed_out or self.cancelled)
+
+    def summary(self) -> Dict:
+        return {
+            'stage': self.stage,
+            'command': ' '.join(self.args[:3]),
+            'returncode': self.returncode,
+            'duration': round(self.duration, 3),
+            'output_bytes': self.output_bytes,
+            'peak_bytes_per_second': self.peak_bytes_per_second,
+            'timed_out': self.timed_out,
+            'cancelled': self.cancelled
+        }
+
+
+class ProcessRunner:
+    """Run commands on asyncio, streaming their output into per-stage logs.
+
+    stdout and stderr are read line by line into a bounded queue and logged
+    with a ``[stage]`` prefix, so concurrently running stages stay readable.
+    A command that outlives its deadline, or whose pipeline is cancelled,
+    gets SIGTERM and then SIGKILL after ``kill_grace`` seconds. The run()
+    wrapper is safe to call from several threads at once.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None,
+                 cancel_event: Optional[threading.Event] = None,
+                 kill_grace: float = 10.0, buffer_lines: int = 1000):
+        self.logger = logger or logging.getLogger(__name__)
+        self.cancel_event = cancel_event or threading.Event()
+        self.kill_grace = kill_grace
+        self.buffer_lines = buffer_lines
+        self.results: List[ProcessResult] = []
+        self._lock = threading.Lock()
+
+    async def _pump(self, stream: asyncio.StreamReader, queue: asyncio.Queue, label: str) -> None:
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            await queue.put((label, line))
+
+    async def _consume(self, queue: asyncio.Queue, result: ProcessResult, capture: bool,
+                       echo: bool) -> None:
+        window_start, window_bytes = time.monotonic(), 0
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            label, raw = item
+            text = raw.decode(errors='replace').rstrip('\r\n')
+            result.output_bytes += len(raw)
+            result.output_lines += 1
+
+            now = time.monotonic()
+            if now - window_start >= 1.0:
+                window_start, window_bytes = now, 0
+            window_bytes += len(raw)
+            result.peak_bytes_per_second = max(result.peak_bytes_per_second, window_bytes)
+
+            if capture:
+                (result.lines if label == 'stdout' else result.error_lines).append(text)
+            if capture and not echo:
+                self.logger.debug(f"[{result.stage}] {text}")
+            else:
+                self.logger.info(f"[{result.stage}] {text}")
+
+    async def _terminate(self, process: asyncio.subprocess.Process) -> None:
+        """SIGTERM the process group, escalating to SIGKILL after the grace period"""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(process.wait(), self.kill_grace)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    async def _watch(self, process: asyncio.subprocess.Process, result: ProcessResult,
+                     timeout: Optional[float]) -> None:
+        deadline = time.monotonic() + timeout if timeout else None
+        while process.returncode is None:
+            if self.cancel_event.is_set():
+                result.cancelled = True
+                self.logger.warning(f"[{result.stage}] pipeline cancelled, stopping {result.args[0]}")
+                await self._terminate(process)
+                return
+            if deadline and time.monotonic() >= deadline:
+                result.timed_out = True
+                self.logger.error(f"[{result.stage}] {result.args[0]} exceeded {timeout:g}s deadline")
+                await self._terminate(process)
+                return
+            try:
+                await asyncio.wait_for(asyncio.shield(process.wait()), 0.2)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_async(self, args: List[str], stage: str = 'pipeline', cwd=None,
+                        env: Optional[Dict[str, str]] = None, timeout: Optional[float] = None,
+                        capture: bool = False, echo: bool = False) -> ProcessResult:
+        result = ProcessResult(list(args), stage)
+        started = time.monotonic()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args, cwd=cwd, env=env,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                start_new_session=True
+            )
+        except FileNotFoundError:
+            self.logger.error(f"[{stage}] command not found: {args[0]}")
+            result.returncode = 127
+            return result
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_lines)
+        consumer = asyncio.ensure_future(self._consume(queue, result, capture, echo))
+        pumps = [
+            asyncio.ensure_future(self._pump(process.stdout, queue, 'stdout')),
+            asyncio.ensure_future(self._pump(process.stderr, queue, 'stderr'))
+        ]
+        await self._watch(process, result, timeout)
+        await process.wait()
+        await asyncio.gather(*pumps)
+        await queue.put(None)
+        await consumer
+
+        result.returncode = process.returncode
+        result.duration = time.monotonic() - started
+        with self._lock:
+            self.results.append(result)
+        return result
+
+    def run(self, args: List[str], stage: str = 'pipeline', cwd=None,
+            env: Optional[Dict[str, str]] = None, timeout: Optional[float] = None,
+            capture: bool = False, check: bool = False, echo: bool = False) -> ProcessResult:
+        """Blocking wrapper around run_async; raises CalledProcessError when check is set.
+
+        Captured output is logged at debug level unless ``echo`` is set, which
+        keeps it in the stage log as well.
+        """
+        result = asyncio.run(self.run_async(args, stage, cwd, env, timeout, capture, echo))
+        if check and (result.timed_out or result.cancelled):
+            raise CommandTimeout(result.returncode, args, result.stdout, result.stderr)
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, args, result.stdout, result.stderr)
+        return result
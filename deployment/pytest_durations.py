@@ -0,0 +1,20 @@
+# pytest plugin loaded by the sharded test stage with ``-p pytest_durations``.
+# Records each test's duration, setup and teardown included, and writes them
+# as JSON to PYTEST_DURATIONS_FILE when the session ends.
+
+import os
+import json
+from collections import defaultdict
+
+_durations = defaultdict(float)
+
+
+def pytest_runtest_logreport(report):
+    _durations[report.nodeid] += report.duration
+
+
+def pytest_sessionfinish(session, exitstatus):
+    path = os.environ.get('PYTEST_DURATIONS_FILE')
+    if path:
+        with open(path, 'w') as f:
+            json.dump({nodeid: round(seconds, 4) for nodeid, seconds in _durations.items()}, f)
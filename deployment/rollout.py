@@ -0,0 +1,171 @@
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from process_runner import ProcessRunner
+
+UPSTREAM_TEMPLATE = """# Generated by deployment/deploy.py - do not edit
+upstream {name} {{
+{servers}
+{options}}}
+"""
+
+
+def compose_containers(runner: ProcessRunner, compose: List[str], service: str,
+                       cwd: Path, env: Dict) -> List[str]:
+    """IDs of the running containers of a compose service"""
+    result = runner.run(compose + ['ps', '-q', service], stage='rollout', cwd=cwd, env=env,
+                        timeout=60, capture=True, check=True)
+    return result.stdout.split()
+
+
+def container_addresses(runner: ProcessRunner, container_ids: List[str]) -> Dict[str, str]:
+    """Map container IDs to their first network IP address"""
+    if not container_ids:
+        return {}
+    result = runner.run([
+        'docker', 'inspect', '-f',
+        '{{.Id}} {{range .NetworkSettings.Networks}}{{.IPAddress}} {{end}}'
+    ] + container_ids, stage='rollout', timeout=60, capture=True, check=True)
+
+    addresses = {}
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) >= 2:
+            full_id = fields[0]
+            short_id = next((cid for cid in container_ids if full_id.startswith(cid)), full_id)
+            addresses[short_id] = fields[1]
+    return addresses
+
+
+def write_upstream(path: Path, addresses: List[str], port: int, name: str = 'flask_app',
+                   options: Optional[List[str]] = None, weights: Optional[Dict[str, int]] = None,
+                   fallback: Optional[str] = None) -> None:
+    """Atomically rewrite the nginx upstream block for the app replicas.
+
+    ``options`` are extra directives for the block, such as the keepalive
+    pool from nginx_config.NginxSettings.upstream_options. ``weights`` maps
+    addresses to nginx server weights; the others get nginx's default of 1.
+    ``fallback`` is the server line used when there are no addresses; the
+    default lets Docker's DNS resolve the compose service name.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = []
+    for ip in sorted(addresses):
+        weight = f" weight={weights[ip]}" if weights and ip in weights else ''
+        lines.append(f"    server {ip}:{port}{weight} max_fails=3 fail_timeout=10s;")
+    servers = '\n'.join(lines)
+    extra = ''.join(f"    {option}\n" for option in options or [])
+    tmp = path.with_suffix('.tmp')
+    servers = servers or f"    {fallback or f'server app:{port};'}"
+    tmp.write_text(UPSTREAM_TEMPLATE.format(name=name, servers=servers, options=extra))
+    os.replace(tmp, path)
+
+
+class RollingUpdate:
+    """Replace app replicas in batches without dropping below the desired count.
+
+    Each step starts up to ``max_surge`` new replicas next to the old ones,
+    waits for them to pass the health probe, moves nginx over to them and
+    only then drains and stops the same number of old replicas.
+    """
+
+    def __init__(self, runner: ProcessRunner, compose: List[str], cwd: Path, env: Dict,
+                 replicas: int, probe: Callable[[Dict[str, str]], bool], upstream_path: Path,
+                 batch_size: int = 1, max_surge: int = 1, drain_seconds: float = 10,
+                 stop_timeout: int = 30, service: str = 'app', port: int = 5000,
+                 upstream_options: Optional[List[str]] = None,
+                 logger: Optional[logging.Logger] = None):
+        self.runner = runner
+        self.compose = compose
+        self.cwd = cwd
+        self.env = env
+        self.replicas = max(replicas, 1)
+        self.probe = probe
+        self.upstream_path = upstream_path
+        self.step = max(1, min(batch_size, max_surge))
+        self.drain_seconds = drain_seconds
+        self.stop_timeout = stop_timeout
+        self.service = service
+        self.port = port
+        self.upstream_options = upstream_options
+        self.logger = logger or logging.getLogger(__name__)
+
+    def _containers(self) -> List[str]:
+        return compose_containers(self.runner, self.compose, self.service, self.cwd, self.env)
+
+    def _scale(self, count: int) -> List[str]:
+        """Scale the service up, leaving existing containers untouched; return new container IDs"""
+        before = set(self._containers())
+        self.runner.run(self.compose + [
+            'up', '-d', '--no-deps', '--no-recreate',
+            '--scale', f"{self.service}={count}", self.service
+        ], stage='rollout', cwd=self.cwd, env=self.env, timeout=600, check=True)
+        return [cid for cid in self._containers() if cid not in before]
+
+    def _route_to(self, container_ids: List[str], weights: Optional[Dict[str, int]] = None) -> None:
+        addresses = container_addresses(self.runner, container_ids)
+        weights = {addresses[cid]: weight for cid, weight in (weights or {}).items() if cid in addresses}
+        write_upstream(self.upstream_path, list(addresses.values()), self.port,
+                       options=self.upstream_options, weights=weights)
+        self.runner.run(self.compose + ['exec', '-T', 'nginx', 'nginx', '-s', 'reload'],
+                        stage='rollout', cwd=self.cwd, env=self.env, timeout=30, check=True)
+
+    def _remove(self, container_ids: List[str]) -> None:
+        if container_ids:
+            self.runner.run(['docker', 'stop', '-t', str(self.stop_timeout)] + container_ids,
+                            stage='rollout', timeout=self.stop_timeout + 30, check=True)
+            self.runner.run(['docker', 'rm'] + container_ids, stage='rollout', timeout=60, check=True)
+
+    def _healthy(self, container_ids: List[str]) -> bool:
+        endpoints = {
+            f"replica-{ip}": f"http://{ip}:{self.port}/health/ready"
+            for ip in container_addresses(self.runner, container_ids).values()
+        }
+        return bool(endpoints) and self.probe(endpoints)
+
+    def run(self) -> bool:
+        old = self._containers()
+        live: List[str] = list(old)
+        self.logger.info(
+            f"Rolling update: {len(old)} old replicas -> {self.replicas} new, "
+            f"{self.step} at a time"
+        )
+
+        started = 0
+        while started < self.replicas:
+            count = min(self.step, self.replicas - started)
+            new = self._scale(len(live) + count)
+            if len(new) != count:
+                self.logger.error(f"Expected {count} new replicas, compose started {len(new)}")
+                self._remove(new)
+                return False
+
+            if not self._healthy(new):
+                self.logger.error("New replicas failed health check, removing them")
+                self._remove(new)
+                return False
+            started += count
+            live += new
+
+            # Send traffic to the new replicas before touching the old ones
+            drained = old[:count]
+            old = old[count:]
+            live = [cid for cid in live if cid not in drained]
+            self._route_to(live)
+            if drained:
+                self.logger.info(f"Draining {len(drained)} old replicas for {self.drain_seconds}s")
+                time.sleep(self.drain_seconds)
+                self._remove(drained)
+
+        # More old replicas than desired (scale-down): drain the remainder too
+        if old:
+            live = [cid for cid in live if cid not in old]
+            self._route_to(live)
+            time.sleep(self.drain_seconds)
+            self._remove(old)
+
+        self.logger.info(f"Rolling update finished with {len(live)} replicas")
+        return True
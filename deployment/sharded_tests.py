@@ -0,0 +1,300 @@
+import os
+import sys
+import heapq
+import asyncio
+import logging
+import statistics
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from build_cache import load_json, save_json
+from process_runner import ProcessRunner
+
+DEPLOYMENT_DIR = Path(__file__).resolve().parent
+
+# Changing one of these can affect any test without showing up in coverage
+GLOBAL_FILES = {'conftest.py', 'requirements.txt', 'pytest.ini', 'setup.cfg',
+                'pyproject.toml', 'tox.ini', '.coveragerc'}
+# Only changes below these directories can affect the app's tests
+WATCHED_DIRS = ('app/', 'config/')
+# Under WATCHED_DIRS but never loaded by the tests
+NOT_TESTED = {'app/Dockerfile', '.dockerignore', 'app/gunicorn.conf.py'}
+
+# Assumed duration of a test with no history yet
+DEFAULT_TEST_SECONDS = 1.0
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class TestDurations:
+    """Per-test wall time from earlier runs, used to balance shards"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.seconds: Dict[str, float] = load_json(self.path)
+
+    def estimate(self, nodeid: str) -> float:
+        if nodeid in self.seconds:
+            return self.seconds[nodeid]
+        # Unknown tests get the typical duration rather than zero, so a batch
+        # of new tests doesn't all land on one shard
+        if self.seconds:
+            return statistics.median(self.seconds.values())
+        return DEFAULT_TEST_SECONDS
+
+    def update(self, measured: Dict[str, float], collected: Iterable[str]) -> None:
+        """Record new timings and forget tests that no longer exist"""
+        collected = set(collected)
+        self.seconds = {nodeid: seconds for nodeid, seconds in self.seconds.items()
+                        if nodeid in collected}
+        self.seconds.update(measured)
+        save_json(self.path, self.seconds)
+
+
+class ImpactMap:
+    """Which tests executed each source file, taken from per-test coverage contexts"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.files: Dict[str, List[str]] = load_json(self.path)
+
+    def update(self, ran: Set[str], covered: Dict[str, Set[str]]) -> None:
+        """Replace what is known about the tests in ``ran`` with fresh coverage"""
+        files = {path: set(tests) - ran for path, tests in self.files.items()}
+        for path, tests in covered.items():
+            files.setdefault(path, set()).update(tests)
+        self.files = {path: sorted(tests) for path, tests in files.items() if tests}
+        save_json(self.path, self.files)
+
+
+def plan_shards(tests: List[str], durations: TestDurations, shard_count: int) -> List[List[str]]:
+    """Split tests into shards of similar total duration.
+
+    Longest tests first, each onto the currently lightest shard. Tests keep
+    their collection order within a shard so module fixtures are reused.
+    """
+    shard_count = max(1, min(shard_count, len(tests)))
+    order = {nodeid: i for i, nodeid in enumerate(tests)}
+    heap = [(0.0, i) for i in range(shard_count)]
+    shards: List[List[str]] = [[] for _ in range(shard_count)]
+    for nodeid in sorted(tests, key=durations.estimate, reverse=True):
+        load, i = heapq.heappop(heap)
+        shards[i].append(nodeid)
+        heapq.heappush(heap, (load + durations.estimate(nodeid), i))
+    return [sorted(shard, key=order.get) for shard in shards if shard]
+
+
+def coverage_by_test(data_file: Path, project_root: Path) -> Dict[str, Set[str]]:
+    """Source file (relative to the project root) -> tests whose context executed it"""
+    try:
+        from coverage import CoverageData
+    except ImportError:
+        return {}
+    data = CoverageData(basename=str(data_file))
+    data.read()
+    covered: Dict[str, Set[str]] = {}
+    for measured in data.measured_files():
+        tests = set()
+        for contexts in (data.contexts_by_lineno(measured) or {}).values():
+            # pytest-cov names contexts "<nodeid>|setup", "<nodeid>|run", ...
+            tests.update(context.rsplit('|', 1)[0] for context in contexts if context)
+        if tests:
+            rel = os.path.relpath(measured, project_root).replace(os.sep, '/')
+            covered[rel] = tests
+    return covered
+
+
+class ShardedTestRun:
+    """The pipeline's test stage: parallel pytest shards with merged coverage.
+
+    ``full`` runs every collected test. ``impact`` runs only the tests that
+    executed a file changed since ``since`` (a git ref, normally the version
+    live in the environment). It falls back to the full suite whenever the
+    change can't be mapped to tests: no previous version, no coverage history,
+    or a change to shared setup or to code no test has executed yet.
+    """
+
+    def __init__(self, project_root: Path, state_dir: Path, runner: Optional[ProcessRunner] = None,
+                 logger: Optional[logging.Logger] = None, shards: Optional[int] = None,
+                 timeout: Optional[float] = None, fail_under: Optional[float] = None):
+        self.project_root = Path(project_root)
+        self.test_root = self.project_root / 'app'
+        self.state_dir = Path(state_dir)
+        self.logger = logger or logging.getLogger(__name__)
+        self.runner = runner or ProcessRunner(logger=self.logger)
+        self.shards = shards or available_cpus()
+        self.timeout = timeout
+        self.fail_under = fail_under
+        self.durations = TestDurations(self.state_dir / 'test-durations.json')
+        self.impact = ImpactMap(self.state_dir / 'test-impact.json')
+
+    def _env(self, **extra: str) -> Dict[str, str]:
+        env = os.environ.copy()
+        # pytest_durations plugin, and the shared config package
+        paths = [str(DEPLOYMENT_DIR), str(self.project_root), env.get('PYTHONPATH', '')]
+        env['PYTHONPATH'] = os.pathsep.join(p for p in paths if p)
+        env.update(extra)
+        return env
+
+    def collect(self) -> List[str]:
+        result = self.runner.run([sys.executable, '-m', 'pytest', '--collect-only', '-q', 'tests'],
+                                 stage='tests', cwd=self.test_root, env=self._env(),
+                                 timeout=self.timeout, capture=True)
+        # Exit code 5: nothing collected
+        if result.returncode not in (0, 5):
+            raise RuntimeError('Test collection failed:\n' + result.stdout + result.stderr)
+        return [line for line in result.lines if '::' in line]
+
+    def changed_files(self, since: str) -> Optional[List[str]]:
+        """Files changed between ``since`` and the working tree, or None if git can't tell"""
+        diff = self.runner.run(['git', 'diff', '--name-only', since, '--'], stage='tests',
+                               cwd=self.project_root, timeout=60, capture=True)
+        untracked = self.runner.run(['git', 'ls-files', '--others', '--exclude-standard'],
+                                    stage='tests', cwd=self.project_root, timeout=60, capture=True)
+        if not (diff.ok and untracked.ok):
+            return None
+        return [line for line in diff.lines + untracked.lines if line]
+
+    def select(self, collected: List[str], since: Optional[str]) -> Tuple[Optional[List[str]], str]:
+        """Tests affected by changes since ``since``; None means run everything"""
+        if not since:
+            return None, 'no previous version to compare with'
+        if not self.impact.files:
+            return None, 'no coverage history yet'
+        changed = self.changed_files(since)
+        if changed is None:
+            return None, f'git cannot diff against {since}'
+
+        selected: Set[str] = set()
+        for path in changed:
+            if os.path.basename(path) in GLOBAL_FILES:
+                return None, f'{path} changed'
+            if not path.startswith(WATCHED_DIRS) or path in NOT_TESTED:
+                continue
+            if path.startswith('app/tests/'):
+                own = [nodeid for nodeid in collected if nodeid.startswith(path[len('app/'):] + '::')]
+                if own:
+                    selected.update(own)
+                    continue
+            if path in self.impact.files:
+                selected.update(self.impact.files[path])
+            else:
+                return None, f'no test has executed {path}'
+
+        # Tests that have never run have no coverage to go by
+        selected.update(nodeid for nodeid in collected if nodeid not in self.durations.seconds)
+        selected &= set(collected)
+        return [nodeid for nodeid in collected if nodeid in selected], \
+            f'{len(changed)} files changed since {since}'
+
+    async def _run_shards(self, shards: List[List[str]]):
+        commands = []
+        for i, shard in enumerate(shards):
+            env = self._env(COVERAGE_FILE=str(self.test_root / f'.coverage.shard{i}'),
+                            PYTEST_DURATIONS_FILE=str(self.state_dir / f'durations.shard{i}.json'))
+            commands.append(self.runner.run_async([
+                sys.executable, '-m', 'pytest', '-q', '-p', 'pytest_durations',
+                '--cov=.', '--cov-context=test', '--cov-report=', *shard
+            ], stage=f'tests:{i}', cwd=self.test_root, env=env, timeout=self.timeout))
+        return await asyncio.gather(*commands)
+
+    def _merge_coverage(self, shard_count: int, fail_under: Optional[float]) -> bool:
+        """Combine the shards' coverage data and write the reports once"""
+        data_files = [f'.coverage.shard{i}' for i in range(shard_count)
+                      if (self.test_root / f'.coverage.shard{i}').exists()]
+        if not data_files:
+            return True
+        env = self._env()
+        env.pop('COVERAGE_FILE', None)
+        coverage = [sys.executable, '-m', 'coverage']
+        self.runner.run(coverage + ['combine'] + data_files, stage='tests', cwd=self.test_root,
+                        env=env, timeout=300, check=True)
+        self.runner.run(coverage + ['xml', '-o', 'coverage.xml'], stage='tests',
+                        cwd=self.test_root, env=env, timeout=300, check=True)
+        report = coverage + ['report']
+        if fail_under is not None:
+            report.append(f'--fail-under={fail_under:g}')
+        return self.runner.run(report, stage='tests', cwd=self.test_root, env=env, timeout=300).ok
+
+    def _collect_durations(self, shard_count: int) -> Dict[str, float]:
+        measured: Dict[str, float] = {}
+        for i in range(shard_count):
+            path = self.state_dir / f'durations.shard{i}.json'
+            measured.update(load_json(path))
+            if path.exists():
+                path.unlink()
+        return measured
+
+    def run(self, mode: str = 'full', since: Optional[str] = None) -> bool:
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        collected = self.collect()
+        tests = collected
+        if mode == 'impact':
+            selected, reason = self.select(collected, since)
+            if selected is None:
+                self.logger.info(f"Running the full suite: {reason}")
+            else:
+                self.logger.info(f"Impact selection: {len(selected)} of {len(collected)} tests ({reason})")
+                tests = selected
+        if not tests:
+            self.logger.info("No tests affected by the changes")
+            return True
+
+        shards = plan_shards(tests, self.durations, self.shards)
+        for i, shard in enumerate(shards):
+            estimate = sum(self.durations.estimate(nodeid) for nodeid in shard)
+            self.logger.info(f"Shard {i}: {len(shard)} tests, ~{estimate:.1f}s")
+
+        results = asyncio.run(self._run_shards(shards))
+        self.durations.update(self._collect_durations(len(shards)), collected)
+        # Exit code 5 (no tests collected) is not a failure
+        passed = all(result.ok or result.returncode == 5 for result in results)
+        if not passed:
+            return False
+
+        # A subset of the tests covers only part of the code; the threshold is for the full suite
+        full = len(tests) == len(collected)
+        if not full and self.fail_under is not None:
+            self.logger.info(f"Coverage threshold of {self.fail_under:g}% not checked for a partial run")
+        coverage_ok = self._merge_coverage(len(shards), self.fail_under if full else None)
+        data_file = self.test_root / '.coverage'
+        if data_file.exists():
+            self.impact.update(set(tests), coverage_by_test(data_file, self.project_root))
+        if not coverage_ok:
+            self.logger.error("Coverage is below the required threshold")
+        return coverage_ok
+
+
+def main():
+    import argparse
+    from history import DeploymentHistory
+
+    parser = argparse.ArgumentParser(description='Run the test suite in parallel shards')
+    parser.add_argument('--selection', choices=['full', 'impact'], default='full',
+                        help='impact: only tests affected by changes since the deployed version')
+    parser.add_argument('--since', help='git ref to compare with (default: version live in --environment)')
+    parser.add_argument('--environment', '-e', default='production')
+    parser.add_argument('--shards', type=int, help='default: one per available CPU')
+    parser.add_argument('--fail-under', type=float, help='minimum total coverage percentage')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    project_root = DEPLOYMENT_DIR.parent
+    state_dir = project_root / '.deploy'
+    since = args.since
+    if args.selection == 'impact' and not since:
+        history = DeploymentHistory(state_dir / 'history.db')
+        since = history.current_version(args.environment)
+        history.close()
+
+    tests = ShardedTestRun(project_root, state_dir, shards=args.shards, fail_under=args.fail_under)
+    sys.exit(0 if tests.run(args.selection, since) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class Stage:
+    """A single pipeline stage and the stages it depends on"""
+
+    def __init__(self, name: str, func: Callable[[], bool],
+                 depends_on: Iterable[str] = (), description: Optional[str] = None):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.description = description or name
+
+
+class StageResult:
+    """Outcome and wall time of one stage"""
+
+    # Terminal states a stage can end in
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, name: str, status: str, started: float = 0.0, finished: float = 0.0):
+        self.name = name
+        self.status = status
+        self.started = started
+        self.finished = finished
+
+    @property
+    def duration(self) -> float:
+        return max(self.finished - self.started, 0.0)
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status == self.SUCCEEDED
+
+
+class GraphRun:
+    """Results of executing a StageGraph"""
+
+    def __init__(self, results: Dict[str, StageResult], critical_path: List[str],
+                 critical_path_length: float, wall_time: float):
+        self.results = results
+        self.critical_path = critical_path
+        self.critical_path_length = critical_path_length
+        self.wall_time = wall_time
+
+    @property
+    def succeeded(self) -> bool:
+        return all(r.succeeded for r in self.results.values())
+
+    @property
+    def failed_stage(self) -> Optional[str]:
+        failed = [r for r in self.results.values() if r.status == StageResult.FAILED]
+        if not failed:
+            return None
+        return min(failed, key=lambda r: r.finished).name
+
+    def summary(self) -> Dict:
+        """Serializable view of the run, suitable for logs and history notes"""
+        return {
+            'wall_time': round(self.wall_time, 3),
+            'critical_path': self.critical_path,
+            'critical_path_length': round(self.critical_path_length, 3),
+            'stages': {
+                name: {'status': r.status, 'duration': round(r.duration, 3)}
+                for name, r in self.results.items()
+            }
+        }
+
+
+class StageGraph:
+    """Declarative stage graph executed on a worker pool.
+
+    Stages start as soon as all of their dependencies have succeeded. The
+    first failure sets ``cancel_event`` so that long-running stages can abort,
+    and every stage that has not started yet is marked cancelled.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 cancel_event: Optional[threading.Event] = None,
+                 logger: Optional[logging.Logger] = None):
+        self.stages: Dict[str, Stage] = {}
+        self.max_workers = max_workers
+        self.logger = logger or logging.getLogger(__name__)
+        self.cancel_event = cancel_event or threading.Event()
+
+    def add(self, name: str, func: Callable[[], bool], depends_on: Iterable[str] = (),
+            description: Optional[str] = None) -> 'StageGraph':
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        self.stages[name] = Stage(name, func, depends_on, description)
+        return self
+
+    def _validate(self) -> List[str]:
+        """Check dependencies exist and the graph is acyclic; return a topological order"""
+        for stage in self.stages.values():
+            for dep in stage.depends_on:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+        order = []
+        indegree = {name: len(stage.depends_on) for name, stage in self.stages.items()}
+        ready = [name for name, degree in indegree.items() if degree == 0]
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for other in self.stages.values():
+                if name in other.depends_on:
+                    indegree[other.name] -= 1
+                    if indegree[other.name] == 0:
+                        ready.append(other.name)
+
+        if len(order) != len(self.stages):
+            raise ValueError("Stage graph contains a cycle")
+        return order
+
+    def _run_stage(self, stage: Stage) -> StageResult:
+        started = time.monotonic()
+        self.logger.info(f"Step: {stage.description}")
+        try:
+            ok = bool(stage.func())
+        except Exception:
+            self.logger.exception(f"Stage {stage.name} raised an exception")
+            ok = False
+        finished = time.monotonic()
+
+        if self.cancel_event.is_set() and not ok:
+            status = StageResult.CANCELLED
+        else:
+            status = StageResult.SUCCEEDED if ok else StageResult.FAILED
+        return StageResult(stage.name, status, started, finished)
+
+    def _critical_path(self, order: List[str], results: Dict[str, StageResult]):
+        """Longest duration-weighted chain through the stages that actually ran"""
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in order:
+            result = results[name]
+            if result.status == StageResult.CANCELLED and result.duration == 0:
+                continue
+            best_dep, best_finish = None, 0.0
+            for dep in self.stages[name].depends_on:
+                if dep in finish and finish[dep] > best_finish:
+                    best_dep, best_finish = dep, finish[dep]
+            finish[name] = best_finish + result.duration
+            previous[name] = best_dep
+
+        if not finish:
+            return [], 0.0
+        tail = max(finish, key=finish.get)
+        path = []
+        node: Optional[str] = tail
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        return list(reversed(path)), finish[tail]
+
+    def run(self) -> GraphRun:
+        """Execute the graph and return per-stage results"""
+        order = self._validate()
+        self.cancel_event.clear()
+        results: Dict[str, StageResult] = {}
+        pending = dict(self.stages)
+        running = {}
+        run_started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers or max(len(self.stages), 1),
+                                thread_name_prefix='stage') as pool:
+            while pending or running:
+                if not self.cancel_event.is_set():
+                    for name in list(pending):
+                        stage = pending[name]
+                        if all(dep in results and results[dep].succeeded for dep in stage.depends_on):
+                            del pending[name]
+                            running[pool.submit(self._run_stage, stage)] = name
+
+                if self.cancel_event.is_set():
+                    for name in pending:
+                        results[name] = StageResult(name, StageResult.CANCELLED)
+                    pending.clear()
+
+                if not running:
+                    # Nothing can make progress; remaining stages have failed dependencies
+                    for name in pending:
+                        results[name] = StageResult(name, StageResult.CANCELLED)
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results[running.pop(future)] = result
+                    if result.status == StageResult.FAILED and not self.cancel_event.is_set():
+                        self.logger.error(f"Stage {result.name} failed, cancelling remaining stages")
+                        self.cancel_event.set()
+
+        wall_time = time.monotonic() - run_started
+        results = {name: results[name] for name in order}
+        path, length = self._critical_path(order, results)
+        return GraphRun(results, path, length, wall_time)
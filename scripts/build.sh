@@ -1,4 +1,3 @@
-"""
 #!/bin/bash
 set -e
 
@@ -24,13 +23,12 @@ echo "Running tests..."
 cd app
 python -m pytest tests/ --cov=app
 
-# Build Docker image
+# Build Docker image; BuildKit is required for the Dockerfile's cache mounts
 echo "Building Docker image..."
 cd "$PROJECT_ROOT"
-docker build -t "${DOCKER_REGISTRY}/flask-app:${VERSION}" -f app/Dockerfile app/
+DOCKER_BUILDKIT=1 docker build -t "${DOCKER_REGISTRY}/flask-app:${VERSION}" -f app/Dockerfile .
 
 # Tag as latest
 docker tag "${DOCKER_REGISTRY}/flask-app:${VERSION}" "${DOCKER_REGISTRY}/flask-app:latest"
 
 echo "Build completed successfully!"
-"""